@@ -12,4 +12,7 @@ class ApiConfig(AppConfig):
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
-    verbose_name = 'API Application'
\ No newline at end of file
+    verbose_name = 'API Application'
+
+    def ready(self):
+        import api.signals  # noqa: F401
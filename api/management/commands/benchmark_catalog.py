@@ -0,0 +1,68 @@
+import json
+import platform
+import time
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from api.services.catalog_benchmark import generate_catalog, run_benchmark
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк API каталога: создаёт отдельную тестовую базу с синтетическим каталогом, прогоняет '
+            'фиксированный набор сценариев и сохраняет p50/p95, число запросов и память в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help='Количество продуктов в каталоге.')
+        parser.add_argument('--brands', type=int, default=50)
+        parser.add_argument('--category-depth', type=int, default=4)
+        parser.add_argument('--category-breadth', type=int, default=3)
+        parser.add_argument('--currencies', type=int, default=1, help='Цен в разных валютах у продукта (до 3).')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=20, help='Замеров на сценарий.')
+        parser.add_argument('--warmup', type=int, default=1, help='Прогревочных запросов на сценарий.')
+        parser.add_argument('--scenario', action='append', dest='scenarios', help='Запустить только этот сценарий.')
+        parser.add_argument('--output', default='bench_output.json', help='Файл для результатов в JSON.')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после прогона.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # Схема одноразовой базы строится по моделям (как TEST MIGRATE=False): миграции в репозитории не хранятся.
+        connection.settings_dict.setdefault('TEST', {})['MIGRATE'] = False
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'],
+        )
+        try:
+            started = time.perf_counter()
+            stats, _ = generate_catalog(
+                options['products'], options['brands'], options['category_depth'], options['category_breadth'],
+                options['currencies'], options['seed'],
+            )
+            self.stdout.write(f'Generated catalog in {time.perf_counter() - started:.1f}s: {stats}')
+
+            results = run_benchmark(options['iterations'], options['warmup'], options['seed'], options['scenarios'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'vendor': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'products': options['products'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'scenarios': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20} p50 {result["p50_ms"]:>8.1f} ms  p95 {result["p95_ms"]:>8.1f} ms  '
+                f'{result["queries"]:>6.1f} queries  {result["peak_memory_kb"]:>8.1f} KiB  status {result["status"]}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from api.services.catalog_export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, get_export_queryset, iter_export
+from api.views.product_views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Выгружает каталог в NDJSON или CSV; фильтры принимаются в формате параметров /products/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='export_format', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='Путь к файлу; по умолчанию stdout.')
+        parser.add_argument('--filter', dest='filters', action='append', default=[],
+                            help='Фильтр вида key=value, например --filter brand=3 --filter in_stock=true.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        query_params = QueryDict(mutable=True)
+        for item in options['filters']:
+            key, separator, value = item.partition('=')
+            if not separator:
+                raise CommandError(f'Invalid filter "{item}", expected key=value.')
+            query_params.appendlist(key, value)
+
+        queryset = get_export_queryset(ProductViewSet.queryset.filter(ProductViewSet.get_filters(query_params)))
+        chunks = iter_export(queryset, options['export_format'], options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
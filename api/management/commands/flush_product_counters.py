@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from api.services.product_counters import flush_counters, flush_spool
+
+
+class Command(BaseCommand):
+    help = 'Применяет накопленные просмотры и оценки продуктов (файл PRODUCT_COUNTERS_SPOOL) одним пакетным UPDATE.'
+
+    def handle(self, *args, **options):
+        flush_counters()
+        flushed = flush_spool()
+        self.stdout.write(self.style.SUCCESS(f'Flushed counters for {flushed} products.'))
@@ -0,0 +1,27 @@
+import json
+from django.core.management.base import BaseCommand
+from api.models import Image
+from api.services.image_variants import VariantGenerator
+
+
+class Command(BaseCommand):
+    help = 'Генерирует уменьшенные копии изображений (AVIF/WebP/JPEG по ширинам) и манифесты srcset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Количество процессов кодирования (IMAGE_VARIANT_WORKERS).')
+        parser.add_argument('--force', action='store_true', help='Перегенерировать и актуальные манифесты.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Количество изображений в пачке.')
+        parser.add_argument('--product-ids', type=int, nargs='*', help='Только изображения указанных продуктов.')
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if options['product_ids']:
+            images = images.filter(product_id__in=options['product_ids'])
+        stats = VariantGenerator(
+            workers=options['workers'], force=options['force'], batch_size=options['batch_size'],
+        ).run(images)
+        self.stdout.write(json.dumps(stats, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {stats['generated']} variant sets ({stats['files']} files), "
+            f"reused {stats['reused']}, skipped {stats['skipped']}."
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from api.services.catalog_import import IMPORT_BATCH_SIZE, CatalogImporter, read_feed
+
+
+class Command(BaseCommand):
+    help = 'Импортирует каталог из JSON/NDJSON/CSV фида пакетно: upsert продуктов по article и синхронизация связей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу фида.')
+        parser.add_argument('--format', dest='feed_format', choices=['json', 'ndjson', 'csv'],
+                            help='Формат фида; по умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Выполнить импорт и откатить транзакцию.')
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        stats, timings = importer.run(read_feed(options['path'], options['feed_format']))
+
+        for name, value in stats.items():
+            self.stdout.write(f'{name}: {value}')
+        for name, seconds in timings.items():
+            self.stdout.write(f'{name}: {seconds:.2f}s')
+        if stats['skipped']:
+            self.stdout.write(self.style.WARNING(f'Skipped {stats["skipped"]} records without a brand.'))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: all changes were rolled back.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Imported {stats["products"]} products.'))
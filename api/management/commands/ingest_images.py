@@ -0,0 +1,27 @@
+import json
+from django.core.management.base import BaseCommand
+from api.models import Image
+from api.services.image_ingest import ImageIngester
+
+
+class Command(BaseCommand):
+    help = 'Загружает изображения продуктов по URL из image_original с дедупликацией по хешу содержимого.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Количество потоков загрузки (IMAGE_INGEST_WORKERS).')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Перепроверить уже загруженные URL условными запросами.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки записей в БД.')
+        parser.add_argument('--product-ids', type=int, nargs='*', help='Только изображения указанных продуктов.')
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        if options['product_ids']:
+            images = images.filter(product_id__in=options['product_ids'])
+        stats = ImageIngester(
+            workers=options['workers'], refresh=options['refresh'], batch_size=options['batch_size'],
+        ).run(images)
+        self.stdout.write(json.dumps(stats, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stats['stored']} files, deduplicated {stats['deduplicated']}, skipped {stats['skipped']} URLs."
+        ))
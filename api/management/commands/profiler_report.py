@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from api.services.query_profiler import aggregate, clear_records, load_records
+
+
+SORT_FIELDS = ['total_db_ms', 'p95_total_ms', 'avg_queries', 'avg_serializer_ms', 'avg_size', 'requests']
+
+
+class Command(BaseCommand):
+    help = 'Выводит самые медленные эндпоинты по данным профилировщика запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Количество эндпоинтов в отчёте.')
+        parser.add_argument('--sort', choices=SORT_FIELDS, default='total_db_ms', help='Поле сортировки.')
+        parser.add_argument('--clear', action='store_true', help='Очистить накопленные записи после отчёта.')
+
+    def handle(self, *args, **options):
+        records = load_records()
+        if not records:
+            self.stdout.write('No profiled requests yet. Enable QUERY_PROFILER_ENABLED and send some traffic.')
+            return
+
+        report = sorted(aggregate(records), key=lambda row: row[options['sort']], reverse=True)
+        self.stdout.write(f'{len(records)} profiled requests, top {options["top"]} by {options["sort"]}:')
+        for row in report[:options['top']]:
+            self.stdout.write(
+                f'{row["view"]}.{row["action"]}: {row["requests"]} req, '
+                f'{row["avg_queries"]:.1f} queries avg, {row["total_db_ms"]:.1f} ms SQL total, '
+                f'p95 {row["p95_total_ms"]:.1f} ms, serializer {row["avg_serializer_ms"]:.1f} ms avg, '
+                f'render {row["avg_render_ms"]:.1f} ms avg, {row["avg_size"]:.0f} bytes avg'
+            )
+            for sql, count in row['top_duplicates']:
+                self.stdout.write(f'    x{count} {sql[:160]}')
+
+        if options['clear']:
+            clear_records()
+            self.stdout.write(self.style.SUCCESS('Profiler records cleared.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.models import Product
+from api.services.product_documents import refresh_product_documents
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает денормализованные документы продуктов для списка и карточки товара.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество продуктов в одной пачке.')
+        parser.add_argument('--ids', type=int, nargs='*', help='Перестроить только указанные продукты.')
+
+    def handle(self, *args, **options):
+        product_ids = options['ids'] or list(Product.objects.order_by('id').values_list('id', flat=True))
+        rendered = refresh_product_documents(product_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(rendered)} product documents.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api.services.filter_index import invalidate_filter_index
+from api.services.price_bounds import invalidate_price_bounds
+from api.services.product_prices import refresh_product_prices
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает эффективные цены продуктов (с учётом скидки) по валютам для сортировки и фильтра по цене.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество продуктов в одной пачке.')
+        parser.add_argument('--ids', type=int, nargs='*', help='Пересчитать только указанные продукты.')
+
+    def handle(self, *args, **options):
+        written = refresh_product_prices(options['ids'] or None, batch_size=options['batch_size'])
+        invalidate_price_bounds()
+        invalidate_filter_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} product prices.'))
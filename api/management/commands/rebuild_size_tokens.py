@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.models import Size
+from api.services.filter_index import invalidate_filter_index
+from api.services.size_tokens import rebuild_size_tokens
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает нормализованные токены размеров (SizeToken) для фильтра size_filter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество размеров в пачке.')
+
+    def handle(self, *args, **options):
+        created = rebuild_size_tokens(Size.objects.order_by('id').iterator(), batch_size=options['batch_size'])
+        invalidate_filter_index()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} size tokens.'))
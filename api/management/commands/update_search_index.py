@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.services.product_search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы продуктов и при необходимости создаёт поисковые индексы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Создать расширение pg_trgm и GIN-индексы (PostgreSQL).')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if options['setup']:
+            backend.setup()
+        backend.update_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f'Search index updated with {backend.__class__.__name__}.'))
@@ -0,0 +1,156 @@
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from api.services.compression import compress_response
+from api.services.query_profiler import QueryRecorder, current_profile, profile_buffer, record_queries
+
+
+class QueryProfilerMiddleware:
+    """
+    Профилирует запросы: количество и время SQL, повторяющиеся запросы (N+1), время сериализации,
+    приложения и рендеринга, размер ответа. Результат отдаётся в заголовке Server-Timing и копится в буфере.
+
+    Включается настройкой QUERY_PROFILER_ENABLED, доля профилируемых запросов — QUERY_PROFILER_SAMPLE_RATE.
+
+    В асинхронной цепочке запросы к БД выполняются в рабочих потоках; их записывают async_reads.run_sync
+    и fetch_* через record_queries по профилю из contextvar, а синхронные вьюхи — process_view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'QUERY_PROFILER_SAMPLE_RATE', 1.0)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = self.start_profile(request)
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(profile['recorder']):
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_profile(profile, response, started)
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = self.start_profile(request)
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_profile(profile, response, started)
+
+    @staticmethod
+    def start_profile(request):
+        profile = request._profiler = {
+            'view': None, 'action': None, 'render_ms': 0.0, 'sections': {}, 'recorder': QueryRecorder(),
+        }
+        return profile
+
+    @staticmethod
+    def finish_profile(profile, response, started):
+        """
+        Заголовок Server-Timing и запись в буфер профилировщика.
+        """
+        recorder = profile['recorder']
+        total_ms = (time.perf_counter() - started) * 1000
+
+        db_ms = recorder.duration * 1000
+        serializer_ms = profile['sections'].get('serializer', 0.0)
+        app_ms = max(total_ms - db_ms - serializer_ms - profile['render_ms'], 0.0)
+        size = 0 if getattr(response, 'streaming', False) else len(response.content)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+            f'serializer;dur={serializer_ms:.1f}',
+            f'app;dur={app_ms:.1f}',
+            f'render;dur={profile["render_ms"]:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        if profile['view']:
+            profile_buffer.add({
+                'view': profile['view'],
+                'action': profile['action'],
+                'queries': recorder.count,
+                'duplicates': recorder.duplicates,
+                'db_ms': db_ms,
+                'serializer_ms': serializer_ms,
+                'app_ms': app_ms,
+                'render_ms': profile['render_ms'],
+                'total_ms': total_ms,
+                'size': size,
+                'status': response.status_code,
+            })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, '_profiler', None)
+        if profile is None:
+            return None
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        profile['view'] = view_class.__name__ if view_class else view_func.__name__
+        profile['action'] = actions.get(request.method.lower(), request.method.lower())
+        if self.async_mode and not iscoroutinefunction(view_func):
+            # Под ASGI синхронная вьюха выполняется в потоке sync_to_async, где нет execute_wrapper из __acall__.
+            # process_view (последний в цепочке) вызывается в том же потоке, поэтому вьюха запускается здесь.
+            with record_queries():
+                return view_func(request, *view_args, **view_kwargs)
+        return None
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, '_profiler', None)
+        if profile is not None:
+            render_started = time.perf_counter()
+
+            def record_render_time(rendered_response):
+                profile['render_ms'] = (time.perf_counter() - render_started) * 1000
+
+            response.add_post_render_callback(record_render_time)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы (zstd, br или gzip по Accept-Encoding); порог — COMPRESSION_MIN_SIZE.
+
+    Ответы из кеша ответов приходят уже сжатыми (сжатые варианты хранятся в записи кеша) и пропускаются.
+    Работает и в синхронной, и в асинхронной цепочке, чтобы под ASGI не переводить запросы в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request))
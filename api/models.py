@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from autoslug import AutoSlugField
 from django.utils.translation import gettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
@@ -31,6 +32,9 @@ class Product(models.Model):
     website_name = models.CharField(max_length=200, blank=True, null=True)
     rating = models.DecimalField(max_digits=2, decimal_places=1, default=0.0)
     popularity = models.PositiveIntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['title_ru']
@@ -67,6 +71,7 @@ class Image(models.Model):
     product = models.ForeignKey('Product', related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='static/product_images/%Y/%m/%d', max_length=500, blank=True, null=True)
     image_original = models.JSONField(blank=True, null=True)
+    variants = models.JSONField(blank=True, null=True, editable=False)
 
 
     def __str__(self):
@@ -142,6 +147,25 @@ class ProductSize(models.Model):
         ]
 
 
+class SizeToken(models.Model):
+    """
+    Нормализованные обозначения размера по системам (см. size_tokens): фильтр по имени размера —
+    точный поиск по индексу (token, system) вместо icontains по raw_size.
+    """
+    size = models.ForeignKey(Size, on_delete=models.CASCADE, related_name='tokens')
+    system = models.CharField(max_length=10)
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('size', 'system', 'token')
+        indexes = [
+            models.Index(fields=['token', 'system']),
+        ]
+
+    def __str__(self):
+        return f'{self.system}:{self.token}'
+
+
 # ProductVariant model
 class ProductType(models.Model):
     id = models.AutoField(primary_key=True)
@@ -214,6 +238,23 @@ class ProductCurrency(models.Model):
         return f' {self.product} - {self.currency}'
 
 
+class ProductPrice(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = (('product', 'currency'),)
+
+        indexes = [
+            models.Index(fields=['currency', 'price', 'product']),
+            models.Index(fields=['product', 'currency', 'price']),
+        ]
+
+    def __str__(self):
+        return f' {self.product} - {self.currency}: {self.price}'
+
+
 class SizeTable(models.Model):
     name = models.CharField(max_length=255, null=True, blank=True)
     category_id = models.IntegerField( unique=True, null=True, blank=True)
@@ -224,3 +265,28 @@ class SizeTable(models.Model):
             return self.name
         return str(self.category_id)
 
+
+
+class ProductDocument(models.Model):
+    product = models.OneToOneField(Product, primary_key=True, related_name='document', on_delete=models.CASCADE)
+    data = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.product_id)
+
+
+class ImageSource(models.Model):
+    """
+    Индекс URL источника -> хеш содержимого: уже загруженные URL при повторной синхронизации не скачиваются.
+    """
+    url = models.TextField()
+    url_hash = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    path = models.CharField(max_length=500)
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    fetched = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.url
@@ -1,5 +1,15 @@
+import base64
+import binascii
+import hashlib
+import json
+from django.core.cache import cache
+from django.db.models import F, Q
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.exceptions import ParseError
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from api.services.cache_versions import get_versions
+from api.services.response_cache import CATALOG_MODELS, catalog_version_key
 
 
 class ProductPagination(PageNumberPagination):
@@ -19,3 +29,93 @@ class ProductPagination(PageNumberPagination):
         except (ValueError, TypeError):
             raise ParseError(f"Invalid page size: {request.query_params.get(self.page_size_query_param)}")
         return self.page_size
+
+
+class ProductCursorPagination(ProductPagination):
+    """
+    Keyset-пагинация: страница выбирается условием по (поле сортировки, id), без OFFSET и COUNT(*).
+
+    Порядок берётся из первого поля order_by переданного queryset, id служит тай-брейкером.
+    Общее количество отдаётся только по запросу (with_count=true) и кешируется по версиям каталога.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    count_cache_timeout = 300
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = int(self.get_page_size(request))
+
+        ordering = queryset.query.order_by[0] if queryset.query.order_by else 'id'
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        if self.field in ('id', 'pk'):
+            self.field = 'id'
+            queryset = queryset.order_by(ordering)
+        else:
+            expression = F(self.field).desc(nulls_last=True) if self.descending else F(self.field).asc(nulls_last=True)
+            queryset = queryset.order_by(expression, 'id')
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = self.get_cached_count(queryset, request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_keyset_filter(*cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        page = results[:self.page_size]
+        self.last_item = page[-1] if page else None
+        return page
+
+    def get_keyset_filter(self, value, pk):
+        if self.field == 'id':
+            return Q(id__lt=pk) if self.descending else Q(id__gt=pk)
+        if value is None:
+            return Q(**{f'{self.field}__isnull': True, 'id__gt': pk})
+        lookup = 'lt' if self.descending else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value}) |
+            Q(**{self.field: value, 'id__gt': pk}) |
+            Q(**{f'{self.field}__isnull': True})
+        )
+
+    def get_cached_count(self, queryset, request):
+        params = sorted(
+            (key, value) for key, values in request.query_params.lists() for value in values
+            if key not in (self.cursor_query_param, self.page_size_query_param, self.count_query_param)
+        )
+        versions = get_versions([catalog_version_key(model) for model in CATALOG_MODELS])
+        raw_key = json.dumps([versions, params])
+        cache_key = 'product_count:' + hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+        return cache.get_or_set(cache_key, lambda: queryset.order_by().count(), self.count_cache_timeout)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            return value, int(pk)
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(f"Invalid cursor: {encoded}")
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        return base64.urlsafe_b64encode(json.dumps([value, pk], default=str).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next or not self.last_item:
+            return None
+        value = getattr(self.last_item, self.field) if self.field != 'id' else None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, self.last_item.pk))
+
+    def get_paginated_response(self, data):
+        response_data = {'next': self.get_next_link()}
+        if self.count is not None:
+            response_data['count'] = self.count
+        response_data['results'] = data
+        return Response(response_data)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from api.models import Brand
-from api.models import Product
+from api.services.reference_data import get_reference_data
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -16,4 +16,4 @@ class BrandSerializer(serializers.ModelSerializer):
     def get_product_count(self, obj):
         if hasattr(obj, 'product_count'):
             return obj.product_count
-        return Product.objects.filter(brand=obj).count()
+        return get_reference_data().get_count(Brand, obj.id)
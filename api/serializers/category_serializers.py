@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from api.models import Category, ProductCategory
+from api.services.category_tree import get_category_tree
 
 class CategorySerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
@@ -12,9 +13,9 @@ class CategorySerializer(serializers.ModelSerializer):
         """
         Рекурсивно сериализует дочерние категории.
         """
-        children_queryset = obj.get_children()
-        serializer = self.__class__(children_queryset, many=True, context=self.context)
-        return serializer.data if children_queryset else None
+        children = get_category_tree().get_children(obj.id)
+        serializer = self.__class__(children, many=True, context=self.context)
+        return serializer.data if children else None
 
 
 class ProductCategorySerializer(serializers.ModelSerializer):
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from api.models import Color, ProductType
+from api.models import Color
+from api.services.reference_data import get_reference_data
 
 
 class ColorSerializer(serializers.ModelSerializer):
@@ -15,4 +16,4 @@ class ColorSerializer(serializers.ModelSerializer):
     def get_product_count(self, obj):
         if hasattr(obj, 'product_count'):
             return obj.product_count
-        return ProductType.objects.filter(color=obj).count()
+        return get_reference_data().get_count(Color, obj.id)
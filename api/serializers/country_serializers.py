@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from api.models import Country, ProductCountry
+from api.services.reference_data import get_reference_data
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -14,7 +15,7 @@ class CountrySerializer(serializers.ModelSerializer):
     def get_product_count(self, obj):
         if hasattr(obj, 'product_count'):
             return obj.product_count
-        return ProductCountry.objects.filter(country=obj).count()
+        return get_reference_data().get_count(Country, obj.id)
 
 
 class ProductCountrySerializer(serializers.ModelSerializer):
@@ -1,5 +1,7 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from api.models import ProductCurrency, Currency
+from api.services.reference_data import get_reference_data
 
 
 class CurrencySerializer(serializers.ModelSerializer):
@@ -13,19 +15,28 @@ class CurrencySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'symbol', 'code', 'count_products']
 
     def get_count_products(self, obj):
-        try:
-            return ProductCurrency.objects.filter(currency=obj).count()
-        except Exception as e:
-            print(f"Error counting products for country {obj.id}: {e}")
-            return 0
+        if hasattr(obj, 'count_products'):
+            return obj.count_products
+        return get_reference_data().get_count(Currency, obj.id)
 
 
 class ProductCurrencySerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели ProductCurrency, связанной с Currency.
     """
-    currency = CurrencySerializer()
+    currency = serializers.SerializerMethodField()
     price = serializers.SerializerMethodField()
+
+    @extend_schema_field(CurrencySerializer)
+    def get_currency(self, obj):
+        """
+        Валюта из снимка справочников: сериализуется один раз, а не для каждой цены каждого продукта.
+        """
+        representation = get_reference_data().get_representation(Currency, obj.currency_id, CurrencySerializer)
+        if representation is None:
+            return CurrencySerializer(obj.currency).data
+        return representation
+
     def get_price(self, obj):
         return obj.price
 
@@ -1,11 +1,42 @@
+from django.core.files.storage import default_storage
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from api.models import Image
 
 
+def build_srcset(variants, storage=None):
+    """
+    Компактный манифест для клиента: размеры исходника и srcset-строка на каждый формат.
+    """
+    if not variants or not variants.get('files'):
+        return None
+    storage = storage or default_storage
+    srcset = {'width': variants['width'], 'height': variants['height']}
+    for name, files in variants['files'].items():
+        srcset[name] = ', '.join(f'{storage.url(path)} {width}w' for width, path in files)
+    return srcset
+
+
 class ImageSerializer(serializers.ModelSerializer):
     """
-    Сериализатор для модели Image, включает поле 'id' и 'image_original'.
+    Сериализатор для модели Image, включает поле 'id', 'image_original' и манифест уменьшенных копий 'srcset'.
     """
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ['id', 'image_original']
+        fields = ['id', 'image_original', 'srcset']
+
+    @extend_schema_field({
+        'type': 'object',
+        'nullable': True,
+        'properties': {
+            'width': {'type': 'integer'},
+            'height': {'type': 'integer'},
+            'avif': {'type': 'string'},
+            'webp': {'type': 'string'},
+            'jpeg': {'type': 'string'},
+        },
+    })
+    def get_srcset(self, obj):
+        return build_srcset(obj.variants)
@@ -1,12 +1,27 @@
 import re
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from django.db import models
 from django.forms.models import model_to_dict
-from api.models import Product, ProductCategory, ProductCountry, ProductCurrency, ProductSize, ProductType, Image
+from api.models import Brand, Product, ProductCurrency, ProductType
 from api.serializers.color_serializers import ColorSerializer
 from api.serializers.country_serializers import ProductCountrySerializer
 from api.serializers.image_serializers import ImageSerializer
 from api.serializers.brand_serializers import BrandSerializer
 from api.serializers.currency_serializers import ProductCurrencySerializer
+from api.services.product_prefetch import load_product_relations
+from api.services.reference_data import get_reference_data
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка продуктов: загружает связи всей страницы пачкой до сериализации.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        products = list(iterable)
+        load_product_relations(products)
+        return super().to_representation(products)
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -20,15 +35,20 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'id', 'article', 'title_ru', 'title_en', 'slug', 'info', 'info_ru', 'weight', 'available',
+            'id', 'article', 'title_ru', 'title_en', 'slug', 'info', 'info_ru', 'available',
             'rating', 'popularity', 'categories', 'brand', 'countries', 'currencies', 'images', 'colors'
         ]
+        list_serializer_class = ProductListSerializer
+
+    def to_representation(self, instance):
+        load_product_relations([instance])
+        return super().to_representation(instance)
 
     def get_countries(self, obj):
         """
         Получает список стран, связанных с продуктом, включая их данные.
         """
-        countries_qs = ProductCountry.objects.filter(product=obj)
+        countries_qs = obj.productcountry_set.all()
 
         countries_data = ProductCountrySerializer(countries_qs, many=True, context=self.context).data
         return [country['country'] for country in countries_data]
@@ -38,7 +58,7 @@ class ProductSerializer(serializers.ModelSerializer):
         """
         Получает список категорий продукта без дочерних элементов.
         """
-        categories_qs = ProductCategory.objects.filter(product=obj)
+        categories_qs = obj.productcategory_set.all()
         categories_data = [model_to_dict(category.category) for category in categories_qs]
         for category_data in categories_data:
             category_data.pop('children', None)
@@ -64,7 +84,7 @@ class ProductSerializer(serializers.ModelSerializer):
         try:
             price = self.get_price_for_color(product_type)
             discount_price = self.get_discount_price_for_color(product_type)
-            product_sizes = ProductSize.objects.filter(product=product_type.product)
+            product_sizes = product_type.product.productsize_set.all()
 
             for product_size in product_sizes:
                 size_obj = {
@@ -82,16 +102,28 @@ class ProductSerializer(serializers.ModelSerializer):
         return sizes_data
 
     @staticmethod
-    def get_price_for_color(product_type):
+    def get_product_currency(product):
+        """
+        Возвращает единственную цену продукта из подгруженных данных, как ProductCurrency.objects.get.
+        """
+        product_currencies = list(product.productcurrency_set.all())
+        if not product_currencies:
+            raise ProductCurrency.DoesNotExist
+        if len(product_currencies) > 1:
+            raise ProductCurrency.MultipleObjectsReturned
+        return product_currencies[0]
+
+    @classmethod
+    def get_price_for_color(cls, product_type):
         try:
-            return ProductCurrency.objects.get(product_id=product_type.product_id).price
+            return cls.get_product_currency(product_type.product).price
         except ProductCurrency.DoesNotExist:
             return None
 
-    @staticmethod
-    def get_discount_price_for_color(product_type):
+    @classmethod
+    def get_discount_price_for_color(cls, product_type):
         try:
-            return ProductCurrency.objects.get(product_id=product_type.product_id).discount_price
+            return cls.get_product_currency(product_type.product).discount_price
         except ProductCurrency.DoesNotExist:
             return None
 
@@ -100,14 +132,15 @@ class ProductSerializer(serializers.ModelSerializer):
         Получает список доступных цветов для продукта, включая изображения и размеры для каждого цвета.
         """
         try:
-            product_types = ProductType.objects.filter(product_id=obj.id).select_related('color')
+            product_types = obj.producttype_set.all()
 
             colors_data = []
             for product_type in product_types:
                 color_serializer = ColorSerializer(product_type.color)
                 color_data = color_serializer.data
 
-                image_original = Image.objects.filter(product_id=obj.id).first().image_original
+                first_image = min(obj.images.all(), key=lambda image: image.pk, default=None)
+                image_original = first_image.image_original
                 color_data['image_original'] = image_original
 
                 sizes_data = self.get_sizes_for_color(product_type)
@@ -119,4 +152,38 @@ class ProductSerializer(serializers.ModelSerializer):
 
         except Exception as e:
             print(f"Error fetching ProductTypes for product_id {obj.id}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+class ProductCardSerializer(serializers.ModelSerializer):
+    """
+    Компактное представление продукта для сетки: поля строки продукта, бренд из снимка справочников,
+    эффективная цена (аннотация price) и первое изображение.
+
+    fields — список оставляемых полей; остальные не вычисляются. Миниатюры передаются в context['thumbnails'].
+    """
+    brand = serializers.SerializerMethodField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, allow_null=True)
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'article', 'title_ru', 'title_en', 'slug', 'available', 'rating', 'popularity',
+            'brand', 'price', 'thumbnail'
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @extend_schema_field(BrandSerializer)
+    def get_brand(self, obj):
+        representation = get_reference_data().get_representation(Brand, obj.brand_id, BrandSerializer)
+        if representation is None:
+            return BrandSerializer(obj.brand).data
+        return representation
+
+    def get_thumbnail(self, obj):
+        return self.context.get('thumbnails', {}).get(obj.id)
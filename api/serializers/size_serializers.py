@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from api.models import Size, ProductSize
+from api.models import Size
+from api.services.reference_data import get_reference_data
 
 class SizeSerializer(serializers.ModelSerializer):
     name = serializers.SerializerMethodField()
@@ -25,4 +26,4 @@ class SizeSerializer(serializers.ModelSerializer):
     def get_product_count(self, obj):
         if hasattr(obj, 'product_count'):
             return obj.product_count
-        return ProductSize.objects.filter(size=obj).count()
\ No newline at end of file
+        return get_reference_data().get_count(Size, obj.id)
\ No newline at end of file
@@ -5,4 +5,4 @@ from api.models import SizeTable
 class SizeTableSerializer(serializers.ModelSerializer):
     class Meta:
         model = SizeTable
-        fields = ['name', 'category_id', 'data']
\ No newline at end of file
+        fields = ['id', 'name', 'category_id', 'data']
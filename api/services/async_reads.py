@@ -0,0 +1,84 @@
+import threading
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from api.services.query_profiler import current_profile, record_queries
+
+
+def parallel_reads_enabled():
+    return getattr(settings, 'ASYNC_PARALLEL_READS', False)
+
+
+_parallel_reads = None
+_parallel_reads_lock = threading.Lock()
+
+
+def get_parallel_reads_semaphore():
+    global _parallel_reads
+    if _parallel_reads is None:
+        with _parallel_reads_lock:
+            if _parallel_reads is None:
+                _parallel_reads = threading.BoundedSemaphore(getattr(settings, 'ASYNC_PARALLEL_READS_LIMIT', 8))
+    return _parallel_reads
+
+
+def run_in_own_connection(func, *args, **kwargs):
+    """
+    Выполняет функцию в рабочем потоке со своим соединением с БД и закрывает его по правилам CONN_MAX_AGE.
+    Одновременно таких соединений в процессе не больше ASYNC_PARALLEL_READS_LIMIT.
+    """
+    with get_parallel_reads_semaphore():
+        close_old_connections()
+        try:
+            return run_recorded(func, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+def run_recorded(func, *args, **kwargs):
+    with record_queries():
+        return func(*args, **kwargs)
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Вызывает синхронный сервис из async-вьюхи.
+
+    С ASYNC_PARALLEL_READS независимые вызовы, собранные через asyncio.gather, идут параллельно
+    в отдельных потоках и соединениях; иначе — по очереди в общем потоке, как async ORM Django.
+    """
+    if parallel_reads_enabled():
+        return await sync_to_async(partial(run_in_own_connection, func, *args, **kwargs), thread_sensitive=False)()
+    return await sync_to_async(partial(run_recorded, func, *args, **kwargs))()
+
+
+def use_run_sync():
+    """
+    Профилируемые запросы тоже идут через run_sync: async ORM Django не даёт подключить счётчик SQL.
+    """
+    return parallel_reads_enabled() or current_profile.get() is not None
+
+
+async def fetch_list(queryset):
+    if use_run_sync():
+        return await run_sync(list, queryset)
+    return [item async for item in queryset]
+
+
+async def fetch_count(queryset):
+    if use_run_sync():
+        return await run_sync(queryset.count)
+    return await queryset.acount()
+
+
+async def fetch_first(queryset):
+    if use_run_sync():
+        return await run_sync(queryset.first)
+    return await queryset.afirst()
+
+
+async def fetch_aggregate(queryset, **aggregates):
+    if use_run_sync():
+        return await run_sync(queryset.aggregate, **aggregates)
+    return await queryset.aaggregate(**aggregates)
@@ -0,0 +1,42 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_versions_cache():
+    """
+    Кеш версий: общий для всех процессов, иначе инвалидация в одном воркере не видна остальным.
+    """
+    return caches[getattr(settings, 'CACHE_VERSIONS_ALIAS', 'default')]
+
+
+def new_version():
+    """
+    Новое значение версии; не совпадает с ранее выданными даже после вытеснения ключа из кеша.
+    """
+    return time.time_ns()
+
+
+def get_version(key):
+    return get_versions_cache().get_or_set(key, new_version, None)
+
+
+def bump_version(key):
+    """
+    Ставит новую версию вместо incr: на FileBasedCache incr не атомарен между процессами,
+    и два одновременных сброса дали бы одну и ту же версию.
+    """
+    get_versions_cache().set(key, new_version(), None)
+
+
+def get_versions(keys):
+    """
+    Возвращает версии для нескольких ключей одним обращением к кешу, создавая отсутствующие.
+    """
+    cache = get_versions_cache()
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
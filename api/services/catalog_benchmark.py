@@ -0,0 +1,184 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from api.models import Category, Product
+from api.services.catalog_import import CatalogImporter
+from api.services.query_profiler import percentile
+from api.services.response_cache import bump_catalog_version
+
+
+BENCHMARK_ARTICLE_PREFIX = 'BENCH-'
+SORT_OPTIONS = ['popular', 'popular_desc', 'rating', 'rating_desc', 'price', 'price_desc']
+TITLE_WORDS = [
+    'jacket', 'coat', 'parka', 'hoodie', 'sweater', 'shirt', 'dress', 'skirt', 'jeans', 'trousers',
+    'sneakers', 'boots', 'loafers', 'scarf', 'cap', 'bag', 'wool', 'cotton', 'leather', 'denim',
+]
+COLOR_NAMES = ['Black', 'White', 'Red', 'Blue', 'Green', 'Beige', 'Grey', 'Brown', 'Navy', 'Pink']
+SIZE_NAMES = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', '36', '38', '40', '42', '44', '46', '48']
+COUNTRY_CODES = ['RU', 'IT', 'FR', 'DE', 'US', 'CN', 'TR', 'PT']
+CURRENCIES = {'RUB': Decimal('1'), 'USD': Decimal('0.011'), 'EUR': Decimal('0.010')}
+
+
+def build_category_paths(depth, breadth):
+    """
+    Пути всех листьев полного дерева категорий глубины depth с breadth потомками у каждого узла.
+    """
+    paths = [()]
+    for level in range(depth):
+        paths = [path + (f'{path[-1] if path else "Category"} {index}',) for path in paths for index in range(breadth)]
+    return paths
+
+
+def build_synthetic_feed(products, brands=50, category_depth=4, category_breadth=3, currencies=1, seed=42):
+    """
+    Генерирует записи фида (формата import_catalog) для синтетического каталога с фиксированным seed.
+    """
+    rng = random.Random(seed)
+    leaf_paths = build_category_paths(category_depth, category_breadth)
+    records = []
+    for index in range(products):
+        title = ' '.join(rng.sample(TITLE_WORDS, 3)).capitalize()
+        base_price = Decimal(rng.randrange(500, 50000))
+        colors = rng.sample(COLOR_NAMES, rng.randint(1, 4))
+        records.append({
+            'article': f'{BENCHMARK_ARTICLE_PREFIX}{index}',
+            'title_en': f'{title} {index}',
+            'title_ru': f'{title} {index}',
+            'info': f'{title}. Synthetic benchmark product.',
+            'brand': f'Brand {rng.randrange(brands)}',
+            'categories': [list(path) for path in rng.sample(leaf_paths, min(len(leaf_paths), rng.randint(1, 2)))],
+            'countries': rng.sample(COUNTRY_CODES, rng.randint(1, 3)),
+            'prices': [
+                {
+                    'currency': code,
+                    'price': str((base_price * rate).quantize(Decimal('0.01'))),
+                    'discount_price': str((base_price * rate * Decimal('0.8')).quantize(Decimal('0.01')))
+                    if rng.random() < 0.3 else None,
+                }
+                for code, rate in list(CURRENCIES.items())[:currencies]
+            ],
+            'sizes': rng.sample(SIZE_NAMES, rng.randint(3, 7)),
+            'colors': [{'name': color, 'type': {'sku': f'{index}-{color}'}} for color in colors],
+            'images': [
+                {'url': f'https://example.com/bench/{index}/{number}.jpg'} for number in range(rng.randint(2, 5))
+            ],
+        })
+    return records
+
+
+def generate_catalog(products, brands=50, category_depth=4, category_breadth=3, currencies=1, seed=42,
+                     batch_size=1000):
+    """
+    Заполняет базу синтетическим каталогом через CatalogImporter и проставляет рейтинг и популярность.
+    """
+    feed = build_synthetic_feed(products, brands, category_depth, category_breadth, currencies, seed)
+    stats, timings = CatalogImporter(batch_size=batch_size).run(feed)
+
+    rng = random.Random(seed)
+    catalog = list(Product.objects.filter(article__startswith=BENCHMARK_ARTICLE_PREFIX).order_by('id'))
+    for product in catalog:
+        product.popularity = rng.randrange(10000)
+        product.rating = Decimal(rng.randrange(0, 50)) / 10
+    Product.objects.bulk_update(catalog, ['popularity', 'rating'], batch_size=batch_size)
+    bump_catalog_version(Product)
+    return stats, timings
+
+
+def get_scenarios(seed=42):
+    """
+    Фиксированный набор сценариев: (имя, метод, путь, параметры или тело запроса).
+    """
+    rng = random.Random(seed)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    category_ids = list(Category.objects.filter(level=1).order_by('id').values_list('id', flat=True)) \
+        or list(Category.objects.order_by('id').values_list('id', flat=True))
+    category_id = category_ids[len(category_ids) // 2] if category_ids else None
+    category_params = {'category': category_id} if category_id else {}
+    products_url = reverse('api:product-list')
+
+    scenarios = [('list_default', 'get', products_url, {})]
+    for sort in SORT_OPTIONS:
+        scenarios.append((f'list_{sort}', 'get', products_url, {**category_params, 'sort': sort}))
+    scenarios += [
+        ('search', 'get', products_url, {'search': rng.choice(TITLE_WORDS)}),
+        ('facets', 'get', reverse('api:product-facets'), category_params),
+    ]
+    if category_id:
+        scenarios += [
+            ('category_brands', 'get', reverse('api:category-brands', args=[category_id]), {}),
+            ('category_sizes', 'get', reverse('api:category-sizes', args=[category_id]), {}),
+        ]
+    if product_ids:
+        scenarios += [
+            ('retrieve', 'get', reverse('api:product-detail', args=[rng.choice(product_ids)]), {}),
+            ('ids', 'post', reverse('api:product-get-products-by-ids'),
+             {'ids': rng.sample(product_ids, min(24, len(product_ids)))}),
+        ]
+    return scenarios
+
+
+def perform(client, method, path, data):
+    # Каждый запрос мимо кеша ответов: измеряется сам путь чтения, а не попадание в кеш.
+    bump_catalog_version(Product)
+    if method == 'post':
+        return client.post(path, json.dumps(data), content_type='application/json')
+    return client.get(path, data)
+
+
+def run_scenario(client, method, path, data, iterations=20, warmup=1):
+    """
+    Прогоняет один сценарий: латентность и число запросов по iterations повторам, память — отдельным прогоном.
+    """
+    for _ in range(warmup):
+        perform(client, method, path, data)
+
+    latencies, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = perform(client, method, path, data)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    tracemalloc.start()
+    try:
+        perform(client, method, path, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'path': path,
+        'method': method.upper(),
+        'params': data,
+        'status': sorted(statuses),
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_bytes': len(response.content),
+    }
+
+
+def run_benchmark(iterations=20, warmup=1, seed=42, only=None):
+    """
+    Прогоняет все сценарии (или перечисленные в only) и возвращает результаты по именам.
+    """
+    client = Client(raise_request_exception=False)
+    results = {}
+    for name, method, path, data in get_scenarios(seed):
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(client, method, path, data, iterations, warmup)
+    return results
@@ -0,0 +1,91 @@
+import csv
+import json
+from api.models import Product
+from api.services.product_documents import get_product_documents
+
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+CSV_FIELDS = [
+    'id', 'article', 'title_ru', 'title_en', 'slug', 'available', 'rating', 'popularity', 'brand',
+    'categories', 'countries', 'currency', 'price', 'discount_price', 'colors', 'sizes', 'image',
+]
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает записанную строку вместо хранения.
+    """
+    def write(self, value):
+        return value
+
+
+def get_export_queryset(base_queryset):
+    """
+    Уникальные продукты из отфильтрованного набора в порядке id.
+    """
+    return Product.objects.filter(id__in=base_queryset.order_by().values('id')).order_by('id')
+
+
+def iter_document_batches(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Читает продукты серверным курсором и отдаёт документы пачками по chunk_size.
+    """
+    batch = []
+    for product in queryset.only('id').iterator(chunk_size=chunk_size):
+        batch.append(product)
+        if len(batch) >= chunk_size:
+            yield get_product_documents(batch)
+            batch = []
+    if batch:
+        yield get_product_documents(batch)
+
+
+def document_to_row(document):
+    currency = document['currencies'][0] if document['currencies'] else None
+    first_image = document['images'][0]['image_original'] if document['images'] else None
+    return {
+        'id': document['id'],
+        'article': document['article'],
+        'title_ru': document['title_ru'],
+        'title_en': document['title_en'],
+        'slug': document['slug'],
+        'available': document['available'],
+        'rating': document['rating'],
+        'popularity': document['popularity'],
+        'brand': document['brand']['name'] if document.get('brand') else None,
+        'categories': '|'.join(str(category['id']) for category in document['categories']),
+        'countries': '|'.join(country['iso_code'] or '' for country in document['countries']),
+        'currency': currency['currency']['code'] if currency else None,
+        'price': currency['price'] if currency else None,
+        'discount_price': next(
+            (size['discount_price'] for color in document['colors'] for size in color['sizes']), None
+        ),
+        'colors': '|'.join(color.get('name') or '' for color in document['colors']),
+        'sizes': '|'.join(sorted({size['name'] or '' for color in document['colors'] for size in color['sizes']})),
+        'image': json.dumps(first_image, ensure_ascii=False) if first_image is not None else None,
+    }
+
+
+def iter_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    for documents in iter_document_batches(queryset, chunk_size):
+        yield ''.join(json.dumps(document, ensure_ascii=False) + '\n' for document in documents)
+
+
+def iter_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.DictWriter(Echo(), fieldnames=CSV_FIELDS)
+    yield writer.writeheader()
+    for documents in iter_document_batches(queryset, chunk_size):
+        yield ''.join(writer.writerow(document_to_row(document)) for document in documents)
+
+
+def iter_export(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Возвращает генератор строк выгрузки в формате ndjson или csv.
+    """
+    if export_format == 'csv':
+        return iter_csv(queryset, chunk_size)
+    return iter_ndjson(queryset, chunk_size)
@@ -0,0 +1,452 @@
+import csv
+import json
+import time
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from autoslug.utils import crop_slug
+from django.db import transaction
+from api.models import (
+    Brand, Product, Category, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry,
+    Currency, ProductCurrency, Image
+)
+from api.services.category_menu import invalidate_category_menu
+from api.services.category_tree import invalidate_category_tree
+from api.services.filter_index import invalidate_filter_index
+from api.services.price_bounds import invalidate_price_bounds
+from api.services.product_documents import refresh_product_documents
+from api.services.product_prices import refresh_product_prices
+from api.services.product_search import get_search_backend
+from api.services.reference_data import invalidate_reference_data
+from api.services.size_tokens import ensure_size_tokens
+from api.services.response_cache import CATALOG_MODELS, bump_catalog_version
+
+
+IMPORT_BATCH_SIZE = 1000
+CATEGORY_PATH_SEPARATOR = '>'
+LIST_SEPARATOR = '|'
+PRODUCT_UPDATE_FIELDS = [
+    'title_ru', 'title_en', 'info_ru', 'info', 'product_url', 'website_name', 'available', 'brand',
+]
+
+
+def to_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def to_decimal(value):
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def split_list(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def normalize_record(raw):
+    """
+    Приводит запись фида (JSON или строку CSV) к единому виду.
+
+    Ожидаемые поля: article, title_en, title_ru, info, info_ru, product_url, website_name, available,
+    brand, categories (пути вида "Одежда > Куртки" или списки имён), countries (iso-коды или объекты),
+    prices (или currency/price/discount_price), sizes, colors (имя или {name, code, type}) и images
+    (значения image_original).
+    """
+    prices = raw.get('prices')
+    if prices is None and raw.get('currency'):
+        prices = [{'currency': raw['currency'], 'price': raw.get('price'), 'discount_price': raw.get('discount_price')}]
+
+    images = raw.get('images') or []
+    if isinstance(images, str):
+        images = json.loads(images)
+
+    return {
+        'article': str(raw['article']).strip(),
+        'title_en': raw.get('title_en') or raw.get('title_ru') or str(raw['article']),
+        'title_ru': raw.get('title_ru') or None,
+        'info': raw.get('info') or None,
+        'info_ru': raw.get('info_ru') or None,
+        'product_url': raw.get('product_url') or None,
+        'website_name': raw.get('website_name') or None,
+        'available': to_bool(raw.get('available')),
+        'brand': (raw.get('brand') or '').strip(),
+        'categories': [
+            tuple(path) if isinstance(path, list) else tuple(part.strip() for part in path.split(CATEGORY_PATH_SEPARATOR))
+            for path in split_list(raw.get('categories'))
+        ],
+        'countries': [
+            country if isinstance(country, dict) else {'iso_code': country}
+            for country in split_list(raw.get('countries'))
+        ],
+        'prices': [
+            {
+                'currency': price['currency'] if isinstance(price['currency'], dict) else {'code': price['currency']},
+                'price': to_decimal(price.get('price')),
+                'discount_price': to_decimal(price.get('discount_price')),
+                'available': to_bool(price.get('available')),
+            }
+            for price in prices or []
+        ],
+        'sizes': [
+            size if isinstance(size, dict) else {'raw_size': size}
+            for size in split_list(raw.get('sizes'))
+        ],
+        'colors': [
+            color if isinstance(color, dict) else {'name': color}
+            for color in split_list(raw.get('colors'))
+        ],
+        'images': images if isinstance(images, list) else [images],
+    }
+
+
+def read_feed(path, feed_format=None):
+    """
+    Читает фид из JSON-массива, NDJSON или CSV и возвращает записи по одной.
+    """
+    feed_format = feed_format or path.rsplit('.', 1)[-1].lower()
+    with open(path, encoding='utf-8', newline='') as feed:
+        if feed_format == 'csv':
+            yield from csv.DictReader(feed)
+        elif feed_format == 'json':
+            yield from json.load(feed)
+        else:
+            for line in feed:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def generate_unique_slugs(model, values, existing_slugs):
+    """
+    Генерирует уникальные слаги так же, как AutoSlugField, но без запроса на каждый объект.
+    """
+    field = model._meta.get_field('slug')
+    slugs = []
+    for value in values:
+        base = crop_slug(field, field.slugify(value or '') or model._meta.model_name)
+        slug, index = base, 1
+        while slug in existing_slugs:
+            index += 1
+            tail = f'{field.index_sep}{index}'
+            slug = base[:field.max_length - len(tail)] + tail
+        existing_slugs.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+@contextmanager
+def preset_slugs(*models):
+    """
+    Отключает AutoSlugField.pre_save, чтобы bulk_create использовал заранее сгенерированные слаги.
+
+    Поле модели общее для процесса, поэтому использовать только в management-командах.
+    """
+    fields = [model._meta.get_field('slug') for model in models]
+    for field in fields:
+        field.pre_save = lambda instance, add, field=field: getattr(instance, field.attname)
+    try:
+        yield
+    finally:
+        for field in fields:
+            del field.pre_save
+
+
+class CatalogImporter:
+    """
+    Пакетный импорт каталога: справочники, продукты (upsert по article) и их связи.
+    """
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.timings = {}
+        self.stats = {}
+        self.product_slugs = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        yield
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def run(self, raw_records):
+        with self.stage('parse'):
+            records = {}
+            for raw in raw_records:
+                if raw.get('article'):
+                    record = normalize_record(raw)
+                    records[record['article']] = record
+            # Продукт без бренда сохранить нельзя (brand обязателен): запись пропускается и не считается импортированной.
+            skipped = [record for record in records.values() if not record['brand']]
+            records = [record for record in records.values() if record['brand']]
+        self.stats['products'] = len(records)
+        self.stats['skipped'] = len(skipped)
+
+        with transaction.atomic():
+            with preset_slugs(Product, Category):
+                with self.stage('reference data'):
+                    self.brands = self.resolve_named(
+                        Brand, 'name', [{'name': record['brand']} for record in records],
+                        lambda data: Brand(name=data['name']),
+                    )
+                    self.countries = self.resolve_named(
+                        Country, 'iso_code', [country for record in records for country in record['countries']],
+                        lambda data: Country(iso_code=data['iso_code'], name_ru=data.get('name_ru') or data['iso_code'],
+                                             name_en=data.get('name_en') or data['iso_code']),
+                    )
+                    self.currencies = self.resolve_named(
+                        Currency, 'code', [price['currency'] for record in records for price in record['prices']],
+                        lambda data: Currency(code=data['code'], name=data.get('name') or data['code'],
+                                              symbol=data.get('symbol') or data['code']),
+                    )
+                    self.colors = self.resolve_named(
+                        Color, 'name', [color for record in records for color in record['colors']],
+                        lambda data: Color(name=data['name'], code=data.get('code')),
+                    )
+                    self.sizes = self.resolve_named(
+                        Size, 'raw_size', [size for record in records for size in record['sizes']],
+                        lambda data: Size(raw_size=data['raw_size']),
+                    )
+                    if self.stats.get('size_created'):
+                        ensure_size_tokens(self.sizes.values())
+
+                with self.stage('categories'):
+                    self.categories = self.resolve_categories(records)
+
+                product_ids = []
+                for start in range(0, len(records), self.batch_size):
+                    batch = records[start:start + self.batch_size]
+                    with self.stage('products'):
+                        article_ids = self.upsert_products(batch)
+                    with self.stage('relations'):
+                        self.sync_relations(batch, article_ids)
+                    with self.stage('prices'):
+                        refresh_product_prices(article_ids.values(), batch_size=self.batch_size)
+                    product_ids.extend(article_ids.values())
+
+            with self.stage('category tree rebuild'):
+                if self.stats.get('categories_created'):
+                    Category.objects.rebuild()
+
+            if self.dry_run:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(lambda: self.refresh_derived_data(product_ids))
+
+        return self.stats, self.timings
+
+    def resolve_named(self, model, key, items, factory):
+        """
+        Возвращает {значение ключа: id} для справочника, создавая недостающие записи одним bulk_create.
+        """
+        wanted = {}
+        for item in items:
+            if item.get(key):
+                wanted.setdefault(item[key], item)
+        existing = dict(model.objects.filter(**{f'{key}__in': list(wanted)}).values_list(key, 'id'))
+        missing = [factory(data) for value, data in wanted.items() if value not in existing]
+        model.objects.bulk_create(missing, batch_size=self.batch_size)
+        self.stats[f'{model._meta.model_name}_created'] = len(missing)
+        if missing:
+            existing.update(model.objects.filter(**{f'{key}__in': [getattr(obj, key) for obj in missing]}).values_list(key, 'id'))
+        return existing
+
+    def resolve_categories(self, records):
+        """
+        Находит или создаёт категории по путям из имён; дерево MPTT перестраивается один раз в конце.
+        """
+        nodes = {(category.parent_id, category.name_en): category.id for category in Category.objects.all()}
+        existing_slugs = set(Category.objects.values_list('slug', flat=True))
+        paths = {path for record in records for path in record['categories'] if path}
+        resolved = {}
+        created = 0
+
+        max_depth = max((len(path) for path in paths), default=0)
+        for depth in range(1, max_depth + 1):
+            level_paths = sorted({path[:depth] for path in paths if len(path) >= depth})
+            pending = []
+            for path in level_paths:
+                parent_id = resolved.get(path[:-1]) if depth > 1 else None
+                if (parent_id, path[-1]) in nodes:
+                    resolved[path] = nodes[(parent_id, path[-1])]
+                else:
+                    pending.append((path, parent_id))
+
+            slugs = generate_unique_slugs(Category, [path[-1] for path, _ in pending], existing_slugs)
+            new_categories = [
+                Category(name_en=path[-1], name_ru=path[-1], slug=slug, parent_id=parent_id,
+                         lft=0, rght=0, tree_id=0, level=depth - 1)
+                for (path, parent_id), slug in zip(pending, slugs)
+            ]
+            Category.objects.bulk_create(new_categories, batch_size=self.batch_size)
+            created += len(new_categories)
+
+            if new_categories:
+                created_ids = dict(Category.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+                for (path, parent_id), slug in zip(pending, slugs):
+                    resolved[path] = nodes[(parent_id, path[-1])] = created_ids[slug]
+
+        self.stats['categories_created'] = created
+        return resolved
+
+    def upsert_products(self, batch):
+        articles = [record['article'] for record in batch]
+        existing = dict(Product.objects.filter(article__in=articles).values_list('article', 'slug'))
+        if self.product_slugs is None:
+            self.product_slugs = set(Product.objects.values_list('slug', flat=True))
+
+        new_records = [record for record in batch if record['article'] not in existing]
+        new_slugs = dict(zip(
+            (record['article'] for record in new_records),
+            generate_unique_slugs(Product, [record['title_en'] for record in new_records], self.product_slugs),
+        ))
+
+        products = []
+        for record in batch:
+            products.append(Product(
+                article=record['article'],
+                slug=existing.get(record['article']) or new_slugs[record['article']],
+                title_en=record['title_en'],
+                title_ru=record['title_ru'],
+                info=record['info'],
+                info_ru=record['info_ru'],
+                product_url=record['product_url'],
+                website_name=record['website_name'],
+                available=record['available'],
+                brand_id=self.brands[record['brand']],
+            ))
+
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['article'],
+            update_fields=PRODUCT_UPDATE_FIELDS + ['updated'],
+        )
+        self.stats['products_created'] = self.stats.get('products_created', 0) + len(new_records)
+        return dict(Product.objects.filter(article__in=articles).values_list('article', 'id'))
+
+    @staticmethod
+    def delete_stale_links(model, field, wanted, product_ids):
+        """
+        Удаляет связи продуктов пачки, которых нет в фиде; wanted содержит пары (product_id, field_id).
+        """
+        existing = model.objects.filter(product_id__in=product_ids).values_list('id', 'product_id', field)
+        stale = [pk for pk, product_id, value in existing if (product_id, value) not in wanted]
+        if stale:
+            model.objects.filter(id__in=stale).delete()
+
+    def sync_relations(self, batch, article_ids):
+        product_ids = list(article_ids.values())
+        categories, countries, currencies, sizes, types, images = set(), set(), {}, {}, {}, {}
+
+        for record in batch:
+            product_id = article_ids.get(record['article'])
+            if product_id is None:
+                continue
+            for path in record['categories']:
+                if path in self.categories:
+                    categories.add((product_id, self.categories[path]))
+            for country in record['countries']:
+                if country.get('iso_code') in self.countries:
+                    countries.add((product_id, self.countries[country['iso_code']]))
+            for price in record['prices']:
+                currency_id = self.currencies.get(price['currency'].get('code'))
+                if currency_id:
+                    currencies[(product_id, currency_id)] = price
+            for size in record['sizes']:
+                size_id = self.sizes.get(size.get('raw_size'))
+                if size_id:
+                    sizes[(product_id, size_id)] = to_bool(size.get('available'))
+            for color in record['colors']:
+                types[(product_id, self.colors.get(color.get('name')))] = color
+            images[product_id] = [json.dumps(image, sort_keys=True) for image in record['images']]
+
+        self.delete_stale_links(ProductCategory, 'category_id', categories, product_ids)
+        ProductCategory.objects.bulk_create(
+            [ProductCategory(product_id=product_id, category_id=category_id) for product_id, category_id in categories],
+            ignore_conflicts=True,
+        )
+
+        self.delete_stale_links(ProductCountry, 'country_id', countries, product_ids)
+        ProductCountry.objects.bulk_create(
+            [ProductCountry(product_id=product_id, country_id=country_id) for product_id, country_id in countries],
+            ignore_conflicts=True,
+        )
+
+        self.delete_stale_links(ProductCurrency, 'currency_id', currencies, product_ids)
+        ProductCurrency.objects.bulk_create(
+            [
+                ProductCurrency(product_id=product_id, currency_id=currency_id, price=price['price'],
+                                discount_price=price['discount_price'], available=price['available'])
+                for (product_id, currency_id), price in currencies.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'currency'],
+            update_fields=['price', 'discount_price', 'available'],
+        )
+
+        self.delete_stale_links(ProductSize, 'size_id', sizes, product_ids)
+        ProductSize.objects.bulk_create(
+            [
+                ProductSize(product_id=product_id, size_id=size_id, is_available=is_available)
+                for (product_id, size_id), is_available in sizes.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'size'],
+            update_fields=['is_available'],
+        )
+
+        self.delete_stale_links(ProductType, 'color_id', types, product_ids)
+        existing_types = {
+            (product_type.product_id, product_type.color_id): product_type
+            for product_type in ProductType.objects.filter(product_id__in=product_ids)
+        }
+        updated_types, new_types = [], []
+        for (product_id, color_id), color in types.items():
+            product_type = existing_types.get((product_id, color_id))
+            if product_type is None:
+                new_types.append(ProductType(product_id=product_id, color_id=color_id, type=color.get('type'),
+                                             is_available=to_bool(color.get('available'))))
+            else:
+                product_type.type = color.get('type')
+                product_type.is_available = to_bool(color.get('available'))
+                updated_types.append(product_type)
+        ProductType.objects.bulk_update(updated_types, ['type', 'is_available'], batch_size=self.batch_size)
+        ProductType.objects.bulk_create(new_types, batch_size=self.batch_size)
+
+        existing_images = {}
+        for image_id, product_id, image_original in Image.objects.filter(
+                product_id__in=product_ids).values_list('id', 'product_id', 'image_original'):
+            existing_images[(product_id, json.dumps(image_original, sort_keys=True))] = image_id
+        wanted_images = {(product_id, image) for product_id, product_images in images.items() for image in product_images}
+        Image.objects.filter(id__in=[pk for key, pk in existing_images.items() if key not in wanted_images]).delete()
+        Image.objects.bulk_create([
+            Image(product_id=product_id, image_original=json.loads(image))
+            for product_id, product_images in images.items()
+            for image in product_images
+            if (product_id, image) not in existing_images
+        ], batch_size=self.batch_size)
+
+    def refresh_derived_data(self, product_ids):
+        """
+        bulk-операции не отправляют сигналы, поэтому кеши и документы обновляются здесь одним проходом.
+        """
+        with self.stage('derived data'):
+            for model in CATALOG_MODELS:
+                bump_catalog_version(model)
+            invalidate_category_tree()
+            invalidate_category_menu()
+            invalidate_price_bounds()
+            invalidate_filter_index()
+            invalidate_reference_data()
+            get_search_backend().update_search_vectors(product_ids)
+            refresh_product_documents(product_ids, batch_size=self.batch_size)
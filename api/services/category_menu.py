@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+import time
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery
+from api.models import Category, ProductCategory
+from api.renderers import FastJSONRenderer
+from api.services.cache_versions import bump_version, get_version
+
+
+CATEGORY_MENU_VERSION_KEY = 'category_menu:version'
+CATEGORY_MENU_TIMEOUT = 60 * 60 * 24
+
+
+def get_subtree_counts():
+    """
+    {category_id: число различных продуктов в категории и её потомках} одним запросом по lft/rght.
+    """
+    subtree_products = ProductCategory.objects.filter(
+        category__tree_id=OuterRef('tree_id'),
+        category__lft__gte=OuterRef('lft'),
+        category__rght__lte=OuterRef('rght'),
+    ).order_by().values('category__tree_id').annotate(total=Count('product_id', distinct=True)).values('total')
+    return dict(Category.objects.annotate(product_count=Subquery(subtree_products)).values_list('id', 'product_count'))
+
+
+def build_menu_nodes():
+    """
+    Вложенное дерево категорий: id, названия, slug, число продуктов в поддереве и дети.
+    """
+    counts = get_subtree_counts()
+    nodes, roots = {}, []
+    for category in Category.objects.order_by('tree_id', 'lft'):
+        node = {
+            'id': category.id,
+            'name_ru': category.name_ru,
+            'name_en': category.name_en,
+            'slug': category.slug,
+            'product_count': counts.get(category.id) or 0,
+            'children': [],
+        }
+        nodes[category.id] = node
+        parent = nodes.get(category.parent_id)
+        (parent['children'] if parent else roots).append(node)
+    return roots
+
+
+class CategoryMenu:
+    """
+    Отрендеренное дерево одной версии: JSON целиком и разобранная структура для срезов root=/depth=.
+
+    Срезы запоминаются в entries в формате записей кеша ответов (см. response_cache.build_response),
+    поэтому условные запросы и сжатые варианты обслуживаются так же, как для кешированных ответов.
+    """
+    def __init__(self, version, content, built_at):
+        self.version = version
+        self.built_at = built_at
+        self.roots = json.loads(content)
+        self.by_key = {}
+        self.max_depth = 0
+        stack = [(node, 1) for node in self.roots]
+        while stack:
+            node, depth = stack.pop()
+            self.by_key[node['id']] = self.by_key[node['slug']] = node
+            self.max_depth = max(self.max_depth, depth)
+            stack.extend((child, depth + 1) for child in node['children'])
+        self.entries = {(None, None): self.make_entry(None, None, content)}
+
+    def make_entry(self, root, depth, content):
+        etag = hashlib.md5(repr((self.version, root, depth)).encode('utf-8')).hexdigest()
+        return {
+            'content': content,
+            'content_type': 'application/json',
+            'vary': None,
+            'etag': f'"{etag}"',
+            'last_modified': self.built_at,
+        }
+
+    def find(self, root):
+        """
+        Узел по id или slug (id может прийти строкой, в том числе с ведущими нулями) или None.
+        """
+        node = self.by_key.get(root)
+        if node is None and str(root).isdigit():
+            node = self.by_key.get(int(root))
+        return node
+
+    def get_entry(self, root=None, depth=None):
+        """
+        Запись кеша ответа для среза дерева или None, если корня root нет.
+
+        Ключ среза — id найденного узла, а не строка запроса: иначе root=5, 05, 005 ... плодили бы копии.
+        """
+        if depth is not None and depth >= self.max_depth:
+            depth = None
+        nodes, root_id = self.roots, None
+        if root is not None:
+            node = self.find(root)
+            if node is None:
+                return None
+            nodes, root_id = [node], node['id']
+        key = (root_id, depth)
+        if key not in self.entries:
+            self.entries[key] = self.make_entry(root_id, depth, FastJSONRenderer().render(slice_nodes(nodes, depth)))
+        return self.entries[key]
+
+
+def slice_nodes(nodes, depth):
+    """
+    Копия дерева до глубины depth (1 — только сами узлы); у обрезанных узлов children пустой.
+    """
+    if depth is None:
+        return nodes
+    return [
+        {**node, 'children': slice_nodes(node['children'], depth - 1) if depth > 1 else []}
+        for node in nodes
+    ]
+
+
+_menu = None
+_menu_lock = threading.Lock()
+
+
+def get_category_menu():
+    """
+    Дерево текущей версии: из памяти процесса, иначе из общего кеша, иначе строится и кладётся в кеш.
+    """
+    global _menu
+    version = get_version(CATEGORY_MENU_VERSION_KEY)
+    menu = _menu
+    if menu is None or menu.version != version:
+        with _menu_lock:
+            if _menu is None or _menu.version != version:
+                cache_key = f'category_menu:{version}'
+                blob = cache.get(cache_key)
+                if blob is None:
+                    blob = {'content': FastJSONRenderer().render(build_menu_nodes()), 'built_at': int(time.time())}
+                    cache.set(cache_key, blob, CATEGORY_MENU_TIMEOUT)
+                _menu = CategoryMenu(version, blob['content'], blob['built_at'])
+            menu = _menu
+    return menu
+
+
+def invalidate_category_menu():
+    bump_version(CATEGORY_MENU_VERSION_KEY)
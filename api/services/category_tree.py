@@ -0,0 +1,91 @@
+import threading
+from api.models import Category
+from api.services.cache_versions import bump_version, get_version
+
+
+CATEGORY_TREE_VERSION_KEY = 'category_tree:version'
+
+
+class CategoryTree:
+    """
+    Снимок всего дерева категорий в памяти процесса.
+
+    Узлы хранятся в порядке (tree_id, lft), поэтому потомки любого узла занимают
+    непрерывный отрезок этого списка; кортежи id потомков считаются один раз при загрузке.
+    """
+    def __init__(self, categories, version):
+        self.version = version
+        self.ordered_ids = [category.id for category in categories]
+        self.nodes = {category.id: category for category in categories}
+        self.parent_ids = {category.id: category.parent_id for category in categories}
+        self.slug_to_id = {category.slug: category.id for category in categories}
+        self.children_ids = {category.id: [] for category in categories}
+        for category in categories:
+            if category.parent_id in self.children_ids:
+                self.children_ids[category.parent_id].append(category.id)
+
+        self.descendant_ids = {}
+        for position, category in enumerate(categories):
+            size = (category.rght - category.lft - 1) // 2
+            self.descendant_ids[category.id] = tuple(self.ordered_ids[position:position + size + 1])
+
+    @classmethod
+    def load(cls, version):
+        return cls(list(Category.objects.order_by('tree_id', 'lft')), version)
+
+    def __contains__(self, category_id):
+        return self.resolve_id(category_id) is not None
+
+    @staticmethod
+    def normalize_id(category_id):
+        try:
+            return int(category_id)
+        except (TypeError, ValueError):
+            return None
+
+    def resolve_id(self, category_id=None, slug=None):
+        """
+        Возвращает id категории по id или slug, либо None, если такой категории нет.
+        """
+        if category_id:
+            category_id = self.normalize_id(category_id)
+            return category_id if category_id in self.nodes else None
+        if slug:
+            return self.slug_to_id.get(slug)
+        return None
+
+    def get(self, category_id):
+        return self.nodes.get(self.normalize_id(category_id))
+
+    def get_roots(self):
+        return [self.nodes[category_id] for category_id in self.ordered_ids if self.parent_ids[category_id] is None]
+
+    def get_children(self, category_id):
+        return [self.nodes[child_id] for child_id in self.children_ids.get(self.normalize_id(category_id), ())]
+
+    def get_descendant_ids(self, category_id, include_self=True):
+        descendant_ids = self.descendant_ids.get(self.normalize_id(category_id), ())
+        return descendant_ids if include_self else descendant_ids[1:]
+
+
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def get_category_tree():
+    """
+    Возвращает актуальное дерево категорий, перезагружая его при смене версии.
+    """
+    global _tree
+    version = get_version(CATEGORY_TREE_VERSION_KEY)
+    tree = _tree
+    if tree is None or tree.version != version:
+        with _tree_lock:
+            if _tree is None or _tree.version != version:
+                _tree = CategoryTree.load(version)
+            tree = _tree
+    return tree
+
+
+def invalidate_category_tree():
+    bump_version(CATEGORY_TREE_VERSION_KEY)
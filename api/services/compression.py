@@ -0,0 +1,126 @@
+import gzip
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'text/', 'application/x-ndjson')
+
+
+def compress_gzip(content):
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def compress_brotli(content):
+    return brotli.compress(content, quality=5)
+
+
+def compress_zstd(content):
+    return zstandard.ZstdCompressor(level=3).compress(content)
+
+
+def get_encoders():
+    """
+    Доступные кодировки в порядке предпочтения сервера; brotli и zstd — только если установлены пакеты.
+    """
+    encoders = {}
+    if zstandard is not None:
+        encoders['zstd'] = compress_zstd
+    if brotli is not None:
+        encoders['br'] = compress_brotli
+    encoders['gzip'] = compress_gzip
+    return encoders
+
+
+def parse_accept_encoding(header):
+    """
+    {кодировка: q} из заголовка Accept-Encoding.
+    """
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(request, size):
+    """
+    Кодировка для ответа размером size байт или None: меньше COMPRESSION_MIN_SIZE не сжимаем.
+    """
+    if not getattr(settings, 'COMPRESSION_ENABLED', True) or size < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+        return None
+    accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding in get_encoders():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding):
+    return get_encoders()[encoding](content)
+
+
+def is_compressible(response):
+    if getattr(response, 'streaming', False) or response.has_header('Content-Encoding'):
+        return False
+    return response.get('Content-Type', '').startswith(COMPRESSIBLE_CONTENT_TYPES)
+
+
+def compress_response(request, response):
+    """
+    Сжимает тело готового ответа, если клиент это поддерживает и тело не меньше COMPRESSION_MIN_SIZE.
+    """
+    if not is_compressible(response):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate_encoding(request, len(response.content))
+    if encoding is not None:
+        set_encoded_content(response, compress(response.content, encoding), encoding)
+    return response
+
+
+def set_encoded_content(response, content, encoding):
+    """
+    Подменяет тело ответа сжатым; ETag становится слабым, как в GZipMiddleware.
+    """
+    response.content = content
+    response['Content-Length'] = str(len(content))
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+
+
+def get_cached_body(request, entry):
+    """
+    Тело для записи кеша ответов: сжатые варианты хранятся в entry['compressed'] и считаются один раз.
+    Возвращает (тело, кодировка или None, True если добавлен новый сжатый вариант).
+    """
+    encoding = negotiate_encoding(request, len(entry['content']))
+    if encoding is None:
+        return entry['content'], None, False
+    compressed = entry.setdefault('compressed', {})
+    added = encoding not in compressed
+    if added:
+        compressed[encoding] = compress(entry['content'], encoding)
+    return compressed[encoding], encoding, added
+
@@ -0,0 +1,436 @@
+import copy
+import threading
+from django.conf import settings
+from api.models import (
+    Brand, Product, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry, ProductCurrency,
+    ProductPrice
+)
+from api.services.cache_versions import get_version, get_versions_cache, new_version
+from api.services.category_tree import get_category_tree
+from api.services.size_tokens import get_size_system, load_size_token_map, match_size_token_map
+
+
+FILTER_INDEX_VERSION_KEY = 'filter_index:version'
+FILTER_INDEX_CHANGE_TIMEOUT = 60 * 60
+FILTER_INDEX_MAX_PENDING_CHANGES = 500
+FILTER_INDEX_MAX_IDS = 5000
+INDEXED_PARAMS = {
+    'category', 'category_slug', 'brand', 'brand_filter', 'size', 'size_filter', 'size_system', 'color', 'color_filter',
+    'country', 'currency', 'discount', 'in_stock',
+}
+SQL_ONLY_PARAMS = {'min_price', 'max_price', 'has_price', 'search'}
+
+
+def to_bits(ordinals):
+    """
+    Собирает битовую маску (int) из номеров продуктов за один проход, без сдвига на каждый бит.
+    """
+    if not ordinals:
+        return 0
+    data = bytearray(max(ordinals) // 8 + 1)
+    for ordinal in ordinals:
+        data[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(data, 'little')
+
+
+def iter_ordinals(bits):
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield byte_index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def union(bitmaps, keys=None):
+    bits = 0
+    for key in bitmaps if keys is None else keys:
+        bits |= bitmaps.get(key, 0)
+    return bits
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+BITMAP_NAMES = ('brand', 'category', 'size', 'color', 'country', 'currency', 'discount', 'no_discount', 'in_stock')
+
+
+class FilterIndex:
+    """
+    Битовые маски продуктов по значениям фасетов: бренд, категория, размер, цвет, страна, валюта,
+    скидка и наличие. Продукт — бит с плотным номером (ordinal), фильтры — AND/OR масок,
+    счётчики фасетов — popcount пересечения.
+
+    Условия по одной связи, как и в SQL-фильтрах, относятся к одной строке: маски скидок
+    хранятся по валютам, а размер/цвет по id и по имени сводятся к одному набору id.
+    """
+    def __init__(self, version):
+        self.version = version
+        self.ids = []
+        self.ordinals = {}
+        self.universe = 0
+        self.brand = {}
+        self.category = {}
+        self.size = {}
+        self.color = {}
+        self.country = {}
+        self.currency = {}
+        self.discount = {}
+        self.no_discount = {}
+        self.in_stock = {}
+        self.prices = {}
+
+    @classmethod
+    def load(cls, version):
+        index = cls(version)
+        index.load_reference_data()
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        for product_id in product_ids:
+            index.get_ordinal(product_id)
+        rows = index.fetch_rows()
+        for name, grouped in index.group_rows(rows).items():
+            setattr(index, name, {key: to_bits(ordinals) for key, ordinals in grouped.items()})
+        index.universe = to_bits([index.ordinals[product_id] for product_id, _ in rows['types']])
+        index.prices = index.collect_prices(rows['prices'])
+        return index
+
+    def load_reference_data(self):
+        self.brand_names = dict(Brand.objects.values_list('id', 'name'))
+        self.size_names = dict(Size.objects.values_list('id', 'raw_size'))
+        self.size_tokens = load_size_token_map()
+        self.colors_info = {row[0]: row[1:] for row in Color.objects.values_list('id', 'name', 'code')}
+        self.countries_info = {
+            row[0]: row[1:] for row in Country.objects.values_list('id', 'name_ru', 'name_en', 'iso_code')
+        }
+
+    def get_ordinal(self, product_id):
+        ordinal = self.ordinals.get(product_id)
+        if ordinal is None:
+            ordinal = self.ordinals[product_id] = len(self.ids)
+            self.ids.append(product_id)
+        return ordinal
+
+    @staticmethod
+    def fetch_rows(product_ids=None):
+        def rows(model, *fields):
+            queryset = model.objects.all()
+            if product_ids is not None:
+                queryset = queryset.filter(**{'id__in' if model is Product else 'product_id__in': product_ids})
+            return list(queryset.values_list(*fields))
+
+        return {
+            'products': rows(Product, 'id', 'brand_id'),
+            'types': rows(ProductType, 'product_id', 'color_id'),
+            'categories': rows(ProductCategory, 'product_id', 'category_id'),
+            'sizes': rows(ProductSize, 'product_id', 'size_id', 'is_available'),
+            'countries': rows(ProductCountry, 'product_id', 'country_id'),
+            'currencies': rows(ProductCurrency, 'product_id', 'currency_id', 'price', 'discount_price'),
+            'prices': rows(ProductPrice, 'product_id', 'currency_id', 'price'),
+        }
+
+    def group_rows(self, rows):
+        grouped = {name: {} for name in BITMAP_NAMES}
+
+        def add(name, key, product_id):
+            grouped[name].setdefault(key, []).append(self.get_ordinal(product_id))
+
+        for product_id, brand_id in rows['products']:
+            add('brand', brand_id, product_id)
+        for product_id, color_id in rows['types']:
+            add('color', color_id, product_id)
+        for product_id, category_id in rows['categories']:
+            add('category', category_id, product_id)
+        for product_id, size_id, is_available in rows['sizes']:
+            add('size', size_id, product_id)
+            add('in_stock', is_available, product_id)
+        for product_id, country_id in rows['countries']:
+            add('country', country_id, product_id)
+        for product_id, currency_id, price, discount_price in rows['currencies']:
+            add('currency', currency_id, product_id)
+            add('discount' if discount_price and discount_price > 0 else 'no_discount', currency_id, product_id)
+        return grouped
+
+    def collect_prices(self, price_rows):
+        """
+        {ordinal: {currency_id: эффективная цена}} — те же цены, что у фильтра min_price/max_price.
+        """
+        prices = {}
+        for product_id, currency_id, price in price_rows:
+            prices.setdefault(self.ordinals[product_id], {})[currency_id] = price
+        return prices
+
+    def copy(self, version):
+        """
+        Копия для инкрементального обновления: читатели продолжают работать со старым индексом.
+        """
+        index = copy.copy(self)
+        index.version = version
+        index.ids = list(self.ids)
+        index.ordinals = dict(self.ordinals)
+        index.prices = dict(self.prices)
+        for name in BITMAP_NAMES:
+            setattr(index, name, dict(getattr(self, name)))
+        return index
+
+    def update_products(self, product_ids):
+        """
+        Инкрементально перечитывает строки указанных продуктов и обновляет их биты во всех масках.
+        """
+        product_ids = set(product_ids)
+        mask = 0
+        for product_id in product_ids:
+            mask |= 1 << self.get_ordinal(product_id)
+        keep = ~mask
+
+        for name in BITMAP_NAMES:
+            bitmaps = getattr(self, name)
+            for key, bits in bitmaps.items():
+                if bits & mask:
+                    bitmaps[key] = bits & keep
+        self.universe &= keep
+
+        rows = self.fetch_rows(list(product_ids))
+        for name, grouped in self.group_rows(rows).items():
+            bitmaps = getattr(self, name)
+            for key, ordinals in grouped.items():
+                bitmaps[key] = bitmaps.get(key, 0) | to_bits(ordinals)
+        for product_id, _ in rows['types']:
+            self.universe |= 1 << self.ordinals[product_id]
+        for product_id in product_ids:
+            self.prices.pop(self.ordinals[product_id], None)
+        self.prices.update(self.collect_prices(rows['prices']))
+
+    def match(self, query_params):
+        """
+        Возвращает маску продуктов, подходящих под фильтры ProductViewSet, или None,
+        если параметры нужно обрабатывать в SQL (цены, поиск, неизвестная категория).
+        """
+        if any(query_params.get(param) for param in SQL_ONLY_PARAMS):
+            return None
+        bits = self.universe
+
+        category_id = query_params.get('category')
+        category_slug = query_params.get('category_slug')
+        if category_id or category_slug:
+            tree = get_category_tree()
+            resolved_id = tree.resolve_id(category_id, category_slug)
+            if resolved_id is None:
+                return None
+            bits &= union(self.category, tree.get_descendant_ids(resolved_id))
+
+        currency_id = query_params.get('currency')
+        currency_ids = list(self.currency)
+        if currency_id:
+            currency_ids = [to_int(currency_id)]
+            if currency_ids[0] is None:
+                return None
+            bits &= union(self.currency, currency_ids)
+
+        discount = query_params.get('discount')
+        if discount:
+            bitmaps = self.discount if discount.lower() == 'true' else self.no_discount
+            bits &= union(bitmaps, currency_ids)
+
+        in_stock = query_params.get('in_stock')
+        if in_stock:
+            bits &= self.in_stock.get(in_stock.lower() == 'true', 0)
+
+        brand_ids = query_params.getlist('brand')
+        if brand_ids:
+            brand_ids = [to_int(brand_id) for brand_id in brand_ids]
+            if None in brand_ids:
+                return None
+            bits &= union(self.brand, brand_ids)
+        brand_name = query_params.get('brand_filter')
+        if brand_name:
+            bits &= union(self.brand, self.find_ids(self.brand_names, [brand_name]))
+
+        size_ids = self.select_ids(query_params.getlist('size'), {}, [])
+        size_names = query_params.getlist('size_filter')
+        if size_names:
+            found = match_size_token_map(self.size_tokens, size_names, get_size_system(query_params))
+            size_ids = found if size_ids is None else size_ids & found
+        if size_ids is not None:
+            bits &= union(self.size, size_ids)
+
+        color_ids = self.select_ids(
+            [query_params['color']] if query_params.get('color') else [],
+            {color_id: info[0] for color_id, info in self.colors_info.items()},
+            [query_params['color_filter']] if query_params.get('color_filter') else [],
+        )
+        if color_ids is not None:
+            bits &= union(self.color, color_ids)
+
+        country_ids = query_params.getlist('country')
+        if country_ids:
+            country_ids = [to_int(country_id) for country_id in country_ids]
+            if None in country_ids:
+                return None
+            bits &= union(self.country, country_ids)
+
+        return bits
+
+    @staticmethod
+    def find_ids(names, patterns):
+        patterns = [pattern.lower() for pattern in patterns]
+        return [
+            value_id for value_id, name in names.items()
+            if name and any(pattern in name.lower() for pattern in patterns)
+        ]
+
+    def select_ids(self, raw_ids, names, patterns):
+        """
+        Пересекает явные id значений с id, найденными по имени; None — если фильтра нет.
+        """
+        if not raw_ids and not patterns:
+            return None
+        selected = None
+        if raw_ids:
+            selected = {to_int(value_id) for value_id in raw_ids}
+        if patterns:
+            found = set(self.find_ids(names, patterns))
+            selected = found if selected is None else selected & found
+        return selected
+
+    def get_ids(self, bits):
+        return [self.ids[ordinal] for ordinal in iter_ordinals(bits)]
+
+    def facets(self, bits, currency_id=None):
+        """
+        Фасеты в формате compute_facets: счётчики — popcount пересечения масок.
+        """
+        def counts(bitmaps):
+            return {key: (bits & value).bit_count() for key, value in bitmaps.items() if key is not None}
+
+        currency_id = to_int(currency_id) if currency_id else None
+        prices = [
+            price
+            for ordinal in iter_ordinals(bits)
+            for price_currency_id, price in self.prices.get(ordinal, {}).items()
+            if currency_id is None or price_currency_id == currency_id
+        ]
+        brands = sorted(
+            ((brand_id, count) for brand_id, count in counts(self.brand).items() if count),
+            key=lambda item: self.brand_names.get(item[0]) or '',
+        )
+        sizes = sorted((size_id, count) for size_id, count in counts(self.size).items() if count)
+        colors = sorted((color_id, count) for color_id, count in counts(self.color).items() if count)
+        countries = sorted(
+            ((country_id, count) for country_id, count in counts(self.country).items() if count),
+            key=lambda item: self.countries_info[item[0]][0] or '',
+        )
+        return {
+            'count': bits.bit_count(),
+            'max_price_value': max(prices, default=None),
+            'min_price_value': min(prices, default=None),
+            'discount': (bits & union(self.discount)).bit_count(),
+            'in_stock': (bits & self.in_stock.get(True, 0)).bit_count(),
+            'brands': [
+                {'id': brand_id, 'name': self.brand_names.get(brand_id), 'product_count': count}
+                for brand_id, count in brands
+            ],
+            'sizes': [
+                {'id': size_id, 'name': self.size_names.get(size_id), 'product_count': count}
+                for size_id, count in sizes
+            ],
+            'colors': [
+                {'id': color_id, 'name': self.colors_info[color_id][0], 'code': self.colors_info[color_id][1],
+                 'product_count': count}
+                for color_id, count in colors
+            ],
+            'countries': [
+                {'id': country_id, 'name_ru': self.countries_info[country_id][0],
+                 'name_en': self.countries_info[country_id][1], 'iso_code': self.countries_info[country_id][2],
+                 'product_count': count}
+                for country_id, count in countries
+            ],
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def record_filter_index_change(product_ids=None):
+    """
+    Записывает изменение в журнал индекса; None означает полную перестройку (справочники, bulk-импорт).
+    Журнал лежит в кеше версий, чтобы изменения из одного процесса применяли все остальные.
+    """
+    cache = get_versions_cache()
+    try:
+        version = cache.incr(FILTER_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(FILTER_INDEX_VERSION_KEY, new_version(), None)
+        return
+    changes = None if product_ids is None else sorted(set(product_ids))
+    if not cache.add(f'filter_index:changes:{version}', {'product_ids': changes}, FILTER_INDEX_CHANGE_TIMEOUT):
+        # Другой процесс получил тот же номер (incr не атомарен на FileBasedCache): перестраиваем целиком.
+        cache.set(FILTER_INDEX_VERSION_KEY, new_version(), None)
+
+
+def invalidate_filter_index():
+    record_filter_index_change(None)
+
+
+def get_pending_product_ids(index, version):
+    """
+    Id продуктов, изменённых между версией индекса и текущей, или None, если нужна полная перестройка.
+    """
+    if not index.version < version <= index.version + FILTER_INDEX_MAX_PENDING_CHANGES:
+        return None
+    keys = [f'filter_index:changes:{number}' for number in range(index.version + 1, version + 1)]
+    changes = get_versions_cache().get_many(keys)
+    product_ids = set()
+    for key in keys:
+        if key not in changes or changes[key]['product_ids'] is None:
+            return None
+        product_ids.update(changes[key]['product_ids'])
+    return product_ids
+
+
+def get_filter_index():
+    """
+    Возвращает актуальный индекс фильтров или None, если он отключён или сейчас перестраивается
+    другим потоком — тогда вызывающий код использует SQL.
+    """
+    global _index
+    if not getattr(settings, 'FILTER_INDEX_ENABLED', True):
+        return None
+    version = get_version(FILTER_INDEX_VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    if not _index_lock.acquire(blocking=index is None):
+        return None
+    try:
+        if _index is None or _index.version != version:
+            product_ids = get_pending_product_ids(_index, version) if _index is not None else None
+            if product_ids is None:
+                _index = FilterIndex.load(version)
+            else:
+                index = _index.copy(version)
+                index.update_products(product_ids)
+                _index = index
+        return _index
+    finally:
+        _index_lock.release()
+
+
+def match_indexed_products(query_params):
+    """
+    Возвращает (индекс, маска) для фильтров запроса или (None, None), если нужен SQL.
+    Запросы без фильтров по фасетам всегда идут в SQL.
+    """
+    if not any(query_params.get(param) for param in INDEXED_PARAMS):
+        return None, None
+    index = get_filter_index()
+    if index is None:
+        return None, None
+    bits = index.match(query_params)
+    if bits is None:
+        return None, None
+    return index, bits
@@ -0,0 +1,293 @@
+import hashlib
+import http.client
+import mimetypes
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from urllib.parse import urljoin, urlsplit
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from api.models import Image, ImageSource
+from api.services.image_variants import VariantGenerator, get_variant_formats
+from api.services.product_documents import refresh_product_documents
+from api.services.response_cache import bump_catalog_version
+
+
+IMAGE_PATH_PREFIX = 'static/product_images'
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.bmp', '.tiff'}
+MAX_REDIRECTS = 3
+
+
+def extract_urls(image_original):
+    """
+    URL из image_original поставщика (строка, список или словарь любой вложенности) в порядке появления.
+    """
+    if isinstance(image_original, str):
+        return [image_original] if image_original.startswith(('http://', 'https://')) else []
+    if isinstance(image_original, dict):
+        image_original = list(image_original.values())
+    if isinstance(image_original, (list, tuple)):
+        return [url for item in image_original for url in extract_urls(item)]
+    return []
+
+
+def hash_url(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+
+
+def guess_extension(url, content_type, content=b''):
+    """
+    Расширение по сигнатуре содержимого, иначе по URL или Content-Type: одинаковое содержимое
+    с разных URL должно попадать в один и тот же файл.
+    """
+    for signature, extension in IMAGE_SIGNATURES:
+        if content.startswith(signature):
+            return extension
+    if content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+        return '.webp'
+    extension = PurePosixPath(urlsplit(url).path).suffix.lower()
+    if extension not in IMAGE_EXTENSIONS:
+        extension = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
+    return '.jpg' if extension in ('.jpe', '.jpeg') else extension
+
+
+def build_image_path(content_hash, extension=''):
+    """
+    Путь файла по хешу содержимого с шардированием по первым байтам: ab/cd/abcd....jpg.
+    """
+    return f'{IMAGE_PATH_PREFIX}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    content: bytes = b''
+    content_type: str = ''
+    etag: str = ''
+    last_modified: str = ''
+    error: str = ''
+
+
+class HTTPFetcher:
+    """
+    HTTP-клиент на http.client с keep-alive: у каждого потока свои соединения по (схема, хост).
+    """
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def get_connection(self, scheme, netloc):
+        connections = getattr(self.local, 'connections', None)
+        if connections is None:
+            connections = self.local.connections = {}
+        connection = connections.get((scheme, netloc))
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = connections[(scheme, netloc)] = connection_class(netloc, timeout=self.timeout)
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def request(self, url, headers):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        connection = self.get_connection(parts.scheme, parts.netloc)
+        for attempt in range(2):
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                return response, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # Сервер закрыл keep-alive соединение между запросами: переподключаемся один раз.
+                connection.close()
+                if attempt:
+                    raise
+
+    def fetch(self, url, etag='', last_modified=''):
+        headers = {'User-Agent': 'audio39-image-ingest'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                response, content = self.request(url, headers)
+                if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                    url = urljoin(url, response.getheader('Location'))
+                    continue
+                return FetchResult(
+                    url=url,
+                    status=response.status,
+                    content=content if response.status == 200 else b'',
+                    content_type=response.getheader('Content-Type', ''),
+                    etag=response.getheader('ETag', ''),
+                    last_modified=response.getheader('Last-Modified', ''),
+                )
+            return FetchResult(url=url, error='Too many redirects.')
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            return FetchResult(url=url, error=str(e))
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+
+
+class ImageIngester:
+    """
+    Загружает изображения из Image.image_original в хранилище, храня каждое уникальное содержимое один раз.
+
+    URL скачиваются пулом из workers потоков; потоки только скачивают, хешируют и сохраняют файлы,
+    а индекс ImageSource и Image.image обновляются в основном потоке пачками. URL, уже известные
+    индексу, пропускаются; с refresh=True они перепроверяются условным запросом (ETag/Last-Modified).
+    В работе одновременно не больше IN_FLIGHT_PER_WORKER * workers URL, поэтому память не растёт с числом URL.
+    """
+    IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, workers=None, refresh=False, batch_size=500, fetcher=None, storage=None):
+        self.workers = workers or getattr(settings, 'IMAGE_INGEST_WORKERS', 8)
+        self.refresh = refresh
+        self.batch_size = batch_size
+        self.fetcher = fetcher or HTTPFetcher(timeout=getattr(settings, 'IMAGE_INGEST_TIMEOUT', 30))
+        self.storage = storage or default_storage
+        self.storing = {}
+        self.storing_lock = threading.Lock()
+        self.stats = {
+            'urls': 0, 'skipped': 0, 'fetched': 0, 'not_modified': 0, 'stored': 0, 'deduplicated': 0,
+            'failed': 0, 'images_updated': 0,
+        }
+
+    def store(self, content_hash, extension, content):
+        """
+        Сохраняет содержимое, если файла с таким хешем ещё нет; параллельные потоки с тем же хешем ждут первого.
+        """
+        path = build_image_path(content_hash, extension)
+        with self.storing_lock:
+            lock = self.storing.setdefault(path, threading.Lock())
+        with lock:
+            if self.storage.exists(path):
+                return path, False
+            return self.storage.save(path, ContentFile(content)), True
+
+    def ingest_url(self, url, source):
+        """
+        Выполняется в рабочем потоке; возвращает (url, результат, путь, хеш, сохранён ли новый файл).
+        """
+        result = self.fetcher.fetch(url, etag=source.etag if source else '',
+                                    last_modified=source.last_modified if source else '')
+        if result.error or result.status not in (200, 304) or (result.status == 304 and source is None):
+            return url, result, None, None, False
+        if result.status == 304:
+            return url, result, source.path, source.content_hash, False
+        content_hash = hashlib.sha256(result.content).hexdigest()
+        path, created = self.store(content_hash, guess_extension(result.url, result.content_type, result.content), result.content)
+        # Содержимое уже в хранилище: результат ждёт основного потока без него.
+        result.content = b''
+        return url, result, path, content_hash, created
+
+    def ingest_all(self, executor, urls, sources):
+        """
+        Результаты ingest_url в порядке urls; новый URL отправляется в пул только после того,
+        как основной поток забрал результат одного из ранних, а не все сразу, как executor.map.
+        """
+        in_flight = deque()
+        for url in urls:
+            if len(in_flight) >= self.workers * self.IN_FLIGHT_PER_WORKER:
+                yield in_flight.popleft().result()
+            in_flight.append(executor.submit(self.ingest_url, url, sources.get(url)))
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def run(self, images=None):
+        images = list((images if images is not None else Image.objects.all()).order_by('id').values_list(
+            'id', 'product_id', 'image', 'image_original'
+        ))
+        urls = list(dict.fromkeys(url for *_, image_original in images for url in extract_urls(image_original)))
+        self.stats['urls'] = len(urls)
+
+        sources = {}
+        for start in range(0, len(urls), self.batch_size):
+            batch = {hash_url(url): url for url in urls[start:start + self.batch_size]}
+            for source in ImageSource.objects.filter(url_hash__in=batch):
+                sources[source.url] = source
+
+        pending = urls if self.refresh else [url for url in urls if url not in sources]
+        self.stats['skipped'] = len(urls) - len(pending)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = self.ingest_all(executor, pending, sources)
+                updated_sources = []
+                for url, result, path, content_hash, created in results:
+                    if path is None:
+                        self.stats['failed'] += 1
+                        continue
+                    if result.status == 304:
+                        self.stats['not_modified'] += 1
+                        continue
+                    self.stats['fetched'] += 1
+                    self.stats['stored' if created else 'deduplicated'] += 1
+                    source = ImageSource(
+                        url=url, url_hash=hash_url(url), content_hash=content_hash, path=path,
+                        etag=result.etag[:255], last_modified=result.last_modified[:64],
+                    )
+                    sources[url] = source
+                    updated_sources.append(source)
+                    if len(updated_sources) >= self.batch_size:
+                        self.save_sources(updated_sources)
+                        updated_sources = []
+                self.save_sources(updated_sources)
+        finally:
+            self.fetcher.close()
+        self.stats['seconds'] = round(time.perf_counter() - started, 3)
+
+        self.update_images(images, sources)
+        return self.stats
+
+    @staticmethod
+    def save_sources(sources):
+        ImageSource.objects.bulk_create(
+            sources,
+            update_conflicts=True,
+            unique_fields=['url_hash'],
+            update_fields=['url', 'content_hash', 'path', 'etag', 'last_modified', 'fetched'],
+        )
+
+    def update_images(self, images, sources):
+        """
+        Image.image указывает на файл первого загруженного URL из image_original.
+
+        bulk_update не отправляет сигналы, поэтому то, что при сохранении изображения делают сигналы
+        (варианты, документы продуктов, кеш ответов), выполняется здесь для изменённых изображений.
+        """
+        changed = []
+        for image_id, product_id, current_path, image_original in images:
+            path = next((sources[url].path for url in extract_urls(image_original) if url in sources), None)
+            if path and path != current_path:
+                changed.append(Image(id=image_id, product_id=product_id, image=path))
+        Image.objects.bulk_update(changed, ['image'], batch_size=self.batch_size)
+        self.stats['images_updated'] = len(changed)
+        if not changed:
+            return
+        if getattr(settings, 'IMAGE_VARIANTS_ON_SAVE', True) and get_variant_formats():
+            VariantGenerator(storage=self.storage).run(Image.objects.filter(id__in=[image.id for image in changed]))
+        refresh_product_documents({image.product_id for image in changed})
+        bump_catalog_version(Image)
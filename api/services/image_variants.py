@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from api.models import Image
+from api.services.product_documents import refresh_product_documents
+from api.services.response_cache import bump_catalog_version
+
+try:
+    from PIL import Image as PILImage, ImageOps, features
+except ImportError:
+    PILImage = None
+
+
+VARIANT_PATH_PREFIX = 'static/product_variants'
+FORMAT_OPTIONS = {
+    'avif': {'format': 'AVIF', 'extension': '.avif', 'save': {'quality': 50, 'speed': 6}},
+    'webp': {'format': 'WEBP', 'extension': '.webp', 'save': {'quality': 75, 'method': 4}},
+    'jpeg': {'format': 'JPEG', 'extension': '.jpg', 'save': {'quality': 80, 'optimize': True, 'progressive': True}},
+}
+
+
+def get_variant_widths():
+    return sorted(set(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (160, 320, 640, 1280))))
+
+
+def get_variant_formats():
+    """
+    Форматы из IMAGE_VARIANT_FORMATS, которые поддерживает установленный Pillow (AVIF есть не везде).
+    """
+    formats = getattr(settings, 'IMAGE_VARIANT_FORMATS', ('avif', 'webp', 'jpeg'))
+    if PILImage is None:
+        return []
+    return [name for name in formats if name in FORMAT_OPTIONS and (name == 'jpeg' or features.check(name))]
+
+
+def get_variant_spec():
+    """
+    Строка настроек генерации: при смене ширин или форматов манифесты считаются устаревшими.
+    """
+    return ','.join([*map(str, get_variant_widths()), *get_variant_formats()])
+
+
+def build_variant_path(content_hash, width, name):
+    extension = FORMAT_OPTIONS[name]['extension']
+    return f'{VARIANT_PATH_PREFIX}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}/{width}{extension}'
+
+
+def render_variants(content, widths, formats):
+    """
+    Выполняется в процессе пула: уменьшает изображение до каждой ширины (не больше исходной)
+    и кодирует во все форматы. Возвращает (ширина, высота, {(формат, ширина): байты}).
+    """
+    with PILImage.open(io.BytesIO(content)) as source:
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    has_alpha = source.mode in ('RGBA', 'LA') or 'transparency' in source.info
+    source = source.convert('RGBA' if has_alpha else 'RGB')
+    width, height = source.size
+
+    target_widths = [target for target in widths if target < width] or [width]
+    if width <= widths[-1] and width not in target_widths:
+        target_widths.append(width)
+
+    variants = {}
+    for target in target_widths:
+        resized = source if target == width else source.resize(
+            (target, max(1, round(height * target / width))), PILImage.Resampling.LANCZOS
+        )
+        for name in formats:
+            options = FORMAT_OPTIONS[name]
+            image = resized.convert('RGB') if name == 'jpeg' and has_alpha else resized
+            output = io.BytesIO()
+            image.save(output, options['format'], **options['save'])
+            variants[(name, target)] = output.getvalue()
+    return width, height, variants
+
+
+class VariantGenerator:
+    """
+    Строит уменьшенные копии Image.image во всех форматах и ширинах и записывает манифест в Image.variants.
+
+    Ключ — хеш содержимого исходного файла: изображения с одинаковым содержимым получают один набор
+    файлов, а изображения, чей манифест уже построен для того же файла и тех же настроек, пропускаются.
+    Кодирование выполняется в пуле из workers процессов; чтение и запись файлов — в основном процессе.
+    """
+    def __init__(self, workers=None, force=False, batch_size=100, storage=None):
+        self.workers = workers or getattr(settings, 'IMAGE_VARIANT_WORKERS', None) or os.cpu_count() or 1
+        self.force = force
+        self.batch_size = batch_size
+        self.storage = storage or default_storage
+        self.widths = get_variant_widths()
+        self.formats = get_variant_formats()
+        self.spec = get_variant_spec()
+        self.stats = {'images': 0, 'skipped': 0, 'generated': 0, 'reused': 0, 'files': 0, 'failed': 0}
+
+    def is_current(self, image):
+        variants = image.variants or {}
+        return variants.get('source') == image.image.name and variants.get('spec') == self.spec
+
+    def read_source(self, image):
+        with self.storage.open(image.image.name, 'rb') as source:
+            return source.read()
+
+    def save_variants(self, content_hash, variants):
+        """
+        Записывает отсутствующие файлы и возвращает {формат: [[ширина, путь], ...]} по возрастанию ширины.
+        """
+        files = {name: [] for name in self.formats}
+        for (name, width), content in sorted(variants.items(), key=lambda item: item[0][1]):
+            path = build_variant_path(content_hash, width, name)
+            if not self.storage.exists(path):
+                path = self.storage.save(path, ContentFile(content))
+                self.stats['files'] += 1
+            files[name].append([width, path])
+        return files
+
+    def run(self, images=None):
+        if not self.formats:
+            raise RuntimeError('Pillow is required to generate image variants.')
+        images = (images if images is not None else Image.objects.all()).exclude(image='').exclude(image=None)
+        pending = []
+        for image in images.order_by('id').only('id', 'product_id', 'image', 'variants').iterator():
+            self.stats['images'] += 1
+            if not self.force and self.is_current(image):
+                self.stats['skipped'] += 1
+            else:
+                pending.append(image)
+        # С одним исполнителем процессы не порождаются: так работает фоновая генерация из сигнала.
+        executor_class = ProcessPoolExecutor if self.workers > 1 else ThreadPoolExecutor
+        with executor_class(max_workers=self.workers) as executor:
+            for start in range(0, len(pending), self.batch_size):
+                self.process_batch(executor, pending[start:start + self.batch_size])
+        return self.stats
+
+    def process_batch(self, executor, images):
+        """
+        Читает исходники пачки, кодирует каждое уникальное содержимое один раз и сохраняет манифесты.
+        """
+        by_hash = {}
+        for image in images:
+            try:
+                content = self.read_source(image)
+            except OSError:
+                self.stats['failed'] += 1
+                continue
+            content_hash = hashlib.sha256(content).hexdigest()
+            by_hash.setdefault(content_hash, (content, []))[1].append(image)
+
+        manifests = dict(self.find_manifests(by_hash))
+        futures = {
+            content_hash: executor.submit(render_variants, content, self.widths, self.formats)
+            for content_hash, (content, _) in by_hash.items() if content_hash not in manifests
+        }
+        for content_hash, future in futures.items():
+            try:
+                width, height, variants = future.result()
+            except Exception:
+                self.stats['failed'] += len(by_hash[content_hash][1])
+                continue
+            manifests[content_hash] = {
+                'hash': content_hash, 'spec': self.spec, 'width': width, 'height': height,
+                'files': self.save_variants(content_hash, variants),
+            }
+            self.stats['generated'] += 1
+
+        changed = []
+        for content_hash, (_, hash_images) in by_hash.items():
+            if content_hash not in manifests:
+                continue
+            self.stats['reused'] += len(hash_images) - (content_hash in futures)
+            for image in hash_images:
+                image.variants = {**manifests[content_hash], 'source': image.image.name}
+                changed.append(image)
+        Image.objects.bulk_update(changed, ['variants'])
+        # bulk_update не отправляет сигналы: документы и кеш ответов обновляются здесь.
+        if changed:
+            refresh_product_documents({image.product_id for image in changed})
+            bump_catalog_version(Image)
+
+    def find_manifests(self, by_hash):
+        """
+        Готовые манифесты тех же хешей и настроек у других изображений: такие файлы уже сгенерированы.
+        """
+        if self.force or not by_hash:
+            return
+        found = Image.objects.filter(variants__hash__in=list(by_hash), variants__spec=self.spec).values_list(
+            'variants', flat=True
+        )
+        for variants in found:
+            manifest = {key: value for key, value in variants.items() if key != 'source'}
+            yield manifest['hash'], manifest
+
+
+def generate_image_variants(image_ids, workers=None):
+    return VariantGenerator(workers=workers).run(Image.objects.filter(id__in=image_ids))
+
+
+def schedule_variant_generation(image_ids):
+    """
+    Генерирует варианты новых загрузок в фоновом потоке, чтобы сохранение изображения не ждало кодирования.
+    """
+    if not getattr(settings, 'IMAGE_VARIANTS_ON_SAVE', True) or not get_variant_formats():
+        return
+    threading.Thread(target=generate_in_background, args=(list(image_ids),), daemon=True).start()
+
+
+def generate_in_background(image_ids):
+    try:
+        generate_image_variants(image_ids, workers=1)
+    finally:
+        connection.close()
+
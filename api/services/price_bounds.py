@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db.models import Max, Min
+from api.models import ProductCategory, ProductPrice
+from api.services.cache_versions import bump_version, get_version
+from api.services.category_tree import get_category_tree
+
+
+PRICE_BOUNDS_VERSION_KEY = 'price_bounds:version'
+PRICE_BOUNDS_CACHE_TIMEOUT = 600
+
+
+def invalidate_price_bounds():
+    """
+    Сбрасывает все закешированные диапазоны цен, увеличивая версию ключей.
+    """
+    bump_version(PRICE_BOUNDS_VERSION_KEY)
+
+
+def compute_price_bounds(category_id=None, currency_id=None):
+    """
+    Считает минимальную и максимальную эффективную цену (ProductPrice, как и фильтр min_price/max_price)
+    одним агрегатом по категории и её потомкам; с currency_id — только в этой валюте.
+    """
+    prices = ProductPrice.objects.all()
+    if currency_id is not None:
+        prices = prices.filter(currency_id=currency_id)
+    if category_id is not None:
+        category_ids = get_category_tree().get_descendant_ids(category_id)
+        prices = prices.filter(
+            product_id__in=ProductCategory.objects.filter(category_id__in=category_ids).values('product_id')
+        )
+    bounds = prices.aggregate(min_price=Min('price'), max_price=Max('price'))
+    return bounds['min_price'], bounds['max_price']
+
+
+def get_price_bounds(category_id=None, category_slug=None, currency_id=None):
+    """
+    Возвращает (min_price, max_price) для категории и валюты из кеша, вычисляя при промахе.
+    """
+    if currency_id:
+        try:
+            currency_id = int(currency_id)
+        except (TypeError, ValueError):
+            return None, None
+    resolved_id = None
+    if category_id or category_slug:
+        resolved_id = get_category_tree().resolve_id(category_id, category_slug)
+        if resolved_id is None:
+            return None, None
+
+    cache_key = f'price_bounds:{get_version(PRICE_BOUNDS_VERSION_KEY)}:{resolved_id or ""}:{currency_id or ""}'
+    bounds = cache.get(cache_key)
+    if bounds is None:
+        bounds = compute_price_bounds(resolved_id, currency_id or None)
+        cache.set(cache_key, bounds, PRICE_BOUNDS_CACHE_TIMEOUT)
+    return bounds
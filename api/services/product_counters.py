@@ -0,0 +1,298 @@
+import atexit
+import fcntl
+import os
+import threading
+import time
+import traceback
+from decimal import Decimal
+from pathlib import Path
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from api.models import Product
+from api.services.product_documents import refresh_product_documents
+from api.services.response_cache import bump_catalog_version
+
+
+TRACK_EVENTS = ('view', 'click')
+MIN_SCORE = 1
+MAX_SCORE = 5
+RATING_SUM_FIELD = DecimalField(max_digits=12, decimal_places=1)
+
+
+class CounterBuffer:
+    """
+    Накопитель приращений в памяти процесса: {product_id: [просмотры, сумма оценок, число оценок]}.
+
+    Запись в запросе — только изменение словаря под коротким локом; БД не трогается.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.flushing = False
+
+    def add(self, product_id, views=0, score_sum=0, score_count=0):
+        with self.lock:
+            counters = self.pending.setdefault(product_id, [0, 0, 0])
+            counters[0] += views
+            counters[1] += score_sum
+            counters[2] += score_count
+
+    def restore(self, increments):
+        """
+        Возвращает в буфер приращения, которые не удалось сбросить, складывая с накопленными за это время.
+        """
+        for product_id, counters in increments.items():
+            self.add(product_id, *counters)
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        return pending
+
+    def claim_flush(self, interval):
+        """
+        True, если пора сбрасывать буфер и сброс ещё не идёт; вызывающий обязан вызвать release_flush.
+        """
+        with self.lock:
+            if self.flushing or not self.pending or time.monotonic() - self.last_flush < interval:
+                return False
+            self.flushing = True
+            return True
+
+    def release_flush(self):
+        with self.lock:
+            self.flushing = False
+
+
+counter_buffer = CounterBuffer()
+
+
+def get_flush_interval():
+    return getattr(settings, 'PRODUCT_COUNTERS_FLUSH_INTERVAL', 60)
+
+
+def get_spool_path():
+    spool = getattr(settings, 'PRODUCT_COUNTERS_SPOOL', None)
+    return Path(spool) if spool else None
+
+
+def record_view(product_id):
+    counter_buffer.add(product_id, views=1)
+    schedule_flush()
+
+
+def record_rating(product_id, score):
+    counter_buffer.add(product_id, score_sum=score, score_count=1)
+    schedule_flush()
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def schedule_flush():
+    """
+    При первой записи в процессе запускает фоновый поток, который раз в PRODUCT_COUNTERS_FLUSH_INTERVAL
+    сбрасывает буфер, даже если новых записей нет, и регистрирует сброс остатка при завершении процесса.
+    Запрос сброса не ждёт. Проверка pid нужна для воркеров, созданных fork после первой записи.
+    """
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+        threading.Thread(target=run_flusher, name='product-counters-flush', daemon=True).start()
+        atexit.register(flush_at_exit)
+
+
+def run_flusher():
+    while True:
+        time.sleep(get_flush_interval())
+        if counter_buffer.claim_flush(get_flush_interval()):
+            try:
+                flush_in_background()
+            except Exception:
+                # Приращения уже возвращены в буфер, следующий проход повторит сброс.
+                traceback.print_exc()
+
+
+def flush_in_background():
+    try:
+        flush_counters()
+    finally:
+        counter_buffer.release_flush()
+        connection.close()
+
+
+def flush_at_exit():
+    """
+    Сбрасывает остаток буфера при штатном завершении процесса (перезапуск воркера, деплой).
+    """
+    try:
+        flush_counters()
+    finally:
+        connection.close()
+
+
+def flush_counters():
+    """
+    Сбрасывает буфер процесса: в файл PRODUCT_COUNTERS_SPOOL, если он задан, иначе сразу в БД.
+    При ошибке неприменённые приращения возвращаются в буфер. Возвращает количество затронутых продуктов.
+    """
+    increments = counter_buffer.drain()
+    if not increments:
+        return 0
+    count = len(increments)
+    spool_path = get_spool_path()
+    try:
+        if spool_path:
+            append_to_spool(spool_path, increments)
+        else:
+            apply_increments(increments)
+    except Exception:
+        counter_buffer.restore(increments)
+        raise
+    return count
+
+
+def append_to_spool(spool_path, increments):
+    """
+    Дописывает приращения в общий для процессов файл под эксклюзивной flock-блокировкой (см. read_spool).
+    """
+    lines = ''.join(
+        f'{product_id}\t{views}\t{score_sum}\t{score_count}\n'
+        for product_id, (views, score_sum, score_count) in increments.items()
+    )
+    spool_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(spool_path, 'a', encoding='utf-8') as spool:
+        fcntl.flock(spool, fcntl.LOCK_EX)
+        spool.write(lines)
+        spool.flush()
+
+
+def read_spool(spool_path):
+    """
+    Забирает накопленные приращения и суммирует их по продуктам.
+
+    Файл читается и обрезается под той же flock-блокировкой, что и запись: писатель ждёт её и дописывает
+    уже в пустой файл, поэтому приращения не теряются между чтением и очисткой. Файл не переименовывается:
+    писатель, открывший его до переименования, записал бы в уже прочитанную копию.
+    """
+    try:
+        spool = open(spool_path, 'r+', encoding='utf-8')
+    except FileNotFoundError:
+        return {}
+
+    increments = {}
+    with spool:
+        fcntl.flock(spool, fcntl.LOCK_EX)
+        for line in spool:
+            try:
+                product_id, views, score_sum, score_count = map(int, line.split('\t'))
+            except ValueError:
+                continue
+            counters = increments.setdefault(product_id, [0, 0, 0])
+            counters[0] += views
+            counters[1] += score_sum
+            counters[2] += score_count
+        spool.truncate(0)
+    return increments
+
+
+def flush_spool():
+    spool_path = get_spool_path()
+    increments = read_spool(spool_path) if spool_path else {}
+    count = len(increments)
+    if increments:
+        try:
+            apply_increments(increments)
+        except Exception:
+            append_to_spool(spool_path, increments)
+            raise
+    return count
+
+
+# Рейтинг, заданный до учёта оценок (импорт, админка), при первой новой оценке засчитывается как одна оценка,
+# иначе первая же оценка заменила бы его целиком.
+SEEDED_SQL = 'product.rating_count = 0 AND product.rating > 0 AND counters.score_count > 0'
+
+UPDATE_FROM_VALUES_SQL = f'''
+    UPDATE {{table}} AS product
+    SET popularity = product.popularity + counters.views,
+        rating_sum = product.rating_sum + counters.score_sum + CASE WHEN {SEEDED_SQL} THEN product.rating ELSE 0 END,
+        rating_count = product.rating_count + counters.score_count + CASE WHEN {SEEDED_SQL} THEN 1 ELSE 0 END,
+        rating = CASE
+            WHEN counters.score_count > 0 THEN ROUND(
+                (product.rating_sum + counters.score_sum + CASE WHEN {SEEDED_SQL} THEN product.rating ELSE 0 END)
+                / (product.rating_count + counters.score_count + CASE WHEN {SEEDED_SQL} THEN 1 ELSE 0 END), 1
+            )
+            ELSE product.rating
+        END
+    FROM (VALUES {{values}}) AS counters (id, views, score_sum, score_count)
+    WHERE product.id = counters.id
+'''
+
+
+def apply_increments(increments, batch_size=1000):
+    """
+    Применяет приращения пачками: на PostgreSQL одним UPDATE ... FROM (VALUES ...) на пачку,
+    на остальных БД — одним UPDATE с CASE. Рейтинг пересчитывается из суммы и числа оценок.
+
+    Применённые пачки удаляются из increments: после ошибки в нём остаётся только то, что не записано.
+    """
+    product_ids = sorted(increments)
+    for start in range(0, len(product_ids), batch_size):
+        batch = {product_id: increments[product_id] for product_id in product_ids[start:start + batch_size]}
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                update_from_values(batch)
+            else:
+                update_with_case(batch)
+        for product_id in batch:
+            del increments[product_id]
+
+    bump_catalog_version(Product)
+    refresh_product_documents(product_ids)
+
+
+def update_from_values(batch):
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+    params = [value for product_id, counters in batch.items() for value in (product_id, *counters)]
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_FROM_VALUES_SQL.format(table=Product._meta.db_table, values=values), params)
+
+
+def case_increment(batch, position):
+    return Case(
+        *[When(id=product_id, then=Value(counters[position])) for product_id, counters in batch.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def update_with_case(batch):
+    rated_ids = [product_id for product_id, counters in batch.items() if counters[2] > 0]
+    seeded = Q(rating_count=0, rating__gt=0, id__in=rated_ids)
+    score_sum = F('rating_sum') + case_increment(batch, 1) + Case(
+        When(seeded, then=F('rating')), default=Value(Decimal('0')), output_field=RATING_SUM_FIELD,
+    )
+    score_count = F('rating_count') + case_increment(batch, 2) + Case(
+        When(seeded, then=Value(1)), default=Value(0), output_field=IntegerField(),
+    )
+    Product.objects.filter(id__in=batch).update(
+        popularity=F('popularity') + case_increment(batch, 0),
+        rating_sum=score_sum,
+        rating_count=score_count,
+        rating=Coalesce(
+            Round(Cast(score_sum, FloatField()) / NullIf(score_count, Value(0)), 1),
+            Cast(F('rating'), FloatField()),
+        ),
+    )
+
@@ -0,0 +1,77 @@
+import json
+from api.models import Brand, Color, Country, Currency, Product, ProductDocument
+from api.renderers import FastJSONRenderer
+from api.serializers.product_serializers import ProductSerializer
+from api.services.query_profiler import profiled
+from api.services.reference_data import get_reference_data
+
+
+def render_product_documents(products):
+    """
+    Сериализует продукты и возвращает словарь {product_id: JSON-строка документа}.
+    """
+    data = ProductSerializer(products, many=True).data
+    return {item['id']: FastJSONRenderer().render(item).decode('utf-8') for item in data}
+
+
+def refresh_product_documents(product_ids, batch_size=500):
+    """
+    Перестраивает документы для указанных продуктов; удалённые продукты пропускаются.
+    Возвращает словарь {product_id: JSON-строка документа}.
+    """
+    product_ids = sorted(set(product_ids))
+    rendered = {}
+    for start in range(0, len(product_ids), batch_size):
+        batch_ids = product_ids[start:start + batch_size]
+        products = Product.objects.filter(id__in=batch_ids).select_related('brand')
+        documents = render_product_documents(products)
+        ProductDocument.objects.bulk_create(
+            [ProductDocument(product_id=product_id, data=data) for product_id, data in documents.items()],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['data', 'updated'],
+        )
+        rendered.update(documents)
+    return rendered
+
+
+def attach_reference_counts(documents):
+    """
+    Обновляет счётчики брендов, стран, валют и цветов в документах актуальными значениями.
+
+    Счётчики зависят от других продуктов, поэтому в документе они могут устареть;
+    актуальные значения берутся из снимка справочников без запросов к БД.
+    """
+    reference_data = get_reference_data()
+    brand_counts = reference_data.get_counts(Brand)
+    country_counts = reference_data.get_counts(Country)
+    currency_counts = reference_data.get_counts(Currency)
+    color_counts = reference_data.get_counts(Color)
+
+    for document in documents:
+        if document.get('brand'):
+            document['brand']['product_count'] = brand_counts.get(document['brand']['id'], 0)
+        for country in document['countries']:
+            country['product_count'] = country_counts.get(country['id'], 0)
+        for item in document['currencies']:
+            item['currency']['count_products'] = currency_counts.get(item['currency']['id'], 0)
+        for color in document['colors']:
+            if color.get('id'):
+                color['product_count'] = color_counts.get(color['id'], 0)
+    return documents
+
+
+@profiled('serializer')
+def get_product_documents(products):
+    """
+    Возвращает документы для списка продуктов в том же порядке.
+
+    Документы читаются одной выборкой; отсутствующие строятся на лету и сохраняются.
+    """
+    product_ids = [product.id for product in products]
+    stored = dict(ProductDocument.objects.filter(product_id__in=product_ids).values_list('product_id', 'data'))
+    missing_ids = [product_id for product_id in product_ids if product_id not in stored]
+    if missing_ids:
+        stored.update(refresh_product_documents(missing_ids))
+    documents = [json.loads(stored[product_id]) for product_id in product_ids if product_id in stored]
+    return attach_reference_counts(documents)
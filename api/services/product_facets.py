@@ -0,0 +1,86 @@
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+from api.models import Product, ProductCountry, ProductCurrency, ProductPrice, ProductSize, ProductType
+
+
+FACET_AGGREGATES = {
+    'prices': {'min_price': Min('price'), 'max_price': Max('price')},
+    'flags': {
+        'count': Count('id'),
+        'discount': Count('id', filter=Q(has_discount=True)),
+        'in_stock': Count('id', filter=Q(has_stock=True)),
+    },
+}
+
+
+def get_facet_querysets(base_queryset, currency_id=None):
+    """
+    Независимые запросы фасетов: четыре GROUP BY (бренды, размеры, цвета, страны)
+    и два агрегата (диапазон цен, скидки и наличие) — см. FACET_AGGREGATES.
+
+    Набор передаётся в каждый запрос как подзапрос по id, поэтому фильтры строятся один раз.
+    Диапазон цен — по эффективным ценам (ProductPrice) в выбранной валюте, как фильтр min_price/max_price.
+    """
+    product_ids = base_queryset.order_by().values('id')
+    prices = ProductPrice.objects.filter(product_id__in=product_ids)
+    if currency_id:
+        prices = prices.filter(currency_id=currency_id)
+    return {
+        'brands': Product.objects.filter(id__in=product_ids).values(
+            'brand_id', 'brand__name'
+        ).annotate(product_count=Count('id')).order_by('brand__name'),
+        'sizes': ProductSize.objects.filter(product_id__in=product_ids).values(
+            'size_id', 'size__raw_size'
+        ).annotate(product_count=Count('product_id', distinct=True)).order_by('size_id'),
+        'colors': ProductType.objects.filter(product_id__in=product_ids, color__isnull=False).values(
+            'color_id', 'color__name', 'color__code'
+        ).annotate(product_count=Count('product_id', distinct=True)).order_by('color_id'),
+        'countries': ProductCountry.objects.filter(product_id__in=product_ids).values(
+            'country_id', 'country__name_ru', 'country__name_en', 'country__iso_code'
+        ).annotate(product_count=Count('product_id', distinct=True)).order_by('country__name_ru'),
+        'prices': prices,
+        'flags': Product.objects.filter(id__in=product_ids).annotate(
+            has_discount=Exists(ProductCurrency.objects.filter(product_id=OuterRef('pk'), discount_price__gt=0)),
+            has_stock=Exists(ProductSize.objects.filter(product_id=OuterRef('pk'), is_available=True)),
+        ),
+    }
+
+
+def build_facets(brands, sizes, colors, countries, prices, flags):
+    return {
+        'count': flags['count'],
+        'max_price_value': prices['max_price'],
+        'min_price_value': prices['min_price'],
+        'discount': flags['discount'],
+        'in_stock': flags['in_stock'],
+        'brands': [
+            {'id': row['brand_id'], 'name': row['brand__name'], 'product_count': row['product_count']}
+            for row in brands
+        ],
+        'sizes': [
+            {'id': row['size_id'], 'name': row['size__raw_size'], 'product_count': row['product_count']}
+            for row in sizes
+        ],
+        'colors': [
+            {'id': row['color_id'], 'name': row['color__name'], 'code': row['color__code'],
+             'product_count': row['product_count']}
+            for row in colors
+        ],
+        'countries': [
+            {'id': row['country_id'], 'name_ru': row['country__name_ru'], 'name_en': row['country__name_en'],
+             'iso_code': row['country__iso_code'], 'product_count': row['product_count']}
+            for row in countries
+        ],
+    }
+
+
+def compute_facets(base_queryset, currency_id=None):
+    """
+    Считает фасеты (бренды, размеры, цвета, страны, диапазон цен, скидки и наличие)
+    по одному отфильтрованному набору продуктов; на каждый фасет — ровно один запрос.
+    """
+    querysets = get_facet_querysets(base_queryset, currency_id)
+    results = {
+        name: queryset.aggregate(**FACET_AGGREGATES[name]) if name in FACET_AGGREGATES else list(queryset)
+        for name, queryset in querysets.items()
+    }
+    return build_facets(**results)
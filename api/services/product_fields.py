@@ -0,0 +1,76 @@
+from django.db.models import Min
+from rest_framework.exceptions import ParseError
+from api.models import Image
+from api.serializers.product_serializers import ProductCardSerializer, ProductSerializer
+from api.services.product_documents import get_product_documents
+from api.services.query_profiler import profile_section
+
+
+CARD_FIELDS = ProductCardSerializer.Meta.fields
+DOCUMENT_FIELDS = ProductSerializer.Meta.fields
+# Поля, которые есть только в полном документе (тексты и связи); их добавляют через expand=.
+EXPANDABLE_FIELDS = [name for name in DOCUMENT_FIELDS if name not in CARD_FIELDS]
+ALL_FIELDS = list(dict.fromkeys([*DOCUMENT_FIELDS, *CARD_FIELDS]))
+
+
+def split_param(query_params, name):
+    return [value.strip() for values in query_params.getlist(name) for value in values.split(',') if value.strip()]
+
+
+def get_requested_fields(query_params):
+    """
+    Список полей ответа: fields= (или поля карточки по умолчанию) плюс expand=; expand=all — весь документ.
+    Неизвестные поля — ParseError (400).
+    """
+    fields = split_param(query_params, 'fields') or list(CARD_FIELDS)
+    expand = split_param(query_params, 'expand')
+    if 'all' in expand:
+        expand = [name for name in DOCUMENT_FIELDS if name not in fields]
+
+    unknown = [name for name in fields if name not in ALL_FIELDS]
+    unknown += [name for name in expand if name not in EXPANDABLE_FIELDS]
+    if unknown:
+        raise ParseError(f"Unknown fields: {', '.join(unknown)}.")
+    requested = set(fields) | set(expand)
+    return [name for name in ALL_FIELDS if name in requested]
+
+
+def get_thumbnails(product_ids):
+    """
+    {product_id: image_original первого изображения} одним запросом.
+    """
+    first_image_ids = Image.objects.filter(product_id__in=product_ids).values('product_id').annotate(
+        first_id=Min('id')
+    ).values('first_id')
+    return dict(Image.objects.filter(id__in=first_image_ids).values_list('product_id', 'image_original'))
+
+
+def get_product_representations(products, query_params):
+    """
+    Представления продуктов с полями из fields= / expand= в порядке products.
+
+    Поля карточки строятся из строк продуктов; полный документ читается только если запрошено
+    хотя бы одно поле, которого в карточке нет, а миниатюры — только если запрошен thumbnail.
+    """
+    products = list(products)
+    fields = get_requested_fields(query_params)
+    card_fields = [name for name in fields if name in CARD_FIELDS]
+    document_fields = [name for name in fields if name not in CARD_FIELDS]
+
+    context = {}
+    if 'thumbnail' in card_fields:
+        context['thumbnails'] = get_thumbnails([product.id for product in products])
+    with profile_section('serializer'):
+        cards = ProductCardSerializer(products, many=True, fields=card_fields, context=context).data
+
+    documents = {}
+    if document_fields:
+        documents = {document['id']: document for document in get_product_documents(products)}
+
+    representations = []
+    for product, card in zip(products, cards):
+        document = documents.get(product.id, {})
+        representations.append({
+            name: card[name] if name in card else document.get(name) for name in fields
+        })
+    return representations
@@ -0,0 +1,95 @@
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Q
+from api.models import ProductCategory, ProductCountry, ProductCurrency, ProductPrice, ProductSize, ProductType
+from api.services.product_prices import get_default_price_expression
+
+
+RELATION_MODELS = {
+    'productcategory': ProductCategory,
+    'productcountry': ProductCountry,
+    'productcurrency': ProductCurrency,
+    'productprice': ProductPrice,
+    'productsize': ProductSize,
+    'producttype': ProductType,
+}
+
+
+def get_relation(q):
+    """
+    Возвращает имя связи, если все условия Q идут через одну многозначную связь, иначе None.
+    """
+    relations = set()
+    for child in q.children:
+        if isinstance(child, Q):
+            relations.add(get_relation(child))
+        elif isinstance(child, tuple) and '__' in child[0]:
+            relations.add(child[0].split('__', 1)[0])
+        else:
+            relations.add(None)
+    if len(relations) == 1:
+        relation = relations.pop()
+        return relation if relation in RELATION_MODELS else None
+    return None
+
+
+def strip_relation(q, relation):
+    """
+    Переписывает условия Q относительно модели связи: productsize__size_id -> size_id.
+    """
+    prefix = f'{relation}__'
+    children = [
+        strip_relation(child, relation) if isinstance(child, Q) else (child[0][len(prefix):], child[1])
+        for child in q.children
+    ]
+    return Q(*children, _connector=q.connector, _negated=q.negated)
+
+
+def split_conjunction(q):
+    """
+    Разбивает Q вида a & b & ... на отдельные условия, чтобы каждое ушло в EXISTS своей связи.
+    """
+    if q.connector != Q.AND or q.negated:
+        return [q]
+    parts = []
+    for child in q.children:
+        parts.extend(split_conjunction(child) if isinstance(child, Q) else [Q(child)])
+    return parts
+
+
+def compile_product_filters(filters):
+    """
+    Собирает фильтры продуктов без JOIN по многозначным связям.
+
+    Условия, целиком идущие через одну связь (productcurrency, productsize, ...), объединяются
+    в один коррелированный EXISTS на связь; как и при фильтрации в одном .filter(), все условия
+    должны выполняться для одной и той же строки связи. Остальные условия остаются как есть,
+    поэтому строки не размножаются и .distinct() не нужен.
+    """
+    plain = Q()
+    grouped = {}
+    for q in [part for q in filters if q for part in split_conjunction(q)]:
+        relation = get_relation(q)
+        if relation is None:
+            plain &= q
+        else:
+            grouped.setdefault(relation, []).append(strip_relation(q, relation))
+
+    for relation, conditions in grouped.items():
+        related = RELATION_MODELS[relation].objects.filter(product_id=OuterRef('pk'))
+        for condition in conditions:
+            related = related.filter(condition)
+        plain &= Q(Exists(related))
+    return plain
+
+
+def annotate_price(queryset, currency_id=None):
+    """
+    Добавляет price — эффективную цену в выбранной валюте из ProductPrice.
+
+    Для валюты используется LEFT JOIN по уникальной паре (product, currency), поэтому строки
+    не размножаются, а сортировка и диапазон по цене идут по индексу (currency, price).
+    """
+    if not currency_id:
+        return queryset.annotate(price=get_default_price_expression())
+    return queryset.annotate(
+        selected_price=FilteredRelation('productprice', condition=Q(productprice__currency_id=currency_id)),
+    ).annotate(price=F('selected_price__price'))
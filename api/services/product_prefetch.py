@@ -0,0 +1,54 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from api.models import (
+    Brand, Color, Country, Currency, Size, ProductCategory, ProductCountry, ProductCurrency, ProductSize, ProductType,
+    Image
+)
+from api.services.reference_data import get_reference_data
+
+
+PRODUCT_PREFETCH_LOOKUPS = (
+    Prefetch('productcategory_set', queryset=ProductCategory.objects.select_related('category')),
+    Prefetch('productcountry_set', queryset=ProductCountry.objects.all()),
+    Prefetch('productcurrency_set', queryset=ProductCurrency.objects.all()),
+    Prefetch('producttype_set', queryset=ProductType.objects.all()),
+    Prefetch('productsize_set', queryset=ProductSize.objects.all()),
+    Prefetch('images', queryset=Image.objects.all()),
+)
+
+
+def attach_reference(reference_data, obj, field, model):
+    """
+    Подставляет в связь объект из снимка справочников; если его там нет, связь загрузится как обычно.
+    """
+    object_id = getattr(obj, f'{field}_id')
+    reference = reference_data.get(model, object_id) if object_id else None
+    if reference is not None:
+        setattr(obj, field, reference)
+
+
+def load_product_relations(products):
+    """
+    Загружает все связанные данные для списка продуктов фиксированным числом запросов.
+
+    Связи подгружаются через prefetch_related_objects, а бренды, страны, валюты, цвета и размеры
+    берутся из снимка справочников (get_reference_data) вместе со счётчиками product_count,
+    поэтому ни JOIN, ни COUNT на каждый объект не нужны.
+    """
+    products = [product for product in products if not getattr(product, '_relations_loaded', False)]
+    if not products:
+        return
+
+    prefetch_related_objects(products, *PRODUCT_PREFETCH_LOOKUPS)
+
+    reference_data = get_reference_data()
+    for product in products:
+        attach_reference(reference_data, product, 'brand', Brand)
+        for product_country in product.productcountry_set.all():
+            attach_reference(reference_data, product_country, 'country', Country)
+        for product_currency in product.productcurrency_set.all():
+            attach_reference(reference_data, product_currency, 'currency', Currency)
+        for product_type in product.producttype_set.all():
+            attach_reference(reference_data, product_type, 'color', Color)
+        for product_size in product.productsize_set.all():
+            attach_reference(reference_data, product_size, 'size', Size)
+        product._relations_loaded = True
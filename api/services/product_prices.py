@@ -0,0 +1,59 @@
+from django.db.models import OuterRef, Subquery
+from api.models import Product, ProductCurrency, ProductPrice
+
+
+def get_effective_price(price, discount_price):
+    """
+    Цена, по которой продукт продаётся: цена со скидкой, если она задана и положительна.
+    """
+    if discount_price is not None and discount_price > 0:
+        return discount_price
+    return price
+
+
+def refresh_product_prices(product_ids=None, batch_size=1000):
+    """
+    Пересчитывает эффективные цены (product, currency) для указанных продуктов или для всех.
+    Возвращает количество записанных строк.
+    """
+    if product_ids is None:
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+    product_ids = sorted(set(product_ids))
+
+    written = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch_ids = product_ids[start:start + batch_size]
+        prices = {}
+        for product_id, currency_id, price, discount_price in ProductCurrency.objects.filter(
+                product_id__in=batch_ids).values_list('product_id', 'currency_id', 'price', 'discount_price'):
+            effective_price = get_effective_price(price, discount_price)
+            if effective_price is not None:
+                prices[(product_id, currency_id)] = effective_price
+
+        stale = [
+            pk for pk, product_id, currency_id in ProductPrice.objects.filter(
+                product_id__in=batch_ids).values_list('id', 'product_id', 'currency_id')
+            if (product_id, currency_id) not in prices
+        ]
+        if stale:
+            ProductPrice.objects.filter(id__in=stale).delete()
+        ProductPrice.objects.bulk_create(
+            [
+                ProductPrice(product_id=product_id, currency_id=currency_id, price=price)
+                for (product_id, currency_id), price in prices.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'currency'],
+            update_fields=['price'],
+        )
+        written += len(prices)
+    return written
+
+
+def get_default_price_expression():
+    """
+    Цена без выбранной валюты: эффективная цена в валюте с наименьшим id.
+    """
+    return Subquery(
+        ProductPrice.objects.filter(product_id=OuterRef('pk')).order_by('currency_id').values('price')[:1]
+    )
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Greatest, Ln
+from django.utils.module_loading import import_string
+from api.models import Brand, Product
+
+
+# Индексы только для PostgreSQL: в Meta.indexes их объявить нельзя, иначе схема не строится на SQLite.
+SEARCH_INDEXES = (
+    (Product, GinIndex(fields=['search_vector'], name='api_product_search_vector_gin')),
+    (Product, GinIndex(OpClass('title_ru', name='gin_trgm_ops'), name='api_product_title_ru_trgm')),
+    (Product, GinIndex(OpClass('title_en', name='gin_trgm_ops'), name='api_product_title_en_trgm')),
+    (Brand, GinIndex(OpClass('name', name='gin_trgm_ops'), name='api_brand_name_trgm')),
+)
+
+
+class IContainsSearchBackend:
+    """
+    Поиск через icontains по названиям и бренду. Работает на любой БД, используется для SQLite и тестов.
+    """
+    def get_filter(self, query):
+        return (
+            Q(title_ru__icontains=query) |
+            Q(title_en__icontains=query) |
+            Q(brand__name__icontains=query)
+        )
+
+    def get_relevance(self, query):
+        return None
+
+    def get_product_search_vector(self, product):
+        return None
+
+    def update_search_vectors(self, product_ids=None):
+        pass
+
+    def setup(self):
+        pass
+
+
+class PostgresSearchBackend:
+    """
+    Полнотекстовый поиск PostgreSQL (русская и английская конфигурации) с нечётким
+    совпадением по триграммам и ранжированием с учётом популярности и рейтинга.
+    """
+    rank_weight = 1.0
+    similarity_weight = 0.5
+    popularity_weight = 0.02
+    rating_weight = 0.05
+
+    @staticmethod
+    def get_search_query(query):
+        return (
+            SearchQuery(query, config='russian', search_type='websearch') |
+            SearchQuery(query, config='english', search_type='websearch')
+        )
+
+    def get_filter(self, query):
+        return (
+            Q(search_vector=self.get_search_query(query)) |
+            Q(title_ru__trigram_similar=query) |
+            Q(title_en__trigram_similar=query) |
+            Q(brand__name__trigram_similar=query)
+        )
+
+    def get_relevance(self, query):
+        rank = SearchRank(F('search_vector'), self.get_search_query(query))
+        similarity = Greatest(TrigramSimilarity('title_ru', query), TrigramSimilarity('title_en', query))
+        popularity = Ln(Cast(F('popularity'), FloatField()) + Value(1.0))
+        rating = Cast(F('rating'), FloatField())
+        return (
+            rank * Value(self.rank_weight) +
+            similarity * Value(self.similarity_weight) +
+            popularity * Value(self.popularity_weight) +
+            rating * Value(self.rating_weight)
+        )
+
+    @staticmethod
+    def get_search_vector():
+        brand_name = Subquery(Brand.objects.filter(id=OuterRef('brand_id')).values('name')[:1])
+        return (
+            SearchVector('title_ru', config='russian', weight='A') +
+            SearchVector('title_en', config='english', weight='A') +
+            SearchVector(brand_name, config='simple', weight='B')
+        )
+
+    @staticmethod
+    def get_product_search_vector(product):
+        """
+        Вектор из значений сохраняемого продукта: записывается тем же INSERT/UPDATE, что и сам продукт.
+        """
+        brand_name = product.brand.name if product.brand_id else ''
+        return (
+            SearchVector(Value(product.title_ru), config='russian', weight='A') +
+            SearchVector(Value(product.title_en), config='english', weight='A') +
+            SearchVector(Value(brand_name), config='simple', weight='B')
+        )
+
+    def update_search_vectors(self, product_ids=None):
+        """
+        Пересчитывает search_vector. Колонка не может быть GENERATED, так как включает имя бренда из другой таблицы.
+        """
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(id__in=product_ids)
+        products.update(search_vector=self.get_search_vector())
+
+    def setup(self):
+        """
+        Создаёт расширение pg_trgm и GIN-индексы поиска (то же выполняется после migrate, см. signals).
+        """
+        create_search_indexes()
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS):
+    """
+    Применяет TrigramExtension и создаёт отсутствующие индексы из SEARCH_INDEXES.
+    На других БД ничего не делает: IContainsSearchBackend индексы не нужны.
+    """
+    database = connections[using]
+    if database.vendor != 'postgresql':
+        return
+    with database.schema_editor() as schema_editor:
+        TrigramExtension().database_forwards('api', schema_editor, None, None)
+        for model, index in SEARCH_INDEXES:
+            with database.cursor() as cursor:
+                existing = database.introspection.get_constraints(cursor, model._meta.db_table)
+            if index.name not in existing:
+                schema_editor.add_index(model, index)
+
+
+def get_search_backend():
+    """
+    Возвращает бэкенд поиска из settings.PRODUCT_SEARCH_BACKEND или выбирает его по типу БД.
+    """
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return IContainsSearchBackend()
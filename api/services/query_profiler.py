@@ -0,0 +1,187 @@
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+
+PROFILER_BUFFER_SIZE = 2000
+PROFILER_FLUSH_EVERY = 50
+PROFILER_PIDS_KEY = 'profiler:pids'
+PROFILER_TIMEOUT = 24 * 60 * 60
+
+IN_LIST_RE = re.compile(r'\((?:%s(?:,\s*)?)+\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def fingerprint(sql):
+    """
+    Нормализует SQL, чтобы запросы, отличающиеся только параметрами и длиной IN (...), совпадали.
+    """
+    return WHITESPACE_RE.sub(' ', IN_LIST_RE.sub('(...)', sql)).strip()
+
+
+@contextmanager
+def profile_section(name):
+    """
+    Добавляет время выполнения блока к секции name текущего профилируемого запроса.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sections = profile['sections']
+        sections[name] = sections.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def record_queries():
+    """
+    Подключает к соединению текущего потока счётчик SQL профилируемого запроса, если он есть.
+    Нужен там, где запросы идут не в потоке middleware: sync_to_async из async-вьюх.
+    """
+    profile = current_profile.get()
+    if profile is None or 'recorder' not in profile:
+        yield
+        return
+    with connection.execute_wrapper(profile['recorder']):
+        yield
+
+
+def profiled(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QueryRecorder:
+    """
+    execute_wrapper, который считает запросы, время SQL и повторяющиеся отпечатки.
+    Один экземпляр может обслуживать несколько потоков (параллельные чтения async-вьюх).
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.duration += time.perf_counter() - started
+                self.count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+class ProfileBuffer:
+    """
+    Кольцевой буфер записей о запросах текущего процесса с периодическим сбросом в кеш.
+    """
+    def __init__(self, size=PROFILER_BUFFER_SIZE):
+        self.records = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    def add(self, record):
+        self.records.append(record)
+        with self.lock:
+            self.pending += 1
+            flush = self.pending >= getattr(settings, 'QUERY_PROFILER_FLUSH_EVERY', PROFILER_FLUSH_EVERY)
+            if flush:
+                self.pending = 0
+        if flush:
+            self.flush()
+
+    def flush(self):
+        cache = get_profiler_cache()
+        pid = os.getpid()
+        cache.set(f'profiler:records:{pid}', list(self.records), PROFILER_TIMEOUT)
+        pids = set(cache.get(PROFILER_PIDS_KEY) or ())
+        if pid not in pids:
+            pids.add(pid)
+            cache.set(PROFILER_PIDS_KEY, sorted(pids), PROFILER_TIMEOUT)
+
+
+def get_profiler_cache():
+    return caches[getattr(settings, 'QUERY_PROFILER_CACHE_ALIAS', 'default')]
+
+
+def load_records():
+    """
+    Собирает записи всех процессов, сбросивших свои буферы в кеш профилировщика.
+    """
+    cache = get_profiler_cache()
+    records = []
+    for pid in cache.get(PROFILER_PIDS_KEY) or ():
+        records.extend(cache.get(f'profiler:records:{pid}') or ())
+    return records
+
+
+def clear_records():
+    profile_buffer.records.clear()
+    cache = get_profiler_cache()
+    for pid in cache.get(PROFILER_PIDS_KEY) or ():
+        cache.delete(f'profiler:records:{pid}')
+    cache.delete(PROFILER_PIDS_KEY)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def aggregate(records):
+    """
+    Группирует записи по (view, action) и считает средние и p95 для отчёта.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record['view'], record['action']), []).append(record)
+
+    report = []
+    for (view, action), items in groups.items():
+        duplicates = Counter()
+        for item in items:
+            duplicates.update(item['duplicates'])
+        report.append({
+            'view': view,
+            'action': action,
+            'requests': len(items),
+            'avg_queries': sum(item['queries'] for item in items) / len(items),
+            'total_db_ms': sum(item['db_ms'] for item in items),
+            'p95_total_ms': percentile([item['total_ms'] for item in items], 0.95),
+            'avg_serializer_ms': sum(item['serializer_ms'] for item in items) / len(items),
+            'avg_app_ms': sum(item['app_ms'] for item in items) / len(items),
+            'avg_render_ms': sum(item['render_ms'] for item in items) / len(items),
+            'avg_size': sum(item['size'] for item in items) / len(items),
+            'top_duplicates': duplicates.most_common(3),
+        })
+    return report
+
+
+profile_buffer = ProfileBuffer()
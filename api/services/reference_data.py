@@ -0,0 +1,121 @@
+import threading
+import time
+from django.conf import settings
+from django.db.models import Count
+from rest_framework.filters import SearchFilter
+from rest_framework.response import Response
+from api.models import (
+    Brand, Color, Country, Currency, Product, ProductCountry, ProductCurrency, ProductSize, ProductType, Size
+)
+from api.services.cache_versions import bump_version, get_version
+
+
+REFERENCE_DATA_VERSION_KEY = 'reference_data:version'
+
+# Справочник: (модель связи, поле связи, атрибут со счётчиком, который читают сериализаторы).
+REFERENCE_TABLES = {
+    Brand: (Product, 'brand_id', 'product_count'),
+    Color: (ProductType, 'color_id', 'product_count'),
+    Size: (ProductSize, 'size_id', 'product_count'),
+    Country: (ProductCountry, 'country_id', 'product_count'),
+    Currency: (ProductCurrency, 'currency_id', 'count_products'),
+}
+
+
+class ReferenceData:
+    """
+    Снимок небольших справочников (бренды, цвета, размеры, страны, валюты) в памяти процесса
+    вместе со счётчиками продуктов; на загрузку — два запроса на таблицу.
+    """
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.objects = {}
+        self.by_id = {}
+        self.counts = {}
+        self.representations = {}
+        for model, (link_model, field, count_attr) in REFERENCE_TABLES.items():
+            counts = dict(link_model.objects.order_by().values_list(field).annotate(total=Count('pk')))
+            objects = list(model.objects.order_by(*(model._meta.ordering or ['id'])))
+            for obj in objects:
+                setattr(obj, count_attr, counts.get(obj.id, 0))
+            self.objects[model] = objects
+            self.by_id[model] = {obj.id: obj for obj in objects}
+            self.counts[model] = {obj.id: counts.get(obj.id, 0) for obj in objects}
+
+    def all(self, model):
+        return self.objects[model]
+
+    def get(self, model, object_id):
+        return self.by_id[model].get(object_id)
+
+    def get_count(self, model, object_id):
+        return self.counts[model].get(object_id, 0)
+
+    def get_counts(self, model):
+        return self.counts[model]
+
+    def get_representation(self, model, object_id, serializer_class):
+        """
+        Сериализованный объект справочника; считается один раз на снимок.
+        """
+        key = (model, object_id, serializer_class)
+        if key not in self.representations:
+            obj = self.get(model, object_id)
+            self.representations[key] = serializer_class(obj).data if obj is not None else None
+        representation = self.representations[key]
+        return dict(representation) if representation is not None else None
+
+
+_reference_data = None
+_reference_data_lock = threading.Lock()
+
+
+def get_reference_data():
+    """
+    Возвращает актуальный снимок справочников, перезагружая его при смене версии или по REFERENCE_DATA_TTL.
+    """
+    global _reference_data
+    version = get_version(REFERENCE_DATA_VERSION_KEY)
+    ttl = getattr(settings, 'REFERENCE_DATA_TTL', 300)
+    reference_data = _reference_data
+    if reference_data is None or reference_data.version != version \
+            or time.monotonic() - reference_data.loaded_at > ttl:
+        with _reference_data_lock:
+            if _reference_data is None or _reference_data.version != version \
+                    or time.monotonic() - _reference_data.loaded_at > ttl:
+                _reference_data = ReferenceData(version)
+            reference_data = _reference_data
+    return reference_data
+
+
+def invalidate_reference_data():
+    bump_version(REFERENCE_DATA_VERSION_KEY)
+
+
+class ReferenceDataListMixin:
+    """
+    Отдаёт list справочника из снимка get_reference_data() без запросов к БД.
+
+    Поиск повторяет SearchFilter: каждое слово должно встречаться (без учёта регистра) хотя бы в одном из search_fields.
+    """
+    reference_model = None
+
+    def search_reference_objects(self, objects):
+        search_fields = getattr(self, 'search_fields', None)
+        if not search_fields or SearchFilter not in self.filter_backends:
+            return objects
+        terms = [term.lower() for term in SearchFilter().get_search_terms(self.request)]
+        if not terms:
+            return objects
+        return [
+            obj for obj in objects
+            if all(any(term in str(getattr(obj, field) or '').lower() for field in search_fields) for term in terms)
+        ]
+
+    def list(self, request, *args, **kwargs):
+        objects = self.search_reference_objects(get_reference_data().all(self.reference_model))
+        page = self.paginate_queryset(objects)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(objects, many=True).data)
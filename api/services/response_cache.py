@@ -0,0 +1,152 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from api.models import (
+    Brand, Product, Category, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry,
+    Currency, ProductCurrency, Image, SizeTable
+)
+from api.services.cache_versions import bump_version, get_versions
+from api.services.compression import get_cached_body
+
+
+RESPONSE_CACHE_TIMEOUT = 300
+CACHEABLE_MEDIA_TYPES = ('application/json',)
+CATALOG_MODELS = (
+    Brand, Product, Category, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry,
+    Currency, ProductCurrency, Image, SizeTable
+)
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def catalog_version_key(model):
+    return f'catalog_version:{model._meta.label_lower}'
+
+
+def bump_catalog_version(model):
+    bump_version(catalog_version_key(model))
+
+
+def get_response_cache_key(request, models):
+    """
+    Ключ кеша: версии моделей, путь, отсортированные параметры запроса и Accept.
+    """
+    versions = get_versions([catalog_version_key(model) for model in models])
+    query = sorted((key, value) for key, values in request.GET.lists() for value in values)
+    raw_key = repr((request.path, query, request.META.get('HTTP_ACCEPT', '')))
+    digest = hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+    version = hashlib.md5(repr(versions).encode('utf-8')).hexdigest()
+    return f'response:{version}:{digest}'
+
+
+def build_cache_entry(response):
+    """
+    Превращает отрендеренный успешный JSON-ответ в запись кеша или возвращает None.
+    """
+    if response.status_code != 200 or getattr(response, 'streaming', False):
+        return None
+    if getattr(response, 'accepted_media_type', 'application/json') not in CACHEABLE_MEDIA_TYPES:
+        return None
+    if hasattr(response, 'render'):
+        response.render()
+    content = response.content
+    return {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'vary': response.get('Vary'),
+        'etag': '"%s"' % hashlib.sha256(content).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+
+
+def is_not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or entry['etag'] in tags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and entry['last_modified'] <= if_modified_since
+
+
+def build_response(request, entry):
+    """
+    Ответ из записи кеша (сжатый, если клиент это поддерживает). Возвращает ответ и признак того,
+    что в запись добавлен новый сжатый вариант и её нужно сохранить заново.
+    """
+    encoding, added = None, False
+    if is_not_modified(request, entry):
+        response = HttpResponseNotModified()
+    else:
+        content, encoding, added = get_cached_body(request, entry)
+        response = HttpResponse(content, content_type=entry['content_type'])
+        if entry['vary']:
+            response['Vary'] = entry['vary']
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = 'W/' + entry['etag'] if encoding else entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    return response, added
+
+
+class CachedResponseMixin:
+    """
+    Кеширует GET-ответы вьюсета и отвечает 304 на условные запросы.
+
+    cache_models перечисляет модели, от которых зависит ответ; изменение любой из них
+    (post_save/post_delete) увеличивает её версию и делает старые записи недоступными.
+    """
+    cache_models = ()
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        response_cache = get_response_cache()
+        cache_key = get_response_cache_key(request, self.cache_models)
+        entry = response_cache.get(cache_key)
+        created = entry is None
+        if created:
+            response = super().dispatch(request, *args, **kwargs)
+            entry = build_cache_entry(response)
+            if entry is None:
+                return response
+        response, added = build_response(request, entry)
+        if created or added:
+            response_cache.set(cache_key, entry, self.cache_timeout)
+        return response
+
+
+def async_cached_response(models=CATALOG_MODELS, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    То же, что CachedResponseMixin, для async-вьюх: записи и ETag общие по формату.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+
+            response_cache = get_response_cache()
+            cache_key = get_response_cache_key(request, models)
+            entry = await response_cache.aget(cache_key)
+            created = entry is None
+            if created:
+                response = await view(request, *args, **kwargs)
+                entry = build_cache_entry(response)
+                if entry is None:
+                    return response
+            response, added = build_response(request, entry)
+            if created or added:
+                await response_cache.aset(cache_key, entry, timeout)
+            return response
+        return wrapper
+    return decorator
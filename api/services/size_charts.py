@@ -0,0 +1,94 @@
+import threading
+from api.models import SizeTable
+from api.services.cache_versions import bump_version, get_version
+from api.services.category_tree import get_category_tree
+
+
+SIZE_CHARTS_VERSION_KEY = 'size_charts:version'
+
+
+class SizeCharts:
+    """
+    Снимок таблиц размеров и разрешение таблицы для каждой категории дерева.
+
+    Таблица категории — своя или ближайшего предка, у которого она есть. Дерево обходится
+    в порядке (tree_id, lft), поэтому родитель разрешён раньше детей и каждая категория
+    наследует результат родителя за O(1); весь проход — один раз на версию.
+    """
+    def __init__(self, tables, tree, version):
+        self.version = version
+        self.tree_version = tree.version
+        self.charts = {
+            table.id: {'id': table.id, 'name': table.name, 'category_id': table.category_id, 'data': table.data}
+            for table in tables
+        }
+        table_ids = {table.category_id: table.id for table in tables if table.category_id is not None}
+        self.resolved = {}
+        for category_id in tree.ordered_ids:
+            table_id = table_ids.get(category_id)
+            if table_id is None:
+                table_id = self.resolved.get(tree.parent_ids[category_id])
+            self.resolved[category_id] = table_id
+        self.levels = {category_id: tree.nodes[category_id].level for category_id in tree.ordered_ids}
+
+    @classmethod
+    def load(cls, version, tree):
+        return cls(list(SizeTable.objects.order_by('id')), tree, version)
+
+    def get(self, table_id):
+        return self.charts.get(table_id)
+
+    def get_for_category(self, category_id):
+        """
+        Таблица размеров категории (своя или ближайшего предка) или None.
+        """
+        return self.charts.get(self.resolved.get(category_id))
+
+    def get_for_categories(self, category_ids):
+        """
+        Таблица для продукта из нескольких категорий: берётся самая глубокая категория, у которой она есть.
+        """
+        candidates = [category_id for category_id in category_ids if self.resolved.get(category_id) is not None]
+        if not candidates:
+            return None
+        category_id = max(candidates, key=lambda candidate: (self.levels[candidate], -candidate))
+        return self.get_for_category(category_id)
+
+
+def get_chart_reference(chart):
+    if chart is None:
+        return None
+    return {'id': chart['id'], 'name': chart['name'], 'category_id': chart['category_id']}
+
+
+_charts = None
+_charts_lock = threading.Lock()
+
+
+def get_size_charts():
+    """
+    Актуальный снимок: перестраивается при смене версии таблиц размеров или дерева категорий.
+    """
+    global _charts
+    version = get_version(SIZE_CHARTS_VERSION_KEY)
+    tree = get_category_tree()
+    charts = _charts
+    if charts is None or charts.version != version or charts.tree_version != tree.version:
+        with _charts_lock:
+            if _charts is None or _charts.version != version or _charts.tree_version != tree.version:
+                _charts = SizeCharts.load(version, tree)
+            charts = _charts
+    return charts
+
+
+def attach_size_chart(document):
+    """
+    Добавляет в документ продукта ссылку на его таблицу размеров по категориям из документа.
+    """
+    category_ids = [category['id'] for category in document.get('categories', [])]
+    document['size_chart'] = get_chart_reference(get_size_charts().get_for_categories(category_ids))
+    return document
+
+
+def invalidate_size_charts():
+    bump_version(SIZE_CHARTS_VERSION_KEY)
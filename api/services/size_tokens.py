@@ -0,0 +1,159 @@
+import re
+from rest_framework.exceptions import ParseError
+from api.models import Size, SizeToken
+
+
+# Система размеров -> поле Size с явно заданным значением в этой системе.
+SIZE_SYSTEMS = {
+    'int': 'international_size',
+    'ru': 'russian_size',
+    'us': 'us_size',
+    'eu': 'eu_size',
+    'uk': 'uk_size',
+    'jp': 'jp_size',
+}
+# Вся строка raw_size целиком и числа без указания системы.
+RAW_SYSTEM = 'raw'
+SYSTEM_ALIASES = {'int': 'int', 'intl': 'int', 'ru': 'ru', 'rus': 'ru', 'us': 'us', 'usa': 'us', 'eu': 'eu',
+                  'eur': 'eu', 'uk': 'uk', 'gb': 'uk', 'jp': 'jp', 'jpn': 'jp'}
+ONE_SIZE_NAMES = {'ONE SIZE', 'ONESIZE', 'ONE-SIZE', 'OS', 'O/S', 'UNI', 'UNISIZE', 'UNIVERSAL'}
+
+ALIASES_PATTERN = '|'.join(sorted(SYSTEM_ALIASES, key=len, reverse=True))
+PREFIX_RE = re.compile(r'^(%s)\s*[:.]?\s*(.+)$' % ALIASES_PATTERN, re.IGNORECASE)
+SUFFIX_RE = re.compile(r'^(.+?)\s+(%s)$' % ALIASES_PATTERN, re.IGNORECASE)
+SEGMENT_SEPARATORS_RE = re.compile(r'[/|;()\[\]]')
+RANGE_RE = re.compile(r'^([^-–]+?)\s*[-–]\s*([^-–]+)$')
+LETTER_RE = re.compile(r'^(\d*)(X*)(S|M|L)$')
+NUMBER_RE = re.compile(r'^\d+(\.\d+)?$')
+
+
+def normalize_token(value):
+    """
+    Каноническая запись обозначения: верхний регистр, XXL -> 2XL, 42,0 -> 42, ONE SIZE -> ONESIZE.
+    """
+    token = re.sub(r'\s+', ' ', str(value).strip().upper()).replace(',', '.')
+    if token in ONE_SIZE_NAMES:
+        return 'ONESIZE'
+    match = LETTER_RE.match(token)
+    if match and match.group(2) and match.group(3) != 'M':
+        digits, xs, letter = match.groups()
+        count = int(digits) if digits and xs == 'X' else len(xs)
+        return f'{count}X{letter}' if count > 1 else f'X{letter}'
+    if NUMBER_RE.match(token) and '.' in token:
+        token = token.rstrip('0').rstrip('.')
+    return token
+
+
+def is_letter_size(token):
+    return token == 'ONESIZE' or bool(LETTER_RE.match(token))
+
+
+def parse_segment(segment, system=None):
+    """
+    Пары (система, токен) одного фрагмента: «EU 42», «42 EU», «S-M», «44-46»; система из префикса
+    или суффикса важнее переданной, буквенные размеры без системы относятся к int.
+    """
+    segment = segment.strip()
+    prefix_match, suffix_match = PREFIX_RE.match(segment), SUFFIX_RE.match(segment)
+    if prefix_match:
+        system, segment = SYSTEM_ALIASES[prefix_match.group(1).lower()], prefix_match.group(2).strip()
+    elif suffix_match:
+        system, segment = SYSTEM_ALIASES[suffix_match.group(2).lower()], suffix_match.group(1).strip()
+    if not segment:
+        return []
+    range_match = RANGE_RE.match(segment)
+    values = list(range_match.groups()) if range_match else [segment]
+
+    pairs = []
+    for value in values:
+        token = normalize_token(value)
+        if token:
+            pairs.append((system or ('int' if is_letter_size(token) else RAW_SYSTEM), token))
+    return pairs
+
+
+def parse_size_tokens(size):
+    """
+    Множество (система, токен) для размера: вся строка raw_size, её фрагменты и явные поля систем.
+    """
+    tokens = set()
+    if size.raw_size and size.raw_size.strip():
+        tokens.add((RAW_SYSTEM, normalize_token(size.raw_size)))
+        for segment in SEGMENT_SEPARATORS_RE.split(size.raw_size):
+            tokens.update(parse_segment(segment))
+    for system, field in SIZE_SYSTEMS.items():
+        value = getattr(size, field)
+        if value:
+            for segment in SEGMENT_SEPARATORS_RE.split(value):
+                tokens.update(parse_segment(segment, system))
+    return tokens
+
+
+def rebuild_size_tokens(sizes, batch_size=1000):
+    """
+    Пересобирает токены переданных размеров пачками; возвращает количество записанных токенов.
+    """
+    created = 0
+    sizes = list(sizes)
+    for start in range(0, len(sizes), batch_size):
+        batch = sizes[start:start + batch_size]
+        SizeToken.objects.filter(size_id__in=[size.id for size in batch]).delete()
+        tokens = [
+            SizeToken(size_id=size.id, system=system, token=token[:100])
+            for size in batch for system, token in sorted(parse_size_tokens(size))
+        ]
+        SizeToken.objects.bulk_create(tokens, batch_size=batch_size, ignore_conflicts=True)
+        created += len(tokens)
+    return created
+
+
+def ensure_size_tokens(size_ids):
+    """
+    Строит токены для размеров из size_ids, у которых их ещё нет (новые размеры из импорта).
+    """
+    return rebuild_size_tokens(Size.objects.filter(id__in=size_ids, tokens__isnull=True))
+
+
+def get_size_system(query_params):
+    """
+    Система из size_system или None (любая система); неизвестная система — ParseError (400).
+    """
+    system = query_params.get('size_system')
+    if not system:
+        return None
+    system = SYSTEM_ALIASES.get(system.lower(), system.lower())
+    if system not in SIZE_SYSTEMS and system != RAW_SYSTEM:
+        raise ParseError(f"Unknown size system: {query_params.get('size_system')}.")
+    return system
+
+
+def find_size_ids(values, system=None):
+    """
+    Подзапрос id размеров с любым из обозначений values (в системе system, если она задана).
+    """
+    tokens = SizeToken.objects.filter(token__in={normalize_token(value) for value in values})
+    if system:
+        tokens = tokens.filter(system=system)
+    return tokens.values('size_id')
+
+
+def load_size_token_map():
+    """
+    {токен: {система: {id размеров}}} для индекса фильтров.
+    """
+    token_map = {}
+    for size_id, system, token in SizeToken.objects.values_list('size_id', 'system', 'token'):
+        token_map.setdefault(token, {}).setdefault(system, set()).add(size_id)
+    return token_map
+
+
+def match_size_token_map(token_map, values, system=None):
+    """
+    То же, что find_size_ids, но по карте из load_size_token_map, без запроса к БД.
+    """
+    size_ids = set()
+    for token in {normalize_token(value) for value in values}:
+        for token_system, ids in token_map.get(token, {}).items():
+            if system is None or token_system == system:
+                size_ids |= ids
+    return size_ids
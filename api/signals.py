@@ -0,0 +1,193 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from api.models import (
+    Brand, Product, Category, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry,
+    Currency, ProductCurrency, Image, SizeTable
+)
+from api.services.category_menu import invalidate_category_menu
+from api.services.category_tree import invalidate_category_tree
+from api.services.image_variants import schedule_variant_generation
+from api.services.filter_index import invalidate_filter_index, record_filter_index_change
+from api.services.price_bounds import invalidate_price_bounds
+from api.services.product_documents import refresh_product_documents
+from api.services.product_prices import refresh_product_prices
+from api.services.product_search import create_search_indexes, get_search_backend
+from api.services.size_charts import invalidate_size_charts
+from api.services.size_tokens import rebuild_size_tokens
+from api.services.reference_data import REFERENCE_TABLES, invalidate_reference_data
+from api.services.response_cache import CATALOG_MODELS, bump_catalog_version
+
+
+def schedule_document_refresh(product_ids):
+    """
+    Перестраивает документы продуктов после фиксации текущей транзакции.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(partial(refresh_product_documents, product_ids))
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_document(sender, instance, **kwargs):
+    schedule_document_refresh([instance.id])
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=ProductCountry)
+@receiver([post_save, post_delete], sender=ProductCurrency)
+@receiver([post_save, post_delete], sender=ProductType)
+@receiver([post_save, post_delete], sender=ProductSize)
+@receiver([post_save, post_delete], sender=Image)
+def refresh_related_product_document(sender, instance, **kwargs):
+    if instance.product_id:
+        schedule_document_refresh([instance.product_id])
+
+
+@receiver(post_save, sender=Brand)
+def refresh_brand_documents(sender, instance, **kwargs):
+    schedule_document_refresh(Product.objects.filter(brand=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_documents(sender, instance, **kwargs):
+    schedule_document_refresh(ProductCategory.objects.filter(category=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Country)
+def refresh_country_documents(sender, instance, **kwargs):
+    schedule_document_refresh(ProductCountry.objects.filter(country=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Currency)
+def refresh_currency_documents(sender, instance, **kwargs):
+    schedule_document_refresh(ProductCurrency.objects.filter(currency=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Color)
+def refresh_color_documents(sender, instance, **kwargs):
+    schedule_document_refresh(ProductType.objects.filter(color=instance).values_list('product_id', flat=True))
+
+
+@receiver(post_save, sender=Size)
+def refresh_size_documents(sender, instance, **kwargs):
+    schedule_document_refresh(ProductSize.objects.filter(size=instance).values_list('product_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=ProductCurrency)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_price_bounds_cache(sender, **kwargs):
+    transaction.on_commit(invalidate_price_bounds)
+
+
+@receiver([post_save, post_delete], sender=ProductCurrency)
+def refresh_effective_prices(sender, instance, **kwargs):
+    if instance.product_id:
+        refresh_product_prices([instance.product_id])
+
+
+SEARCH_VECTOR_SOURCE_FIELDS = {'title_ru', 'title_en', 'brand', 'brand_id'}
+
+
+@receiver(pre_save, sender=Product)
+def set_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    """
+    Вектор вычисляется в том же INSERT/UPDATE, что и сам продукт, без второго запроса.
+    """
+    if update_fields is None:
+        search_vector = get_search_backend().get_product_search_vector(instance)
+        if search_vector is not None:
+            instance.search_vector = search_vector
+
+
+@receiver(post_save, sender=Product)
+def update_partial_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    """
+    save(update_fields=...) с названием или брендом не записывает вектор из pre_save: пересчитываем отдельно.
+    """
+    if update_fields is not None and SEARCH_VECTOR_SOURCE_FIELDS & set(update_fields):
+        get_search_backend().update_search_vectors([instance.id])
+
+
+@receiver(post_migrate)
+def create_product_search_indexes(sender, app_config, using, **kwargs):
+    if app_config.name == 'api':
+        create_search_indexes(using)
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_search_vectors(sender, instance, **kwargs):
+    get_search_backend().update_search_vectors(Product.objects.filter(brand=instance).values('id'))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_tree_cache(sender, **kwargs):
+    invalidate_category_tree()
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver([post_save, post_delete])
+def bump_catalog_version_on_change(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        bump_catalog_version(sender)
+        transaction.on_commit(partial(bump_catalog_version, sender))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def record_product_filter_index_change(sender, instance, **kwargs):
+    record_filter_index_change([instance.id])
+    transaction.on_commit(partial(record_filter_index_change, [instance.id]))
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=ProductCountry)
+@receiver([post_save, post_delete], sender=ProductCurrency)
+@receiver([post_save, post_delete], sender=ProductType)
+@receiver([post_save, post_delete], sender=ProductSize)
+def record_related_filter_index_change(sender, instance, **kwargs):
+    if instance.product_id:
+        record_filter_index_change([instance.product_id])
+        transaction.on_commit(partial(record_filter_index_change, [instance.product_id]))
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Size)
+@receiver([post_save, post_delete], sender=Color)
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=Currency)
+def invalidate_filter_index_on_reference_change(sender, **kwargs):
+    invalidate_filter_index()
+    transaction.on_commit(invalidate_filter_index)
+
+
+@receiver([post_save, post_delete])
+def invalidate_reference_data_on_change(sender, **kwargs):
+    if sender in REFERENCE_TABLES or sender in {link_model for link_model, _, _ in REFERENCE_TABLES.values()}:
+        invalidate_reference_data()
+        transaction.on_commit(invalidate_reference_data)
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=ProductCategory)
+def invalidate_category_menu_cache(sender, **kwargs):
+    invalidate_category_menu()
+    transaction.on_commit(invalidate_category_menu)
+
+
+@receiver(post_save, sender=Image)
+def generate_uploaded_image_variants(sender, instance, **kwargs):
+    if instance.image and (instance.variants or {}).get('source') != instance.image.name:
+        transaction.on_commit(partial(schedule_variant_generation, [instance.id]))
+
+
+@receiver(post_save, sender=Size)
+def rebuild_size_token_index(sender, instance, **kwargs):
+    rebuild_size_tokens([instance])
+
+
+@receiver([post_save, post_delete], sender=SizeTable)
+def invalidate_size_charts_cache(sender, **kwargs):
+    invalidate_size_charts()
+    transaction.on_commit(invalidate_size_charts)
@@ -1,3 +1,1175 @@
-from django.test import TestCase
+import csv
+import hashlib
+import os
+import datetime
+import gzip
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api.models import (
+    Brand, Product, Category, ProductCategory, Size, ProductSize, Color, ProductType, Country, ProductCountry,
+    Currency, ProductCurrency, Image, ImageSource, ProductDocument, ProductPrice, SizeTable
+)
+from api.renderers import FastJSONRenderer
+from api.serializers.category_serializers import CategorySerializer
+from api.serializers.product_serializers import ProductSerializer
+from api.services.catalog_benchmark import generate_catalog, run_benchmark
+from api.services.cache_versions import bump_version, get_version
+from api.services.catalog_import import CatalogImporter
+from api.services.filter_index import get_filter_index
+from api.middleware import CompressionMiddleware, QueryProfilerMiddleware
+from api.services.image_ingest import ImageIngester, build_image_path
+from api.services.image_variants import VariantGenerator
+from api.services.size_charts import get_size_charts
+from api.services.size_tokens import normalize_token, parse_size_tokens
+from api.services.category_menu import get_category_menu
+from api.services.category_tree import get_category_tree
+from api.services.price_bounds import get_price_bounds
+from api.services.product_counters import (
+    append_to_spool, counter_buffer, flush_at_exit, flush_counters, flush_spool, read_spool, run_flusher
+)
+from api.services.product_documents import get_product_documents
+from api.services.product_facets import compute_facets
+from api.services.query_profiler import aggregate, clear_records, load_records
+from api.services.reference_data import get_reference_data
+from api.views.product_views import ProductViewSet
+
+
+def create_catalog(product_count):
+    brand = Brand.objects.create(name='Brand')
+    category = Category.objects.create(name_en='Category', name_ru='Категория')
+    country = Country.objects.create(name_ru='Россия', name_en='Russia', iso_code='RU')
+    currency = Currency.objects.create(name='Rouble', symbol='₽', code='RUB')
+    color = Color.objects.create(name='Black', code='#000000')
+    sizes = [Size.objects.create(raw_size=name) for name in ('S', 'M', 'L')]
+
+    for index in range(product_count):
+        product = Product.objects.create(article=f'A{index}', title_en=f'Product {index}', brand=brand)
+        ProductCategory.objects.create(product=product, category=category)
+        ProductCountry.objects.create(product=product, country=country)
+        ProductCurrency.objects.create(product=product, currency=currency, price=Decimal('100.00'))
+        ProductType.objects.create(product=product, color=color)
+        Image.objects.create(product=product, image_original=[f'https://example.com/{index}.jpg'])
+        for size in sizes:
+            ProductSize.objects.create(product=product, size=size)
+
+
+class ProductSerializerQueryCountTest(TestCase):
+    def count_queries(self, limit):
+        products = Product.objects.order_by('id')[:limit]
+        with CaptureQueriesContext(connection) as context:
+            data = ProductSerializer(products, many=True).data
+        self.assertEqual(len(data), limit)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        create_catalog(20)
+        get_reference_data()
+        self.assertEqual(self.count_queries(2), self.count_queries(20))
+
+    def test_colors_contain_sizes_and_first_image(self):
+        create_catalog(1)
+        data = ProductSerializer(Product.objects.get()).data
+        color = data['colors'][0]
+        self.assertEqual(color['image_original'], ['https://example.com/0.jpg'])
+        self.assertEqual([size['name'] for size in color['sizes']], ['S', 'M', 'L'])
+        self.assertEqual(color['sizes'][0]['price'], Decimal('100.00'))
+        self.assertEqual(data['brand']['product_count'], 1)
+        self.assertEqual(data['currencies'][0]['currency']['count_products'], 1)
+
+
+class ProductDocumentTest(TestCase):
+    def test_documents_match_serializer(self):
+        create_catalog(3)
+        products = list(Product.objects.order_by('id'))
+        expected = JSONRenderer().render(ProductSerializer(products, many=True).data)
+        self.assertEqual(JSONRenderer().render(get_product_documents(products)), expected)
+        self.assertEqual(ProductDocument.objects.count(), 3)
+
+    def test_document_refreshed_on_related_change(self):
+        create_catalog(1)
+        product = Product.objects.get()
+        get_product_documents([product])
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductCurrency.objects.filter(product=product).get().delete()
+        self.assertEqual(get_product_documents([product])[0]['currencies'], [])
+
+
+class ProductFacetsTest(TestCase):
+    def test_facets_follow_product_filters(self):
+        create_catalog(3)
+        other_brand = Brand.objects.create(name='Other')
+        Product.objects.filter(article='A0').update(brand=other_brand)
+
+        response = self.client.get('/api/v1/products/facets/', {'brand': other_brand.id})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['brands'], [{'id': other_brand.id, 'name': 'Other', 'product_count': 1}])
+        self.assertEqual([size['product_count'] for size in data['sizes']], [1, 1, 1])
+        self.assertEqual(data['in_stock'], 1)
+        self.assertEqual(data['discount'], 0)
+
+
+class ProductFilterCompilerTest(TestCase):
+    def setUp(self):
+        create_catalog(3)
+        self.euro = Currency.objects.create(name='Euro', symbol='€', code='EUR')
+        self.product = Product.objects.get(article='A1')
+        ProductCurrency.objects.create(product=self.product, currency=self.euro, price=Decimal('5.00'))
+        ProductSize.objects.filter(product=self.product).update(is_available=False)
+
+    def list_ids(self, **params):
+        response = self.client.get('/api/v1/products/', {'page_size': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']['results']]
+
+    def test_products_are_not_duplicated_by_relations(self):
+        self.assertEqual(len(self.list_ids(sort='price')), 3)
+        self.assertEqual(len(self.list_ids(size_filter=['S', 'M'])), 3)
+        self.assertEqual(self.client.get(f'/api/v1/products/{self.product.id}/').status_code, 200)
+
+    def test_related_conditions_apply_to_one_row(self):
+        self.assertEqual(self.list_ids(currency=self.euro.id, max_price=10), [self.product.id])
+        self.assertEqual(self.list_ids(currency=self.euro.id, min_price=10), [])
+        size = Size.objects.get(raw_size='S')
+        self.assertEqual(len(self.list_ids(size=size.id, in_stock='true')), 2)
+
+    def test_price_comes_from_selected_currency(self):
+        ids = self.list_ids(sort='price', currency=self.euro.id)
+        self.assertEqual(ids, [self.product.id])
+        ordered = self.list_ids(sort='price')
+        self.assertEqual(len(ordered), 3)
+
+
+class FilterIndexTest(TestCase):
+    def setUp(self):
+        create_catalog(6)
+        self.other_brand = Brand.objects.create(name='Other')
+        self.red = Color.objects.create(name='Red', code='#ff0000')
+        products = list(Product.objects.order_by('id'))
+        Product.objects.filter(id__in=[products[0].id, products[1].id]).update(brand=self.other_brand)
+        ProductType.objects.filter(product=products[2]).update(color=self.red)
+        ProductCurrency.objects.filter(product=products[3]).update(discount_price=Decimal('50.00'))
+        ProductSize.objects.filter(product=products[4], size__raw_size='S').update(is_available=False)
+        Brand.objects.create(name='Unused')
+        self.products = products
+
+    def sql_ids(self, params):
+        query_params = QueryDict(mutable=True)
+        for key, value in params.items():
+            query_params.setlist(key, value if isinstance(value, list) else [value])
+        indexed = get_filter_index().match(query_params)
+        sql = ProductViewSet.queryset.filter(ProductViewSet.get_filters(query_params)).values_list('id', flat=True)
+        return sorted(get_filter_index().get_ids(indexed)), sorted(sql)
+
+    def test_index_matches_sql_filters(self):
+        size = Size.objects.get(raw_size='S')
+        for params in [
+            {'brand': str(self.other_brand.id)},
+            {'brand_filter': 'oth'},
+            {'color_filter': 'red'},
+            {'color': str(self.red.id), 'color_filter': 'bla'},
+            {'discount': 'true'},
+            {'discount': 'false', 'in_stock': 'true'},
+            {'size': str(size.id), 'size_filter': ['s', 'm']},
+            {'category': str(Category.objects.get().id), 'brand': [str(self.other_brand.id), '999']},
+        ]:
+            indexed, sql = self.sql_ids(params)
+            self.assertEqual(indexed, sql, params)
+
+    def test_facets_match_sql(self):
+        response = self.client.get('/api/v1/products/facets/', {'brand_filter': 'r'})
+        expected = compute_facets(Product.objects.filter(id__in=[product.id for product in self.products]))
+        self.assertEqual(response.json(), json.loads(JSONRenderer().render(expected)))
+
+    def test_incremental_refresh(self):
+        index = get_filter_index()
+        ProductType.objects.create(product=self.products[5], color=self.red)
+        refreshed = get_filter_index()
+        self.assertIsNot(refreshed, index)
+        self.assertEqual(refreshed.brand_names, index.brand_names)
+        self.assertEqual(self.sql_ids({'color': str(self.red.id)})[0], [self.products[2].id, self.products[5].id])
+
+
+class ProductPriceTest(TestCase):
+    def setUp(self):
+        create_catalog(3)
+        self.rouble = Currency.objects.get(code='RUB')
+        self.euro = Currency.objects.create(name='Euro', symbol='€', code='EUR')
+        self.products = list(Product.objects.order_by('id'))
+        for index, product in enumerate(self.products):
+            ProductCurrency.objects.filter(product=product).update(price=Decimal(100 + index * 10))
+            ProductCurrency.objects.create(product=product, currency=self.euro, price=Decimal(10 - index))
+        ProductCurrency.objects.filter(product=self.products[2], currency=self.rouble).update(discount_price=Decimal('50'))
+        call_command('rebuild_product_prices', stdout=io.StringIO())
+
+    def list_ids(self, **params):
+        response = self.client.get('/api/v1/products/', {'page_size': 50, **params})
+        return [product['id'] for product in response.json()['results']['results']]
+
+    def test_effective_price_is_discount_aware(self):
+        self.assertEqual(
+            ProductPrice.objects.get(product=self.products[2], currency=self.rouble).price, Decimal('50.00')
+        )
+        ids = [product.id for product in self.products]
+        self.assertEqual(self.list_ids(sort='price', currency=self.rouble.id), [ids[2], ids[0], ids[1]])
+        self.assertEqual(self.list_ids(sort='price', currency=self.euro.id), [ids[2], ids[1], ids[0]])
+        self.assertEqual(self.list_ids(currency=self.rouble.id, min_price=60, max_price=105), [ids[0]])
+
+    def test_prices_follow_currency_changes(self):
+        price = ProductCurrency.objects.get(product=self.products[0], currency=self.euro)
+        price.discount_price = Decimal('1.00')
+        price.save()
+        self.assertEqual(ProductPrice.objects.get(product=self.products[0], currency=self.euro).price, Decimal('1.00'))
+        price.delete()
+        self.assertFalse(ProductPrice.objects.filter(product=self.products[0], currency=self.euro).exists())
+
+
+class ProductCursorPaginationTest(TestCase):
+    def walk(self, sort):
+        ids, params = [], {'pagination': 'cursor', 'page_size': 3, 'sort': sort}
+        url = '/api/v1/products/'
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(product['id'] for product in data['results']['results'])
+            url, params = data['next'], None
+        return ids
+
+    def test_cursor_walks_every_sort_without_gaps(self):
+        create_catalog(8)
+        for index, product in enumerate(Product.objects.order_by('id')):
+            Product.objects.filter(id=product.id).update(popularity=index % 3, title_ru=None if index % 4 else f'T{index}')
+            ProductCurrency.objects.filter(product=product).update(price=Decimal(index % 2))
+
+        all_ids = sorted(Product.objects.values_list('id', flat=True))
+        for sort in ('', 'popular', 'popular_desc', 'rating', 'rating_desc', 'price', 'price_desc'):
+            self.assertEqual(sorted(self.walk(sort)), all_ids, sort)
+
+    def test_cached_count(self):
+        create_catalog(4)
+        response = self.client.get('/api/v1/products/', {'pagination': 'cursor', 'with_count': 'true'})
+        self.assertEqual(response.json()['count'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(article='A4', title_en='Product 4', brand=Brand.objects.get())
+            ProductType.objects.create(product=product, color=Color.objects.get())
+        response = self.client.get('/api/v1/products/', {'pagination': 'cursor', 'with_count': 'true'})
+        self.assertEqual(response.json()['count'], 5)
+
+
+class PriceBoundsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bounds_follow_descendants_and_invalidate(self):
+        create_catalog(2)
+        parent = Category.objects.get()
+        child = Category.objects.create(name_en='Child', parent=parent)
+        product = Product.objects.create(article='C', title_en='Child product', brand=Brand.objects.get())
+        ProductCategory.objects.create(product=product, category=child)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductCurrency.objects.create(product=product, currency=Currency.objects.get(), price=Decimal('500.00'))
+
+        self.assertEqual(get_price_bounds(category_id=parent.id), (Decimal('100.00'), Decimal('500.00')))
+        product_currency = ProductCurrency.objects.get(product=product)
+        product_currency.price = Decimal('50.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            product_currency.save()
+        self.assertEqual(get_price_bounds(category_slug=parent.slug), (Decimal('50.00'), Decimal('100.00')))
+
+    def test_bounds_and_facets_use_effective_price_in_currency(self):
+        create_catalog(2)
+        product = Product.objects.order_by('id').first()
+        dollar = Currency.objects.create(name='Dollar', symbol='$', code='USD')
+        with self.captureOnCommitCallbacks(execute=True):
+            product_currency = ProductCurrency.objects.get(product=product)
+            product_currency.discount_price = Decimal('80.00')
+            product_currency.save()
+            ProductCurrency.objects.create(product=product, currency=dollar, price=Decimal('3.00'))
+        rouble = Currency.objects.get(code='RUB')
+
+        self.assertEqual(get_price_bounds(currency_id=rouble.id), (Decimal('80.00'), Decimal('100.00')))
+        self.assertEqual(get_price_bounds(currency_id=dollar.id), (Decimal('3.00'), Decimal('3.00')))
+        self.assertEqual(get_price_bounds(), (Decimal('3.00'), Decimal('100.00')))
+
+        response = self.client.get('/api/v1/products/', {'currency': rouble.id})
+        self.assertEqual(Decimal(str(response.json()['results']['min_price_value'])), Decimal('80.00'))
+        for params in ({'currency': rouble.id}, {'currency': dollar.id}, {}):
+            index_facets = self.client.get('/api/v1/products/facets/', params).json()
+            sql_facets = compute_facets(Product.objects.all(), params.get('currency'))
+            self.assertEqual(Decimal(str(index_facets['min_price_value'])), sql_facets['min_price_value'])
+            self.assertEqual(Decimal(str(index_facets['max_price_value'])), sql_facets['max_price_value'])
+        self.assertEqual(compute_facets(Product.objects.all(), rouble.id)['min_price_value'], Decimal('80.00'))
+
+
+class ProductSearchTest(TestCase):
+    def test_search_falls_back_to_icontains(self):
+        create_catalog(3)
+        response = self.client.get('/api/v1/products/', {'search': 'product 1'})
+        results = response.json()['results']['results']
+        self.assertEqual([product['title_en'] for product in results], ['Product 1'])
+
+
+    def test_search_vector_is_written_with_product_save(self):
+        create_catalog(1)
+        product = Product.objects.get()
+        backend = mock.Mock()
+        backend.get_product_search_vector.return_value = None
+        with mock.patch('api.signals.get_search_backend', return_value=backend):
+            product.title_en = 'Renamed'
+            product.save()
+            backend.get_product_search_vector.assert_called_once_with(product)
+            backend.update_search_vectors.assert_not_called()
+            product.save(update_fields=['title_en'])
+            backend.update_search_vectors.assert_called_once_with([product.id])
+
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name_en='Root')
+        self.child = Category.objects.create(name_en='Child', parent=self.root)
+        self.leaf = Category.objects.create(name_en='Leaf', parent=self.child)
+        self.other = Category.objects.create(name_en='Other')
+
+    def test_descendants_and_slugs(self):
+        tree = get_category_tree()
+        self.assertEqual(set(tree.get_descendant_ids(self.root.id)), {self.root.id, self.child.id, self.leaf.id})
+        self.assertEqual(tree.get_descendant_ids(self.child.id, include_self=False), (self.leaf.id,))
+        self.assertEqual(tree.resolve_id(slug=self.leaf.slug), self.leaf.id)
+        self.assertIsNone(tree.resolve_id(category_id=10 ** 6))
+
+    def test_tree_reloaded_after_category_change(self):
+        get_category_tree()
+        extra = Category.objects.create(name_en='Extra', parent=self.other)
+        self.assertEqual(set(get_category_tree().get_descendant_ids(self.other.id)), {self.other.id, extra.id})
+
+    def test_serializer_children_come_from_tree(self):
+        get_category_tree()
+        with self.assertNumQueries(0):
+            data = CategorySerializer(get_category_tree().get(self.root.id)).data
+        self.assertEqual(data['children'][0]['children'][0]['id'], self.leaf.id)
+        self.assertIsNone(data['children'][0]['children'][0]['children'])
+
+    def test_list_does_not_prefetch_children(self):
+        get_category_tree()
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/categories/')
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.root.id, self.other.id])
+
+
+class ResponseCacheTest(TestCase):
+    def test_etag_and_invalidation(self):
+        Brand.objects.create(name='First')
+        response = self.client.get('/api/v1/brands/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        not_modified = self.client.get('/api/v1/brands/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        since = self.client.get('/api/v1/brands/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+
+        Brand.objects.create(name='Second')
+        changed = self.client.get('/api/v1/brands/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['count'], 2)
+
+    @override_settings(RESPONSE_CACHE_ALIAS='files', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'files': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+    })
+    def test_file_based_backend(self):
+        Brand.objects.create(name='First')
+        first = self.client.get('/api/v1/brands/')
+        second = self.client.get('/api/v1/brands/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    @override_settings(CACHE_VERSIONS_ALIAS='files', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'files': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+    })
+    def test_versions_live_in_shared_cache(self):
+        Brand.objects.create(name='First')
+        etag = self.client.get('/api/v1/brands/')['ETag']
+        # Другой воркер со своим LocMemCache видит ту же версию, а сброс версии — сразу.
+        caches['default'].clear()
+        self.assertEqual(self.client.get('/api/v1/brands/')['ETag'], etag)
+        version = get_version('test:version')
+        self.assertIsNone(caches['default'].get('test:version'))
+        bump_version('test:version')
+        self.assertNotEqual(caches['files'].get('test:version'), version)
+
+
+@override_settings(QUERY_PROFILER_ENABLED=True, QUERY_PROFILER_SAMPLE_RATE=1.0,
+                   QUERY_PROFILER_CACHE_ALIAS='default', QUERY_PROFILER_FLUSH_EVERY=1)
+class QueryProfilerTest(TestCase):
+    def setUp(self):
+        clear_records()
+
+    def test_server_timing_and_report(self):
+        create_catalog(3)
+        response = self.client.get('/api/v1/products/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+
+        report = aggregate(load_records())
+        self.assertEqual([(row['view'], row['action']) for row in report], [('ProductViewSet', 'list')])
+        self.assertGreater(report[0]['avg_queries'], 0)
+        self.assertEqual(report[0]['avg_size'], len(response.content))
+
+    @override_settings(ASYNC_PARALLEL_READS=False)
+    async def test_async_views_are_profiled_without_thread_adaptation(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryProfilerMiddleware(view)))
+        await sync_to_async(create_catalog)(3)
+        response = await self.async_client.get('/api/v1/async/products/')
+        self.assertEqual(response.status_code, 200)
+        db_timing = response['Server-Timing'].split(',')[0]
+        self.assertNotIn('desc="0 queries"', db_timing)
+
+    async def test_sync_viewsets_are_profiled_under_asgi(self):
+        await sync_to_async(create_catalog)(3)
+        response = await self.async_client.get('/api/v1/brands/')
+        self.assertEqual(response.status_code, 200)
+        db_timing = response['Server-Timing'].split(',')[0]
+        self.assertNotIn('desc="0 queries"', db_timing)
+        record = (await sync_to_async(load_records)())[0]
+        self.assertEqual(record['view'], 'BrandViewSet')
+        self.assertGreater(record['queries'], 0)
+
+    @override_settings(QUERY_PROFILER_SAMPLE_RATE=0.0)
+    def test_sampling_skips_requests(self):
+        response = self.client.get('/api/v1/brands/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(load_records(), [])
+
+
+class CatalogExportTest(TestCase):
+    def test_ndjson_and_csv_export(self):
+        create_catalog(5)
+        response = self.client.get('/api/v1/products/export/', {'export_format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['article'] for line in lines], [f'A{index}' for index in range(5)])
+
+        response = self.client.get('/api/v1/products/export/', {'export_format': 'csv', 'search': 'Product 3'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([(row['article'], row['sizes'], row['currency']) for row in rows], [('A3', 'L|M|S', 'RUB')])
+
+    def test_export_command_writes_to_stdout(self):
+        create_catalog(3)
+        stdout = io.StringIO()
+        call_command('export_catalog', '--filter', 'search=Product 1', stdout=stdout)
+        self.assertEqual([json.loads(line)['article'] for line in stdout.getvalue().splitlines()], ['A1'])
+
+
+class CatalogImportTest(TestCase):
+    records = [
+        {
+            'article': 'X1', 'title_en': 'Jacket', 'brand': 'Nike', 'categories': ['Clothes > Jackets'],
+            'countries': ['RU'], 'prices': [{'currency': 'RUB', 'price': '10.50', 'discount_price': '9'}],
+            'sizes': ['S', 'M'], 'colors': [{'name': 'Black', 'type': {'sku': 'X1-B'}}],
+            'images': [{'url': 'https://example.com/x1.jpg'}],
+        },
+        {
+            'article': 'X2', 'title_en': 'Jacket', 'brand': 'Nike', 'categories': ['Clothes'],
+            'sizes': 'L', 'colors': 'White', 'currency': 'RUB', 'price': '20',
+        },
+    ]
+
+    def test_import_and_reimport(self):
+        CatalogImporter().run(self.records)
+        CatalogImporter().run([dict(self.records[0], sizes=['M'], title_en='Jacket 2')])
+
+        jacket = Product.objects.get(article='X1')
+        self.assertEqual(jacket.title_en, 'Jacket 2')
+        self.assertEqual(sorted(Product.objects.values_list('slug', flat=True)), ['jacket', 'jacket-2'])
+        self.assertEqual([size.size.raw_size for size in jacket.productsize_set.all()], ['M'])
+        self.assertEqual(jacket.productcurrency_set.get().discount_price, Decimal('9'))
+        self.assertEqual(jacket.producttype_set.get().type, {'sku': 'X1-B'})
+        self.assertEqual(jacket.images.count(), 1)
+
+        jackets = Category.objects.get(name_en='Jackets')
+        self.assertEqual(jackets.parent.name_en, 'Clothes')
+        self.assertEqual(jackets.parent.get_descendant_count(), 1)
+
+    def test_records_without_brand_are_skipped(self):
+        stats, _ = CatalogImporter().run([*self.records, {'article': 'X3', 'title_en': 'Coat', 'brand': ' '}])
+        self.assertEqual((stats['products'], stats['skipped'], stats['products_created']), (2, 1, 2))
+        self.assertFalse(Product.objects.filter(article='X3').exists())
+
+    def test_dry_run_rolls_back(self):
+        stats, timings = CatalogImporter(dry_run=True).run(self.records)
+        self.assertEqual(stats['products_created'], 2)
+        self.assertIn('products', timings)
+        self.assertFalse(Product.objects.exists())
+
+
+class CatalogBenchmarkTest(TestCase):
+    def test_synthetic_catalog_and_scenarios(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_catalog(20, brands=3, category_depth=2, category_breadth=2, seed=7)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Category.objects.count(), 6)
+
+        results = run_benchmark(iterations=2, warmup=0, seed=7, only=['list_price', 'facets', 'ids'])
+        self.assertEqual(sorted(results), ['facets', 'ids', 'list_price'])
+        for result in results.values():
+            self.assertEqual(result['status'], [200])
+        self.assertGreater(results['list_price']['queries'], 0)
+
+
+class BenchmarkCommandTest(SimpleTestCase):
+    def test_command_builds_its_database_on_sqlite(self):
+        """
+        Команда запускается отдельным процессом с SQLite: так проверяется создание схемы через create_test_db.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'sqlite_settings.py'), 'w', encoding='utf-8') as settings_file:
+                settings_file.write(
+                    'from audio39_backend.settings import *  # noqa\n'
+                    f"DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', "
+                    f"'NAME': {os.path.join(directory, 'db.sqlite3')!r}}}}}\n"
+                )
+            output = os.path.join(directory, 'bench.json')
+            process = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_catalog', '--products', '20', '--brands', '3',
+                 '--category-depth', '2', '--category-breadth', '2', '--iterations', '1', '--warmup', '0',
+                 '--scenario', 'list_price', '--output', output],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'sqlite_settings',
+                     'PYTHONPATH': os.pathsep.join([directory, str(settings.BASE_DIR)])},
+            )
+            self.assertEqual(process.returncode, 0, process.stderr)
+            with open(output, encoding='utf-8') as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report['meta']['vendor'], 'sqlite')
+        self.assertEqual(report['scenarios']['list_price']['status'], [200])
+
+
+@override_settings(ASYNC_PARALLEL_READS=False)
+class AsyncReadPathTest(TestCase):
+    def assert_same(self, async_url, sync_url, params=None):
+        async_response = self.client.get(async_url, params or {})
+        sync_response = self.client.get(sync_url, params or {})
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        return async_response.json(), sync_response.json()
+
+    def test_product_endpoints_match_sync_viewset(self):
+        create_catalog(12)
+        for params in [{}, {'sort': 'price_desc', 'page': 2}, {'page': 'last', 'page_size': 5}, {'search': 'Product 1'}]:
+            async_data, sync_data = self.assert_same('/api/v1/async/products/', '/api/v1/products/', params)
+            self.assertEqual(async_data['results'], sync_data['results'])
+            self.assertEqual(async_data['count'], sync_data['count'])
+            self.assertEqual(bool(async_data['next']), bool(sync_data['next']))
+
+        product = Product.objects.order_by('id').first()
+        async_data, sync_data = self.assert_same(f'/api/v1/async/products/{product.id}/', f'/api/v1/products/{product.id}/')
+        self.assertEqual(async_data, sync_data)
+
+        async_data, sync_data = self.assert_same(
+            '/api/v1/async/products/facets/', '/api/v1/products/facets/', {'has_price': 'true'}
+        )
+        self.assertEqual(async_data, sync_data)
+
+        self.assert_same('/api/v1/async/products/', '/api/v1/products/', {'page': 9})
+        self.assert_same('/api/v1/async/products/', '/api/v1/products/', {'category': 999})
+
+    def test_category_endpoints(self):
+        create_catalog(2)
+        root = Category.objects.get()
+        Category.objects.create(name_en='Child', name_ru='Дочерняя', parent=root)
+        async_data, sync_data = self.assert_same('/api/v1/async/categories/', '/api/v1/categories/')
+        self.assertEqual(async_data, sync_data)
+
+        data = self.client.get(f'/api/v1/async/categories/{root.id}/facets/').json()
+        self.assertEqual(data['brands'], self.client.get(f'/api/v1/categories/{root.id}/brands/').json()['results'])
+        self.assertEqual(data['sizes'], self.client.get(f'/api/v1/categories/{root.id}/sizes/').json()['results'])
+        self.assertEqual(self.client.get('/api/v1/async/categories/999/facets/').status_code, 404)
+
+
+@override_settings(PRODUCT_COUNTERS_FLUSH_INTERVAL=3600)
+class ProductCountersTest(TestCase):
+    def setUp(self):
+        counter_buffer.drain()
+        create_catalog(3)
+        self.first, self.second, _ = Product.objects.order_by('id')
+
+    def track(self, product, payload):
+        return self.client.post(f'/api/v1/products/{product.id}/track/', payload, content_type='application/json')
+
+    def test_tracking_is_buffered_and_flushed_in_one_update(self):
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(3):
+                self.assertEqual(self.track(self.second, {'event': 'click'}).status_code, 202)
+            self.assertEqual(self.track(self.first, {'score': 5}).status_code, 202)
+            self.assertEqual(self.track(self.first, {'score': 4}).status_code, 202)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(Product.objects.get(id=self.second.id).popularity, 0)
+
+        self.assertEqual(flush_counters(), 2)
+        first = Product.objects.get(id=self.first.id)
+        self.assertEqual((first.popularity, first.rating_sum, first.rating_count), (2, 9, 2))
+        self.assertEqual(first.rating, Decimal('4.5'))
+        self.assertEqual(Product.objects.get(id=self.second.id).popularity, 3)
+
+        results = self.client.get('/api/v1/products/', {'sort': 'popular_desc'}).json()['results']['results']
+        self.assertEqual(results[0]['id'], self.second.id)
+
+    def test_existing_rating_counts_as_one_score(self):
+        Product.objects.filter(id=self.first.id).update(rating=Decimal('3.0'))
+        self.track(self.first, {'score': 5})
+        self.track(self.second, {'event': 'click'})
+        flush_counters()
+        first = Product.objects.get(id=self.first.id)
+        self.assertEqual((first.rating_sum, first.rating_count, first.rating), (8, 2, Decimal('4.0')))
+        self.assertEqual(Product.objects.get(id=self.second.id).rating_count, 0)
+
+    def test_failed_flush_returns_increments_to_buffer(self):
+        self.track(self.first, {'score': 4})
+        self.track(self.second, {'event': 'click'})
+        with mock.patch('api.services.product_counters.update_with_case', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_counters()
+        self.track(self.first, {'event': 'click'})
+        self.assertEqual(flush_counters(), 2)
+        first = Product.objects.get(id=self.first.id)
+        self.assertEqual((first.popularity, first.rating_sum, first.rating_count), (2, 4, 1))
+        self.assertEqual(Product.objects.get(id=self.second.id).popularity, 1)
+
+    def test_buffer_is_flushed_by_timer_and_at_exit(self):
+        self.track(self.first, {'event': 'click'})
+        with override_settings(PRODUCT_COUNTERS_FLUSH_INTERVAL=0), mock.patch.object(connection, 'close'), \
+                mock.patch('api.services.product_counters.time.sleep', side_effect=[None, SystemExit]):
+            with self.assertRaises(SystemExit):
+                run_flusher()
+        self.assertEqual(Product.objects.get(id=self.first.id).popularity, 1)
+
+        self.track(self.first, {'event': 'click'})
+        with mock.patch.object(connection, 'close'):
+            flush_at_exit()
+        self.assertEqual(Product.objects.get(id=self.first.id).popularity, 2)
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.track(self.first, {'event': 'purchase'}).status_code, 400)
+        self.assertEqual(self.track(self.first, {'score': 9}).status_code, 400)
+        self.assertEqual(counter_buffer.drain(), {})
+
+    def test_spool_is_shared_between_flushes(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PRODUCT_COUNTERS_SPOOL=f'{directory}/counters.tsv'):
+            self.track(self.first, {'score': 3})
+            flush_counters()
+            self.track(self.first, {'score': 5})
+            flush_counters()
+            self.assertEqual(Product.objects.get(id=self.first.id).popularity, 0)
+            self.assertEqual(flush_spool(), 1)
+            self.assertEqual(flush_spool(), 0)
+
+        first = Product.objects.get(id=self.first.id)
+        self.assertEqual((first.popularity, first.rating), (2, Decimal('4.0')))
+
+
+    def test_spool_keeps_writes_of_already_open_writers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spool_path = Path(directory) / 'counters.tsv'
+            append_to_spool(spool_path, {self.first.id: [1, 0, 0]})
+            with open(spool_path, 'a', encoding='utf-8') as late_writer:
+                self.assertEqual(read_spool(spool_path), {self.first.id: [1, 0, 0]})
+                late_writer.write(f'{self.second.id}\t2\t0\t0\n')
+            self.assertEqual(read_spool(spool_path), {self.second.id: [2, 0, 0]})
+            self.assertEqual(read_spool(spool_path), {})
+
+
+class ReferenceDataTest(TestCase):
+    def setUp(self):
+        create_catalog(3)
+        Brand.objects.create(name='Other')
+
+    def test_list_endpoints_are_served_from_snapshot(self):
+        get_reference_data()
+        with CaptureQueriesContext(connection) as context:
+            brands = self.client.get('/api/v1/brands/').json()
+            currencies = self.client.get('/api/v1/currencies/').json()
+            sizes = self.client.get('/api/v1/sizes/').json()
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual([(brand['name'], brand['product_count']) for brand in brands['results']],
+                         [('Brand', 3), ('Other', 0)])
+        self.assertEqual(currencies['results'][0]['count_products'], 3)
+        self.assertEqual([size['product_count'] for size in sizes['results']], [3, 3, 3])
+
+        brands = self.client.get('/api/v1/brands/', {'search': 'oth'}).json()
+        self.assertEqual([brand['name'] for brand in brands['results']], ['Other'])
+
+    def test_counts_follow_catalog_changes(self):
+        brand = Brand.objects.get(name='Other')
+        self.assertEqual(get_reference_data().get_count(Brand, brand.id), 0)
+        Product.objects.create(article='B1', title_en='Other product', brand=brand)
+        self.assertEqual(get_reference_data().get_count(Brand, brand.id), 1)
+        self.assertEqual(self.client.get(f'/api/v1/brands/{brand.id}/').json()['product_count'], 1)
+
+    def test_product_serializer_uses_snapshot(self):
+        product = Product.objects.order_by('id').first()
+        get_reference_data()
+        with CaptureQueriesContext(connection) as context:
+            data = ProductSerializer(product).data
+        self.assertFalse(any('api_currency' in query['sql'] or 'api_brand' in query['sql']
+                             for query in context.captured_queries))
+        self.assertEqual(data['brand']['product_count'], 3)
+        self.assertEqual(data['currencies'][0]['currency']['count_products'], 3)
+
+
+class ProductFieldsTest(TestCase):
+    def setUp(self):
+        create_catalog(3)
+        self.product = Product.objects.order_by('id').first()
+
+    def list_results(self, **params):
+        response = self.client.get('/api/v1/products/', {'sort': 'popular', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']['results']
+
+    def test_card_is_the_default_representation(self):
+        card = self.list_results()[0]
+        self.assertEqual(list(card), [
+            'id', 'article', 'title_ru', 'title_en', 'slug', 'available', 'rating', 'popularity',
+            'brand', 'price', 'thumbnail'
+        ])
+        self.assertEqual(card['price'], '100.00')
+        self.assertEqual(card['brand']['name'], 'Brand')
+        self.assertEqual(card['thumbnail'], [f'https://example.com/{card["article"][1:]}.jpg'])
+
+    def test_unrequested_relations_are_not_queried(self):
+        get_reference_data()
+        with CaptureQueriesContext(connection) as context:
+            results = self.list_results(fields='id,title_en')
+        self.assertEqual(results[0], {'id': self.product.id, 'title_en': 'Product 0'})
+        tables = ' '.join(query['sql'] for query in context.captured_queries)
+        for table in ('api_image', 'api_productdocument', 'api_productsize', 'api_productcountry', '"info"'):
+            self.assertNotIn(table, tables)
+
+    def test_expand_adds_document_fields(self):
+        result = self.list_results(fields='id', expand='currencies,colors')[0]
+        self.assertEqual(list(result), ['id', 'currencies', 'colors'])
+        document = get_product_documents([self.product])[0]
+        self.assertEqual(result['colors'], document['colors'])
+
+        full = self.list_results(expand='all')[0]
+        self.assertTrue(set(document) <= set(full))
+        self.assertEqual(full['info'], document['info'])
+
+        response = self.client.post(
+            '/api/v1/products/ids/?fields=id,slug', {'ids': [self.product.id]}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['results'], [{'id': self.product.id, 'slug': self.product.slug}])
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/v1/products/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/', {'expand': 'title_en'}).status_code, 400)
+
+
+class CompressedJSONResponseTest(TestCase):
+    def test_fast_renderer_matches_drf_output(self):
+        data = {
+            'price': Decimal('10.50'), 'title': 'Куртка\u2028', 'created': datetime.datetime(2024, 1, 2, 3, 4, 5),
+            'nested': [{'id': 1, 'rating': Decimal('4.5')}, None, True], 1: 'int key',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_responses_are_compressed_and_cached(self):
+        create_catalog(10)
+        url = '/api/v1/products/?expand=all'
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertTrue(compressed['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip').content, compressed.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=compressed['ETag']).status_code, 304)
+
+        with override_settings(COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+        self.assertFalse(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0').has_header('Content-Encoding'))
+
+    def test_uncached_responses_are_compressed_by_middleware(self):
+        create_catalog(10)
+        brand = Brand.objects.get()
+        response = self.client.get(f'/api/v1/brand/{brand.id}/products/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('results', json.loads(gzip.decompress(response.content)))
+
+
+    def test_middleware_stays_async_under_asgi(self):
+        async def view(request):
+            return HttpResponse(b'{"a": 1}' * 500, content_type='application/json')
+
+        middleware = CompressionMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), b'{"a": 1}' * 500)
+
+
+class CategoryMenuTest(TestCase):
+    def setUp(self):
+        brand = Brand.objects.create(name='Brand')
+        self.clothes = Category.objects.create(name_en='Clothes', name_ru='Одежда')
+        self.jackets = Category.objects.create(name_en='Jackets', name_ru='Куртки', parent=self.clothes)
+        self.coats = Category.objects.create(name_en='Coats', name_ru='Пальто', parent=self.jackets)
+        self.shoes = Category.objects.create(name_en='Shoes', name_ru='Обувь', parent=self.clothes)
+        self.products = [Product.objects.create(article=f'M{index}', title_en=f'P{index}', brand=brand) for index in range(3)]
+        for product, category in [(0, self.coats), (1, self.jackets), (2, self.coats), (2, self.shoes)]:
+            ProductCategory.objects.create(product=self.products[product], category=category)
+
+    def get_tree(self, **params):
+        response = self.client.get('/api/v1/categories/tree/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_tree_with_subtree_counts(self):
+        tree = self.get_tree().json()
+        self.assertEqual(len(tree), 1)
+        clothes = tree[0]
+        self.assertEqual((clothes['slug'], clothes['product_count']), (self.clothes.slug, 3))
+        self.assertEqual(
+            [(child['name_en'], child['product_count']) for child in clothes['children']],
+            [('Jackets', 3), ('Shoes', 1)],
+        )
+        self.assertEqual(clothes['children'][0]['children'][0]['product_count'], 2)
+
+    def test_slices_are_served_without_queries(self):
+        self.get_tree()
+        with CaptureQueriesContext(connection) as context:
+            roots = self.get_tree(depth=1).json()
+            jackets = self.get_tree(root=self.jackets.slug, depth=1).json()
+            by_id = self.get_tree(root=self.jackets.id).json()
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(roots[0]['children'], [])
+        self.assertEqual([node['id'] for node in jackets], [self.jackets.id])
+        self.assertEqual(jackets[0]['children'], [])
+        self.assertEqual(by_id[0]['children'][0]['id'], self.coats.id)
+
+        self.assertEqual(self.client.get('/api/v1/categories/tree/', {'root': 'missing'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/categories/tree/', {'depth': 0}).status_code, 400)
+
+    def test_root_aliases_share_one_slice(self):
+        self.get_tree()
+        etags = {
+            self.get_tree(root=root)['ETag']
+            for root in (self.jackets.id, f'0{self.jackets.id}', f'00{self.jackets.id}', self.jackets.slug)
+        }
+        self.assertEqual(len(etags), 1)
+        self.assertEqual(len(get_category_menu().entries), 2)
+
+    def test_conditional_requests_and_invalidation(self):
+        etag = self.get_tree()['ETag']
+        response = self.client.get('/api/v1/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        ProductCategory.objects.create(product=self.products[1], category=self.shoes)
+        response = self.client.get('/api/v1/categories/tree/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['children'][1]['product_count'], 2)
+
+
+class ImageServer:
+    """
+    Локальная замена CDN поставщика: отдаёт файлы из словаря, поддерживает ETag и считает запросы.
+    """
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                content = server.files.get(self.path)
+                if content is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(content).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(content)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ImageIngestTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=self.media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.logo = b'\xff\xd8\xff' + b'logo' * 100
+        self.server = ImageServer({'/a.jpg': self.logo, '/copy-of-a': self.logo, '/b.jpg': b'\xff\xd8\xffb'})
+        self.addCleanup(self.server.close)
+
+        create_catalog(3)
+        first, second, third = Image.objects.order_by('id')
+        first.image_original = [f'{self.server.url}/a.jpg', f'{self.server.url}/b.jpg']
+        second.image_original = {'main': f'{self.server.url}/copy-of-a'}
+        third.image_original = [f'{self.server.url}/missing.jpg']
+        Image.objects.bulk_update([first, second, third], ['image_original'])
+        self.images = [first, second, third]
+
+    def test_unique_content_is_stored_once(self):
+        stats = ImageIngester(workers=4).run()
+        self.assertEqual((stats['urls'], stats['stored'], stats['deduplicated'], stats['failed']), (4, 2, 1, 1))
+
+        logo_path = build_image_path(hashlib.sha256(self.logo).hexdigest(), '.jpg')
+        first, second, third = Image.objects.order_by('id')
+        self.assertEqual(first.image.name, logo_path)
+        self.assertEqual(second.image.name, logo_path)
+        self.assertFalse(third.image)
+        with open(os.path.join(self.media.name, logo_path), 'rb') as stored:
+            self.assertEqual(stored.read(), self.logo)
+        self.assertEqual(ImageSource.objects.filter(path=logo_path).count(), 2)
+
+    def test_resync_skips_known_urls(self):
+        ImageIngester(workers=2).run()
+        self.server.requests.clear()
+        stats = ImageIngester(workers=2).run()
+        self.assertEqual((stats['skipped'], stats['fetched']), (3, 0))
+        self.assertEqual(self.server.requests, ['/missing.jpg'])
+
+        self.server.requests.clear()
+        stats = ImageIngester(workers=2, refresh=True).run()
+        self.assertEqual((stats['not_modified'], stats['stored']), (3, 0))
+        self.assertEqual(len(self.server.requests), 4)
+
+    @override_settings(IMAGE_VARIANT_WIDTHS=(16,), IMAGE_VARIANT_FORMATS=('webp',), IMAGE_VARIANT_WORKERS=1)
+    def test_ingest_generates_variants_and_refreshes_documents(self):
+        from PIL import Image as PILImage
+        picture = io.BytesIO()
+        PILImage.new('RGB', (32, 24), 'red').save(picture, format='PNG')
+        self.server.files['/a.jpg'] = picture.getvalue()
+        product = self.images[0].product
+        get_product_documents([product])
+
+        ImageIngester(workers=2).run(Image.objects.filter(id=self.images[0].id))
+        image = Image.objects.get(id=self.images[0].id)
+        self.assertEqual(image.variants['source'], image.image.name)
+        srcset = get_product_documents([product])[0]['images'][0]['srcset']
+        self.assertEqual((srcset['width'], srcset['height']), (32, 24))
+        self.assertIn(' 16w', srcset['webp'])
+
+    def test_work_in_flight_is_bounded(self):
+        ingester = ImageIngester(workers=2)
+        urls = [f'{self.server.url}/{index}.jpg' for index in range(20)]
+        with ThreadPoolExecutor(max_workers=2) as pool, \
+                mock.patch.object(ingester, 'ingest_url', side_effect=lambda url, source: url):
+            executor = mock.Mock(wraps=pool)
+            results = ingester.ingest_all(executor, urls, {})
+            self.assertEqual(next(results), urls[0])
+            self.assertEqual(executor.submit.call_count, 2 * ImageIngester.IN_FLIGHT_PER_WORKER)
+            self.assertEqual(list(results), urls[1:])
+
+        url, result, path, _, created = ingester.ingest_url(f'{self.server.url}/a.jpg', None)
+        self.assertTrue(path and created)
+        self.assertEqual(result.content, b'')
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=(16, 32), IMAGE_VARIANT_FORMATS=('webp', 'jpeg'))
+class ImageVariantTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=self.media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        create_catalog(3)
+        photo, copy, small = Image.objects.order_by('id')
+        photo.image = self.save_picture('photo.png', 64, 48)
+        copy.image = self.save_picture('copy.png', 64, 48)
+        small.image = self.save_picture('small.png', 20, 10)
+        Image.objects.bulk_update([photo, copy, small], ['image'])
+
+    def save_picture(self, name, width, height):
+        from PIL import Image as PILImage
+        path = os.path.join(self.media.name, name)
+        PILImage.new('RGB', (width, height), (200, 30, 30)).save(path, 'PNG')
+        return name
+
+    def test_variants_are_generated_once_per_content(self):
+        stats = VariantGenerator(workers=2).run()
+        self.assertEqual((stats['images'], stats['generated'], stats['reused'], stats['failed']), (3, 2, 1, 0))
+        # 64px: 16 и 32; 20px: 16 и исходная ширина; по два формата.
+        self.assertEqual(stats['files'], 8)
+
+        photo, copy, small = Image.objects.order_by('id')
+        self.assertEqual(photo.variants['files'], copy.variants['files'])
+        self.assertEqual([width for width, _ in small.variants['files']['webp']], [16, 20])
+        for width, path in photo.variants['files']['jpeg']:
+            self.assertTrue(os.path.exists(os.path.join(self.media.name, path)))
+
+        stats = VariantGenerator(workers=1).run()
+        self.assertEqual((stats['skipped'], stats['generated'], stats['files']), (3, 0, 0))
+
+    def test_serializer_exposes_srcset(self):
+        VariantGenerator(workers=1).run()
+        response = self.client.get(f'/api/v1/products/{Image.objects.order_by("id")[0].product_id}/')
+        srcset = response.json()['images'][0]['srcset']
+        self.assertEqual((srcset['width'], srcset['height']), (64, 48))
+        self.assertRegex(srcset['webp'], r'^\S+/16\.webp 16w, \S+/32\.webp 32w$')
+
+    def test_generation_refreshes_existing_documents(self):
+        product_id = Image.objects.order_by('id')[0].product_id
+        url = f'/api/v1/products/{product_id}/'
+        self.assertIsNone(self.client.get(url).json()['images'][0]['srcset'])
+        VariantGenerator(workers=1).run()
+        self.assertEqual(self.client.get(url).json()['images'][0]['srcset']['width'], 64)
+
+    def test_upload_schedules_generation(self):
+        image = Image.objects.order_by('id')[0]
+        with mock.patch('api.signals.schedule_variant_generation') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                image.save()
+        schedule.assert_called_once_with([image.id])
+
+
+class SizeTokenTest(TestCase):
+    def setUp(self):
+        create_catalog(3)
+        self.products = list(Product.objects.order_by('id'))
+        self.xxl = Size.objects.create(raw_size='XXL')
+        self.shoe = Size.objects.create(raw_size='EU 42 / US 9')
+        self.us_shoe = Size.objects.create(raw_size='42', us_size='42')
+        ProductSize.objects.create(product=self.products[0], size=self.xxl)
+        ProductSize.objects.create(product=self.products[1], size=self.shoe)
+        ProductSize.objects.create(product=self.products[2], size=self.us_shoe)
+
+    def list_ids(self, **params):
+        response = self.client.get('/api/v1/products/', {'page_size': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['id'] for product in response.json()['results']['results'])
+
+    def sql_ids(self, **params):
+        query_params = QueryDict(mutable=True)
+        for key, value in params.items():
+            query_params.setlist(key, value if isinstance(value, list) else [value])
+        return sorted(ProductViewSet.queryset.filter(ProductViewSet.get_filters(query_params)).values_list('id', flat=True))
+
+    def test_normalization(self):
+        self.assertEqual([normalize_token(value) for value in ('xxl', '2XL', ' one  size ', '42,0', '9.50')],
+                         ['2XL', '2XL', 'ONESIZE', '42', '9.5'])
+        self.assertEqual(
+            parse_size_tokens(Size(raw_size='S-M (RU 44)')),
+            {('raw', 'S-M (RU 44)'), ('int', 'S'), ('int', 'M'), ('ru', '44')},
+        )
+
+    def test_size_filter_uses_exact_tokens(self):
+        first, second, third = [product.id for product in self.products]
+        self.assertEqual(self.list_ids(size_filter='2xl'), [first])
+        # Раньше icontains находил XS и XXL по «S»/«L»; теперь только точное совпадение.
+        self.assertEqual(len(self.list_ids(size_filter='L')), 3)
+        self.assertEqual(self.list_ids(size_filter='42'), [second, third])
+        self.assertEqual(self.list_ids(size_filter='42', size_system='eu'), [second])
+        self.assertEqual(self.list_ids(size_filter='42', size_system='us'), [third])
+        self.assertEqual(self.sql_ids(size_filter='42', size_system='eu'), [second])
+        self.assertEqual(self.client.get('/api/v1/products/', {'size_filter': '42', 'size_system': 'xx'}).status_code, 400)
+
+    def test_tokens_follow_size_changes(self):
+        self.xxl.raw_size = 'XXXL'
+        self.xxl.save()
+        self.assertEqual(self.sql_ids(size_filter='3XL'), [self.products[0].id])
+        self.assertEqual(self.sql_ids(size_filter='XXL'), [])
+
+    def test_category_sizes_search(self):
+        category = Category.objects.get()
+        url = f'/api/v1/categories/{category.id}/sizes/'
+        self.assertEqual([size['id'] for size in self.client.get(url, {'name_size': 'xxl'}).json()['results']],
+                         [self.xxl.id])
+        names = [size['name'] for size in self.client.get(url, {'size_system': 'eu'}).json()['results']]
+        self.assertEqual(names, ['EU 42 / US 9'])
+
+
+class SizeChartTest(TestCase):
+    def setUp(self):
+        create_catalog(2)
+        self.root = Category.objects.get()
+        self.shoes = Category.objects.create(name_en='Shoes', name_ru='Обувь', parent=self.root)
+        self.boots = Category.objects.create(name_en='Boots', name_ru='Ботинки', parent=self.shoes)
+        self.root_chart = SizeTable.objects.create(name='Clothes', category_id=self.root.id, data={'S': {'chest': 90}})
+        self.boots_chart = SizeTable.objects.create(name='Boots', category_id=self.boots.id, data={'42': {'foot': 27}})
+        self.product = Product.objects.order_by('id')[0]
+
+    def test_nearest_ancestor_chart(self):
+        charts = get_size_charts()
+        self.assertEqual(charts.get_for_category(self.shoes.id)['id'], self.root_chart.id)
+        self.assertEqual(charts.get_for_category(self.boots.id)['id'], self.boots_chart.id)
+        self.assertEqual(charts.get_for_categories([self.root.id, self.boots.id])['id'], self.boots_chart.id)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/v1/sizetable/category/{self.shoes.slug}/')
+        self.assertEqual(response.json()['data'], {'S': {'chest': 90}})
+        self.assertEqual(self.client.get('/api/v1/sizetable/category/999/').status_code, 404)
+
+    @override_settings(ASYNC_PARALLEL_READS=False)
+    def test_product_detail_embeds_chart_reference(self):
+        url = f'/api/v1/products/{self.product.id}/'
+        self.assertEqual(self.client.get(url).json()['size_chart'],
+                         {'id': self.root_chart.id, 'name': 'Clothes', 'category_id': self.root.id})
+        self.assertEqual(self.client.get(f'/api/v1/async/products/{self.product.id}/').json()['size_chart']['id'],
+                         self.root_chart.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductCategory.objects.create(product=self.product, category=self.boots)
+        self.assertEqual(self.client.get(url).json()['size_chart']['id'], self.boots_chart.id)
+
+        self.boots_chart.delete()
+        self.assertEqual(self.client.get(url).json()['size_chart']['id'], self.root_chart.id)
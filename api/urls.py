@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import size_views, brand_views, product_views, category_views, image_views , color_views, country_views, currency_views, size_table_views
+from .views import async_views, size_views, brand_views, product_views, category_views, image_views , color_views, country_views, currency_views, size_table_views
 
 app_name = 'api'
 
@@ -16,6 +16,12 @@ router.register(r'currencies', currency_views.CurrencyViewSet)
 router.register(r'sizetable', size_table_views.SizeTableViewSet)
 
 urlpatterns = [
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/facets/', async_views.product_facets, name='async-product-facets'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/categories/<int:pk>/facets/', async_views.category_facets, name='async-category-facets'),
+    path('categories/tree/', category_views.CategoryTreeView.as_view(), name='category-tree'),
     path('', include(router.urls)),
     path('brand/<int:brand_id>/products/', brand_views.ProductByBrandViewSet.as_view({'get': 'list'}), name='products-by-brand'),
     path('categories/<int:category_id>/products/', category_views.ProductByCategoryViewSet.as_view({'get': 'list'}), name='products-by-categories'),
@@ -0,0 +1,231 @@
+import asyncio
+import math
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from api.pagination import ProductPagination
+from api.renderers import FastJSONRenderer
+from api.serializers.brand_serializers import BrandSerializer
+from api.serializers.category_serializers import CategorySerializer
+from api.serializers.color_serializers import ColorSerializer
+from api.serializers.country_serializers import CountrySerializer
+from api.serializers.size_serializers import SizeSerializer
+from api.services.async_reads import fetch_aggregate, fetch_count, fetch_first, fetch_list, run_sync
+from api.services.category_tree import get_category_tree
+from api.services.filter_index import match_indexed_products
+from api.services.price_bounds import get_price_bounds
+from api.services.product_documents import get_product_documents
+from api.services.product_facets import FACET_AGGREGATES, build_facets, get_facet_querysets
+from api.services.product_fields import get_product_representations
+from api.services.response_cache import async_cached_response
+from api.services.size_charts import attach_size_chart
+from api.services.size_tokens import get_size_system
+from api.views.category_views import CategoryViewSet
+from api.views.product_views import ProductViewSet
+
+
+product_list_view = ProductViewSet.as_view({'get': 'list'})
+
+
+def render_json(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def get_page(request, count):
+    """
+    Номер и размер страницы по правилам ProductPagination; ошибки — как у DRF (APIException).
+    """
+    paginator = ProductPagination()
+    page_size = int(paginator.get_page_size(Request(request)))
+    num_pages = max(1, math.ceil(count / page_size))
+    page_number = request.GET.get(paginator.page_query_param) or 1
+    if page_number in paginator.last_page_strings:
+        page_number = num_pages
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        page_number = 0
+    return page_number, page_size, num_pages
+
+
+def get_page_links(request, page_number, num_pages):
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page_number + 1) if page_number < num_pages else None
+    if page_number <= 1:
+        previous_link = None
+    elif page_number == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page_number - 1)
+    return next_link, previous_link
+
+
+async def paginate(request, queryset, *extra):
+    """
+    Считает количество и выбирает страницу одновременно (asyncio.gather) с дополнительными запросами extra.
+    """
+    if request.GET.get(ProductPagination.page_query_param) in ProductPagination.last_page_strings:
+        # Номер последней страницы известен только после подсчёта.
+        count, *extra_results = await asyncio.gather(fetch_count(queryset), *extra)
+        page_number, page_size, num_pages = get_page(request, count)
+        offset = (page_number - 1) * page_size
+        page = await fetch_list(queryset[offset:offset + page_size])
+    else:
+        page_number, page_size, _ = get_page(request, 0)
+        offset = (max(page_number, 1) - 1) * page_size
+        count, page, *extra_results = await asyncio.gather(
+            fetch_count(queryset),
+            fetch_list(queryset[offset:offset + page_size]),
+            *extra,
+        )
+        page_number, page_size, num_pages = get_page(request, count)
+    if not 1 <= page_number <= num_pages:
+        raise Http404('Invalid page.')
+    next_link, previous_link = get_page_links(request, page_number, num_pages)
+    return count, next_link, previous_link, page, extra_results
+
+
+def handle_errors(view):
+    """
+    Отдаёт 404 и ошибки DRF в том же JSON-виде, что и синхронные вьюсеты.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return render_json({'detail': str(exc) or 'Not found.'}, status=404)
+        except APIException as exc:
+            return render_json({'detail': exc.detail}, status=exc.status_code)
+    return wrapper
+
+
+@require_GET
+@async_cached_response()
+@handle_errors
+async def product_list(request):
+    """
+    Async-версия ProductViewSet.list: количество, страница и диапазон цен запрашиваются одновременно.
+    Курсорная пагинация обслуживается синхронной вьюхой.
+    """
+    query_params = request.GET
+    if query_params.get('pagination') == 'cursor' or 'cursor' in query_params:
+        return await sync_to_async(product_list_view)(request)
+
+    queryset = await run_sync(ProductViewSet.build_queryset, query_params)
+    count, next_link, previous_link, page, (price_bounds,) = await paginate(
+        request, queryset,
+        run_sync(
+            get_price_bounds, query_params.get('category'), query_params.get('category_slug'),
+            query_params.get('currency'),
+        ),
+    )
+    documents = await run_sync(get_product_representations, page, query_params)
+    min_price, max_price = price_bounds
+    return render_json({
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': {
+            'count': len(documents),
+            'max_price_value': max_price,
+            'min_price_value': min_price,
+            'results': documents,
+        },
+    })
+
+
+@require_GET
+@async_cached_response()
+@handle_errors
+async def product_detail(request, pk):
+    queryset = await run_sync(ProductViewSet.build_queryset, request.GET)
+    product = await fetch_first(queryset.filter(pk=pk))
+    if product is None:
+        raise Http404('No Product matches the given query.')
+    documents = await run_sync(get_product_documents, [product])
+    return render_json(await run_sync(attach_size_chart, documents[0]))
+
+
+@require_GET
+@async_cached_response()
+@handle_errors
+async def product_facets(request):
+    """
+    Async-версия ProductViewSet.facets: шесть запросов фасетов выполняются одновременно.
+    """
+    index, bits = await run_sync(match_indexed_products, request.GET)
+    if index is not None:
+        return render_json(index.facets(bits, request.GET.get('currency')))
+
+    filters = await run_sync(ProductViewSet.get_filters, request.GET)
+    querysets = get_facet_querysets(ProductViewSet.queryset.filter(filters), request.GET.get('currency'))
+    results = await asyncio.gather(*(
+        fetch_aggregate(queryset, **FACET_AGGREGATES[name]) if name in FACET_AGGREGATES else fetch_list(queryset)
+        for name, queryset in querysets.items()
+    ))
+    return render_json(build_facets(**dict(zip(querysets, results))))
+
+
+def serialize(serializer_class, rows):
+    return serializer_class(rows, many=True).data
+
+
+def get_category_facet_querysets(category_id, query_params):
+    return {
+        'brands': (CategoryViewSet.get_category_brands(category_id, query_params.get('brand_name')), BrandSerializer),
+        'sizes': (CategoryViewSet.get_category_sizes(
+            category_id, query_params.get('name_size'), get_size_system(query_params)
+        ), SizeSerializer),
+        'colors': (CategoryViewSet.get_category_colors(category_id, query_params.get('name_color')), ColorSerializer),
+        'countries': (
+            CategoryViewSet.get_category_countries(category_id, query_params.get('name_country')), CountrySerializer
+        ),
+    }
+
+
+@require_GET
+@async_cached_response()
+@handle_errors
+async def category_list(request):
+    """
+    Async-версия CategoryViewSet.list: корневые категории с деревом потомков из кеша процесса.
+    """
+    tree = await run_sync(get_category_tree)
+    roots = tree.get_roots()
+    page_number, page_size, num_pages = get_page(request, len(roots))
+    if not 1 <= page_number <= num_pages:
+        raise Http404('Invalid page.')
+    next_link, previous_link = get_page_links(request, page_number, num_pages)
+    page = roots[(page_number - 1) * page_size:page_number * page_size]
+    return render_json({
+        'count': len(roots),
+        'next': next_link,
+        'previous': previous_link,
+        'results': await run_sync(serialize, CategorySerializer, page),
+    })
+
+
+@require_GET
+@async_cached_response()
+@handle_errors
+async def category_facets(request, pk):
+    """
+    Бренды, размеры, цвета и страны категории (как отдельные действия CategoryViewSet) одним ответом;
+    четыре запроса выполняются одновременно.
+    """
+    tree = await run_sync(get_category_tree)
+    category_id = tree.resolve_id(pk)
+    if category_id is None:
+        raise Http404('No Category matches the given query.')
+
+    facets = await run_sync(get_category_facet_querysets, category_id, request.GET)
+    results = await asyncio.gather(*(fetch_list(queryset) for queryset, _ in facets.values()))
+    data = {}
+    for (name, (_, serializer_class)), rows in zip(facets.items(), results):
+        data[name] = await run_sync(serialize, serializer_class, rows)
+    return render_json(data)
@@ -4,6 +4,8 @@ from rest_framework import viewsets, filters
 from api.models import Brand, Product
 from api.serializers.brand_serializers import BrandSerializer
 from api.serializers.product_serializers import ProductSerializer
+from api.services.reference_data import ReferenceDataListMixin
+from api.services.response_cache import CachedResponseMixin
 
 
 @extend_schema_view(
@@ -21,7 +23,9 @@ from api.serializers.product_serializers import ProductSerializer
         ],
     ),
 )
-class BrandViewSet(viewsets.ReadOnlyModelViewSet):
+class BrandViewSet(CachedResponseMixin, ReferenceDataListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Brand, Product)
+    reference_model = Brand
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     filter_backends = [filters.SearchFilter]
@@ -1,11 +1,13 @@
 from django.db.models import Count
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
-from api.models import Brand, Product, Category, Size, Color, Country
+from rest_framework.views import APIView
+from api.models import Brand, Product, Category, Size, SizeToken, Color, Country
 from api.pagination import ProductPagination
 from api.serializers.brand_serializers import BrandSerializer
 from api.serializers.category_serializers import CategorySerializer
@@ -13,6 +15,10 @@ from api.serializers.color_serializers import ColorSerializer
 from api.serializers.country_serializers import CountrySerializer
 from api.serializers.product_serializers import ProductSerializer
 from api.serializers.size_serializers import SizeSerializer
+from api.services.category_menu import get_category_menu
+from api.services.category_tree import get_category_tree
+from api.services.size_tokens import RAW_SYSTEM, SIZE_SYSTEMS, find_size_ids, get_size_system
+from api.services.response_cache import CATALOG_MODELS, CachedResponseMixin, build_response
 
 
 @extend_schema_view(
@@ -35,7 +41,9 @@ from api.serializers.size_serializers import SizeSerializer
         summary="Получить список размеров продуктов в данной категории и её подкатегориях.",
         tags=['Categories'],
         parameters=[
-                        OpenApiParameter(name='name_size', description='Поиск по имени размера', required=False, type=str)
+                        OpenApiParameter(name='name_size', description='Поиск по имени размера', required=False, type=str),
+                        OpenApiParameter(name='size_system', description='Система размеров для name_size',
+                                         required=False, type=str, enum=[RAW_SYSTEM, *SIZE_SYSTEMS]),
                     ]
     ),
     colors=extend_schema(
@@ -57,13 +65,14 @@ from api.serializers.size_serializers import SizeSerializer
         tags=['Categories']
     ),
 )
-class CategoryViewSet(viewsets.GenericViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.GenericViewSet):
+    cache_models = CATALOG_MODELS
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
     pagination_class = ProductPagination
 
     def list(self, request):
-        queryset = self.queryset.filter(parent=None).prefetch_related('children')
+        queryset = self.queryset.filter(parent=None)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.serializer_class(page, many=True)
@@ -72,14 +81,18 @@ class CategoryViewSet(viewsets.GenericViewSet):
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
-        category = self.queryset.prefetch_related('children').get(pk=pk)
+        category = get_category_tree().get(pk)
+        if category is None:
+            raise Http404('No Category matches the given query.')
         serialized_data = self.serializer_class(category).data
         return Response(serialized_data)
 
     @action(detail=True, methods=['get'])
     def children(self, request, pk=None):
-        category = self.queryset.prefetch_related('children').get(pk=pk)
-        children = category.children.all()
+        tree = get_category_tree()
+        if pk not in tree:
+            raise Http404('No Category matches the given query.')
+        children = tree.get_children(pk)
         serializer = self.serializer_class(children, many=True)
         return Response(serializer.data)
 
@@ -89,8 +102,8 @@ class CategoryViewSet(viewsets.GenericViewSet):
         return self.get_action_response(request, pk, self.get_category_brands, BrandSerializer, search=search)
 
     @staticmethod
-    def get_category_brands(category, search=None):
-        category_ids = category.get_descendants(include_self=True).values_list('id', flat=True)
+    def get_category_brands(category_id, search=None):
+        category_ids = get_category_tree().get_descendant_ids(category_id)
         brands = Brand.objects.filter(
             product__productcategory__category_id__in=category_ids
         ).order_by('name').distinct()
@@ -103,16 +116,21 @@ class CategoryViewSet(viewsets.GenericViewSet):
     @action(detail=True, methods=['get'])
     def sizes(self, request, pk=None):
         search = request.query_params.get('name_size', None)
-        return self.get_action_response(request, pk, self.get_category_sizes, SizeSerializer, search=search)
+        system = get_size_system(request.query_params)
+        return self.get_action_response(
+            request, pk, self.get_category_sizes, SizeSerializer, search=search, system=system
+        )
 
     @staticmethod
-    def get_category_sizes(category, search=None):
-        category_ids = category.get_descendants(include_self=True).values_list('id', flat=True)
+    def get_category_sizes(category_id, search=None, system=None):
+        category_ids = get_category_tree().get_descendant_ids(category_id)
         sizes = Size.objects.filter(
             productsize__product__productcategory__category_id__in=category_ids
         ).order_by('id').distinct()
         if search:
-            sizes = sizes.filter(raw_size__icontains=search)
+            sizes = sizes.filter(id__in=find_size_ids([search], system))
+        elif system:
+            sizes = sizes.filter(id__in=SizeToken.objects.filter(system=system).values('size_id'))
         sizes_with_counts = sizes.annotate(product_count=Count('productsize__product'))
         return sizes_with_counts
 
@@ -122,8 +140,8 @@ class CategoryViewSet(viewsets.GenericViewSet):
         return self.get_action_response(request, pk, self.get_category_colors, ColorSerializer, search=search)
 
     @staticmethod
-    def get_category_colors(category, search=None):
-        category_ids = category.get_descendants(include_self=True).values_list('id', flat=True)
+    def get_category_colors(category_id, search=None):
+        category_ids = get_category_tree().get_descendant_ids(category_id)
         colors = Color.objects.filter(
             producttype__product__productcategory__category_id__in=category_ids
         ).order_by('id').distinct()
@@ -140,8 +158,8 @@ class CategoryViewSet(viewsets.GenericViewSet):
         return self.get_action_response(request, pk, self.get_category_countries, CountrySerializer, search=search)
 
     @staticmethod
-    def get_category_countries(category, search=None):
-        category_ids = category.get_descendants(include_self=True).values_list('id', flat=True)
+    def get_category_countries(category_id, search=None):
+        category_ids = get_category_tree().get_descendant_ids(category_id)
         countries = Country.objects.filter(
             productcountry__product__productcategory__category_id__in=category_ids
         ).order_by('name_ru').distinct()
@@ -152,10 +170,11 @@ class CategoryViewSet(viewsets.GenericViewSet):
         return countries_with_counts
 
     def get_action_response(self, request, pk, fetch_method, serializer_class, **kwargs):
-        category = self.queryset.get(pk=pk)
+        category_id = get_category_tree().resolve_id(pk)
+        if category_id is None:
+            raise Http404('No Category matches the given query.')
 
-
-        data = fetch_method(category, **kwargs)
+        data = fetch_method(category_id, **kwargs)
 
         paginator = ProductPagination()
         paginated_data = paginator.paginate_queryset(data, request)
@@ -166,6 +185,41 @@ class CategoryViewSet(viewsets.GenericViewSet):
             print(e)
 
 
+class CategoryTreeView(APIView):
+    """
+    Всё дерево категорий одним заранее отрендеренным JSON (см. category_menu); root= и depth= режут
+    закешированную структуру без запросов к БД.
+    """
+    permission_classes = []
+
+    @extend_schema(
+        summary="Получить дерево категорий с количеством товаров в каждом поддереве.",
+        tags=['Categories'],
+        parameters=[
+            OpenApiParameter(name='root', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             description='ID или slug категории, с которой начинается дерево.'),
+            OpenApiParameter(name='depth', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY,
+                             description='Количество уровней дерева (1 — только корни).'),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    def get(self, request):
+        depth = request.query_params.get('depth')
+        if depth is not None:
+            try:
+                depth = int(depth)
+                if depth < 1:
+                    raise ValueError
+            except ValueError:
+                raise ParseError(f"Invalid depth: {request.query_params.get('depth')}")
+
+        entry = get_category_menu().get_entry(request.query_params.get('root'), depth)
+        if entry is None:
+            raise Http404('No Category matches the given query.')
+        response, _ = build_response(request, entry)
+        return response
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="Получить список товаров для указанной категории.",
@@ -182,17 +236,12 @@ class ProductByCategoryViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         category_id = self.kwargs.get('category_id')
-        category = get_object_or_404(Category, pk=category_id)
-        categories = self.get_descendants(category)
-        queryset = Product.objects.filter(productcategory__category__in=categories)
+        if category_id not in get_category_tree():
+            raise Http404('No Category matches the given query.')
+        category_ids = self.get_descendants(category_id)
+        queryset = Product.objects.filter(productcategory__category_id__in=category_ids)
         return queryset
 
     @staticmethod
-    def get_descendants(category):
-        descendants = set()
-        stack = [category]
-        while stack:
-            node = stack.pop()
-            descendants.add(node)
-            stack.extend(node.children.all())
-        return descendants
\ No newline at end of file
+    def get_descendants(category_id):
+        return get_category_tree().get_descendant_ids(category_id)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
-from api.models import Color
+from api.models import Color, ProductType
 from api.serializers.color_serializers import ColorSerializer
+from api.services.reference_data import ReferenceDataListMixin
+from api.services.response_cache import CachedResponseMixin
 from rest_framework import viewsets, filters
 
 
@@ -20,7 +22,9 @@ from rest_framework import viewsets, filters
                 ],
     ),
 )
-class ColorViewSet(viewsets.ReadOnlyModelViewSet):
+class ColorViewSet(CachedResponseMixin, ReferenceDataListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Color, ProductType)
+    reference_model = Color
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
     filter_backends = [filters.SearchFilter]  # Добавляем SearchFilter
@@ -1,8 +1,10 @@
 
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import viewsets
-from api.models import Country
+from api.models import Country, ProductCountry
 from api.serializers.country_serializers import CountrySerializer
+from api.services.reference_data import ReferenceDataListMixin
+from api.services.response_cache import CachedResponseMixin
 
 
 
@@ -21,7 +23,9 @@ from api.serializers.country_serializers import CountrySerializer
                         ],
     ),
 )
-class CountryViewSet(viewsets.ReadOnlyModelViewSet):
+class CountryViewSet(CachedResponseMixin, ReferenceDataListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Country, ProductCountry)
+    reference_model = Country
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
 
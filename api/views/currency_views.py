@@ -1,8 +1,10 @@
 
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import viewsets
-from api.models import Currency
+from api.models import Currency, ProductCurrency
 from api.serializers.currency_serializers import CurrencySerializer
+from api.services.reference_data import ReferenceDataListMixin
+from api.services.response_cache import CachedResponseMixin
 
 
 @extend_schema_view(
@@ -13,7 +15,9 @@ from api.serializers.currency_serializers import CurrencySerializer
                          type=int),
     ], summary="Получить список всех доступных валют."),
 )
-class CurrencyViewSet(viewsets.ReadOnlyModelViewSet):
+class CurrencyViewSet(CachedResponseMixin, ReferenceDataListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Currency, ProductCurrency)
+    reference_model = Currency
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
 
@@ -1,20 +1,98 @@
-from api.models import Brand, Product, Category, Size, ProductType, ProductSize
-from api.pagination import ProductPagination
+from api.models import Brand, Product, ProductType, ProductSize
+from api.pagination import ProductPagination, ProductCursorPagination
 from api.serializers.product_serializers import ProductSerializer
+from api.services.product_documents import get_product_documents
+from api.services.product_fields import get_product_representations
+from api.services.product_facets import compute_facets
+from api.services.product_filters import annotate_price, compile_product_filters
+from api.services.filter_index import FILTER_INDEX_MAX_IDS, match_indexed_products
+from django.conf import settings
+from api.services.price_bounds import get_price_bounds
+from api.services.product_search import get_search_backend
+from api.services.category_tree import get_category_tree
+from api.services.size_charts import attach_size_chart
+from api.services.size_tokens import RAW_SYSTEM, SIZE_SYSTEMS, find_size_ids, get_size_system
+from api.services.response_cache import CATALOG_MODELS, CachedResponseMixin
+from api.services.product_counters import MAX_SCORE, MIN_SCORE, TRACK_EVENTS, record_rating, record_view
+from api.services.catalog_export import EXPORT_FORMATS, get_export_queryset, iter_export
 from rest_framework import viewsets
 from django.db.models import F
 from django.db.models import Exists, OuterRef
-from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
 from rest_framework.response import Response
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
-from django.db.models import Max, Min, Q
-from rest_framework.filters import OrderingFilter, SearchFilter
+from django.db.models import Q
+from rest_framework.filters import OrderingFilter
 from django.db.models import F, Value
 from django.db.models.functions import Coalesce
 from decimal import Decimal
 from rest_framework.decorators import action
 from rest_framework import status
+
+
+PRODUCT_FILTER_PARAMETERS = [
+    OpenApiParameter(name='category', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Category ID for filtering products.'),
+    OpenApiParameter(name='category_slug', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Category slug for filtering products.'),
+    OpenApiParameter(
+        name='brand',
+        type={'type': 'array', 'items': {'type': 'integer'}},
+        style='form',
+        explode=True,
+        location=OpenApiParameter.QUERY,
+        description='Brand ID for filtering products.'
+    ),
+    OpenApiParameter(name='brand_filter', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Brand name for filtering products.'),
+    OpenApiParameter(name='min_price', type=OpenApiTypes.NUMBER, location=OpenApiParameter.QUERY, description='Minimum price for filtering products.'),
+    OpenApiParameter(name='max_price', type=OpenApiTypes.NUMBER, location=OpenApiParameter.QUERY, description='Maximum price for filtering products.'),
+
+    OpenApiParameter(name='size', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Size ID for filtering products.'),
+    OpenApiParameter(
+        name='size_filter',
+        type={'type': 'array', 'items': {'type': 'string'}},
+        location=OpenApiParameter.QUERY,
+        description='Size names for filtering products (exact match after normalization: xxl = 2XL, "EU 42").',
+        style='form',
+        explode=True
+    ),
+    OpenApiParameter(name='size_system', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                     enum=[RAW_SYSTEM, *SIZE_SYSTEMS],
+                     description='Sizing system for size_filter. Any system by default.'),
+    OpenApiParameter(name='color', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Color ID for filtering products.'),
+    OpenApiParameter(name='color_filter', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Color name for filtering products.'),
+    OpenApiParameter(
+        name='country',
+        type={'type': 'array', 'items': {'type': 'integer'}},
+        location=OpenApiParameter.QUERY,
+        description='List of country IDs for filtering products.',
+        style='form',
+        explode=True
+    ),
+    OpenApiParameter(name='discount', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY, description='Boolean flag for filtering products by discount.'),
+    OpenApiParameter(name='in_stock', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY, description='Boolean flag for filtering products by in stock.'),
+    OpenApiParameter(name='has_price', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY,
+                     description='Boolean flag for filtering products by has price.'),
+
+    OpenApiParameter(name='currency', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Currency ID for filtering products.'),
+    OpenApiParameter(name='search', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Search products.'),
+    OpenApiParameter(name='sort', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Sort products.'),
+]
+
+PRODUCT_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        name='fields', type={'type': 'array', 'items': {'type': 'string'}}, style='form', explode=False,
+        location=OpenApiParameter.QUERY,
+        description='Fields to return (comma-separated). Defaults to the card fields.',
+    ),
+    OpenApiParameter(
+        name='expand', type={'type': 'array', 'items': {'type': 'string'}}, style='form', explode=False,
+        location=OpenApiParameter.QUERY,
+        description="Full-document fields to add: info, info_ru, categories, countries, currencies, images, colors "
+                    "or 'all'.",
+    ),
+]
+
+
 @extend_schema_view(
     retrieve=extend_schema(
         summary="Получить детали конкретного товара.",
@@ -28,61 +106,71 @@ from rest_framework import status
             OpenApiParameter(name='page_size', description='Number of items per page', required=False,
                                                  type=int),
 
-            OpenApiParameter(name='category', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Category ID for filtering products.'),
-            OpenApiParameter(name='category_slug', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Category slug for filtering products.'),
-            OpenApiParameter(
-                name='brand',
-                type={'type': 'array', 'items': {'type': 'integer'}},
-                style='form',
-                explode=True,
-                location=OpenApiParameter.QUERY,
-                description='Brand ID for filtering products.'
-            ),
-            OpenApiParameter(name='brand_filter', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Brand name for filtering products.'),
-            OpenApiParameter(name='min_price', type=OpenApiTypes.NUMBER, location=OpenApiParameter.QUERY, description='Minimum price for filtering products.'),
-            OpenApiParameter(name='max_price', type=OpenApiTypes.NUMBER, location=OpenApiParameter.QUERY, description='Maximum price for filtering products.'),
-
-            OpenApiParameter(name='size', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Size ID for filtering products.'),
-            OpenApiParameter(
-                            name='size_filter',
-                            type={'type': 'array', 'items': {'type': 'string'}},
-                            location=OpenApiParameter.QUERY,
-                            description='List of country STR for filtering products.',
-                            style='form',
-                            explode=True
-                        ),
-            OpenApiParameter(name='color', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Color ID for filtering products.'),
-            OpenApiParameter(name='color_filter', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Color name for filtering products.'),
-            OpenApiParameter(
-                name='country',
-                type={'type': 'array', 'items': {'type': 'integer'}},
-                location=OpenApiParameter.QUERY,
-                description='List of country IDs for filtering products.',
-                style='form',
-                explode=True
-            ),
-            OpenApiParameter(name='discount', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY, description='Boolean flag for filtering products by discount.'),
-            OpenApiParameter(name='in_stock', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY, description='Boolean flag for filtering products by in stock.'),
-            OpenApiParameter(name='has_price', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY,
-                             description='Boolean flag for filtering products by has price.'),
-
-            OpenApiParameter(name='currency', type=OpenApiTypes.INT, location=OpenApiParameter.QUERY, description='Currency ID for filtering products.'),
-            OpenApiParameter(name='search', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Search products.'),
-            OpenApiParameter(name='sort', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY, description='Sort products.'),
+            OpenApiParameter(name='pagination', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             description="Pagination mode: 'page' (default) or 'cursor'.", enum=['page', 'cursor']),
+            OpenApiParameter(name='cursor', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             description='Opaque cursor from the previous page (cursor mode).'),
+            OpenApiParameter(name='with_count', type=OpenApiTypes.BOOL, location=OpenApiParameter.QUERY,
+                             description='Include a cached total count (cursor mode).'),
+            *PRODUCT_FIELDS_PARAMETERS,
+            *PRODUCT_FILTER_PARAMETERS,
         ],
         responses=ProductSerializer(many=True)
     ),
+    export=extend_schema(
+        summary="Выгрузить весь каталог (с учётом фильтров) потоком в NDJSON или CSV.",
+        tags=['Products'],
+        parameters=[
+            OpenApiParameter(name='export_format', type=OpenApiTypes.STR, location=OpenApiParameter.QUERY,
+                             description='Export format.', enum=list(EXPORT_FORMATS)),
+            *PRODUCT_FILTER_PARAMETERS,
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR, (200, 'text/csv'): OpenApiTypes.STR},
+    ),
+    get_products_by_ids=extend_schema(
+        summary="Получить товары по списку id.",
+        tags=['Products'],
+        parameters=PRODUCT_FIELDS_PARAMETERS,
+    ),
+    track=extend_schema(
+        summary="Учесть просмотр или клик по товару (и оценку, если передан score).",
+        tags=['Products'],
+        request={'application/json': {
+            'type': 'object',
+            'properties': {
+                'event': {'type': 'string', 'enum': list(TRACK_EVENTS)},
+                'score': {'type': 'integer', 'minimum': MIN_SCORE, 'maximum': MAX_SCORE},
+            },
+        }},
+        responses={202: None},
+    ),
+    facets=extend_schema(
+        summary="Получить фасеты (бренды, размеры, цвета, страны, цены) для отфильтрованных товаров.",
+        tags=['Products'],
+        parameters=PRODUCT_FILTER_PARAMETERS,
+    ),
 )
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = CATALOG_MODELS
     serializer_class = ProductSerializer
     queryset = Product.objects.annotate(
         has_product_types=Exists(ProductType.objects.filter(product_id=OuterRef('pk')))
-    ).filter(has_product_types=True).prefetch_related('productcategory_set', 'productsize_set')
+    ).filter(has_product_types=True).select_related('brand')
     pagination_class = ProductPagination
-    filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = ['title_ru', 'title_en', 'brand__name']
+    filter_backends = [OrderingFilter]
     ordering_fields = ['title_ru', 'price']
     permission_classes = []
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            if query_params.get('pagination') == 'cursor' or 'cursor' in query_params:
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def list(self, request, **kwargs):
 
         max_price, min_price= self.category_filtered_queryset(request.query_params)
@@ -90,51 +178,48 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         page = self.paginate_queryset(queryset)
 
         if page is not None:
-                serializer = self.serializer_class(page, many=True)
+                documents = get_product_representations(page, request.query_params)
 
 
                 response_data = {
-                    'count': len(serializer.data),
+                    'count': len(documents),
                     'max_price_value': max_price,
                     'min_price_value': min_price,
-                    'results': serializer.data
+                    'results': documents
                 }
                 return self.get_paginated_response(response_data)
-        serializer = self.serializer_class(queryset, many=True)
-
-        min_price_value = queryset.aggregate(Min('productcurrency__price'))['productcurrency__price__min']
-        max_price_value = queryset.aggregate(Max('productcurrency__price'))['productcurrency__price__max']
+        documents = get_product_representations(queryset, request.query_params)
 
         response_data = {
-            'count': len(serializer.data),
-            'max_price_value': max_price_value,
-            'min_price_value': min_price_value,
-            'results': serializer.data
+            'count': len(documents),
+            'max_price_value': max_price,
+            'min_price_value': min_price,
+            'results': documents
         }
         return Response(response_data)
 
+    def retrieve(self, request, *args, **kwargs):
+        product = self.get_object()
+        return Response(attach_size_chart(get_product_documents([product])[0]))
+
     def get_queryset(self):
-        if hasattr(self, '_queryset'):
-            return self._queryset
-
-        queryset = self.queryset
-        query_params = self.request.query_params
-        _filters = Q()
-
-        _filters &= self.filter_by_category(query_params)
-        _filters &= self.filter_by_discount(query_params)
-        _filters &= self.filter_by_in_stock(query_params)
-        _filters &= self.filter_by_brand(query_params)
-        _filters &= self.filter_by_size(query_params)
-        _filters &= self.filter_by_price(query_params)
-        _filters &= self.filter_by_color(query_params)
-        _filters &= self.filter_by_country(query_params)
-        _filters &= self.filter_by_currency(query_params)
-        _filters &= self.filter_by_color_name(query_params)
-        _filters &= self.filter_by_size_name(query_params)
-        _filters &= self.filter_by_search(query_params)
-
-        queryset = queryset.filter(_filters).distinct().annotate(price=F('productcurrency__price'))
+        if not hasattr(self, '_queryset'):
+            self._queryset = self.build_queryset(self.request.query_params)
+        return self._queryset
+
+    @classmethod
+    def build_queryset(cls, query_params):
+        """
+        Отфильтрованный и отсортированный queryset продуктов; используется и синхронными, и async-вьюхами.
+        """
+        queryset = cls.queryset
+        product_ids = cls.get_indexed_product_ids(query_params)
+        if product_ids is not None:
+            queryset = queryset.filter(id__in=product_ids)
+        else:
+            queryset = queryset.filter(cls.get_filters(query_params))
+
+        queryset = annotate_price(queryset, query_params.get('currency'))
 
         sort = query_params.get('sort')
         sort_mapping = {
@@ -146,31 +231,57 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             'price_desc': '-price'
         }
         sort_field = sort_mapping.get(sort, 'title_ru')
-        queryset = queryset.order_by(sort_field)
 
-
-        self._queryset = queryset
+        search_query = query_params.get('search')
+        if search_query and sort not in sort_mapping:
+            relevance = get_search_backend().get_relevance(search_query)
+            if relevance is not None:
+                queryset = queryset.annotate(relevance=relevance)
+                sort_field = '-relevance'
+        # Тексты и поисковый вектор в ответ не попадают: документы и карточки их не читают из строки.
+        queryset = queryset.order_by(sort_field).defer('info', 'info_ru', 'search_vector')
         return queryset
 
+    @staticmethod
+    def get_indexed_product_ids(query_params):
+        """
+        Id продуктов из индекса фильтров; None, если индекс не подходит и фильтровать нужно в SQL.
+        """
+        index, bits = match_indexed_products(query_params)
+        if index is None or bits.bit_count() > getattr(settings, 'FILTER_INDEX_MAX_IDS', FILTER_INDEX_MAX_IDS):
+            return None
+        return index.get_ids(bits)
+
+    @classmethod
+    def get_filters(cls, query_params):
+        return compile_product_filters([
+            cls.filter_by_category(query_params),
+            cls.filter_by_discount(query_params),
+            cls.filter_by_in_stock(query_params),
+            cls.filter_by_brand(query_params),
+            cls.filter_by_size(query_params),
+            cls.filter_by_price(query_params),
+            cls.filter_by_color(query_params),
+            cls.filter_by_country(query_params),
+            cls.filter_by_currency(query_params),
+            cls.filter_by_color_name(query_params),
+            cls.filter_by_size_name(query_params),
+            cls.filter_by_search(query_params),
+        ])
+
     @staticmethod
     def filter_by_category(query_params):
         category_id = query_params.get('category')
         category_slug = query_params.get('category_slug')
         category_filters = Q()
         if category_id or category_slug:
-            try:
-                category = None
-                if category_id:
-                    category = get_object_or_404(Category, id=category_id)
-                elif category_slug:
-                    category = get_object_or_404(Category, slug=category_slug)
+            tree = get_category_tree()
+            resolved_id = tree.resolve_id(category_id, category_slug)
+            if resolved_id is None:
+                raise Http404('No Category matches the given query.')
 
-                if category:
-                    descendant_category_ids = list(category.get_descendants(include_self=True).values_list('id', flat=True))
-                    category_filters &= Q(productcategory__category_id__in=descendant_category_ids)
-
-            except Category.DoesNotExist:
-                return Q(pk__in=[])
+            descendant_category_ids = tree.get_descendant_ids(resolved_id)
+            category_filters &= Q(productcategory__category_id__in=descendant_category_ids)
 
         return category_filters
 
@@ -229,13 +340,16 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         min_price = query_params.get('min_price')
         max_price = query_params.get('max_price')
         has_price = query_params.get('has_price')
+        currency_id = query_params.get('currency')
 
         price_filters = Q()
 
+        if (min_price or max_price) and currency_id:
+            price_filters &= Q(productprice__currency_id=currency_id)
         if min_price:
-            price_filters &= Q(productcurrency__price__gte=min_price)
+            price_filters &= Q(productprice__price__gte=min_price)
         if max_price:
-            price_filters &= Q(productcurrency__price__lte=max_price)
+            price_filters &= Q(productprice__price__lte=max_price)
         if has_price == 'true':
             price_filters &= Q(productcurrency__price__isnull=False)
         if has_price == 'false':
@@ -290,52 +404,50 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         size_filters = Q()
 
         if size_name:
-            try:
-                size_queries = Q()
-                for name in size_name:
-                    size_queries |= Q(raw_size__icontains=name)
-                sizes = Size.objects.filter(size_queries).values_list('id', flat=True)
-                size_filters &= Q(productsize__size_id__in=sizes)
-            except Size.DoesNotExist:
-                return Q(pk__in=[])
+            sizes = find_size_ids(size_name, get_size_system(query_params))
+            size_filters &= Q(productsize__size_id__in=sizes)
 
         return size_filters
 
     @staticmethod
     def category_filtered_queryset(query_params):
-        category_id = query_params.get('category')# Подставьте свой способ получения категории
-
-        if not category_id:
-            products = Product.objects.all()
-        else:
-            products = Product.objects.filter(productcategory__category_id=category_id)
-        min_price_value = products.aggregate(min_price=Min('productcurrency__price'))['min_price']
-        max_price_value = products.aggregate(max_price=Max('productcurrency__price'))['max_price']
+        min_price_value, max_price_value = get_price_bounds(
+            category_id=query_params.get('category'),
+            category_slug=query_params.get('category_slug'),
+            currency_id=query_params.get('currency'),
+        )
 
         return max_price_value, min_price_value
 
-    def get_max_price(self):
-        max_price_value = self.category_filtered_queryset.aggregate(Max('productcurrency__price'))['productcurrency__price__max']
-        return max_price_value
-
-    def get_min_price(self):
-        min_price_value = self.category_filtered_queryset.aggregate(Min('productcurrency__price'))['productcurrency__price__min']
-        return min_price_value
-
     @staticmethod
     def filter_by_search(query_params):
         search_query = query_params.get('search')
         search_filters = Q()
 
         if search_query:
-            search_filters &= (
-                    Q(title_ru__icontains=search_query) |
-                    Q(title_en__icontains=search_query) |
-                    Q(brand__name__icontains=search_query)
-            )
+            search_filters &= get_search_backend().get_filter(search_query)
 
         return search_filters
 
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request, *args, **kwargs):
+        index, bits = match_indexed_products(request.query_params)
+        if index is not None:
+            return Response(index.facets(bits, request.query_params.get('currency')))
+        queryset = self.queryset.filter(self.get_filters(request.query_params))
+        return Response(compute_facets(queryset, request.query_params.get('currency')))
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": f"Unknown export format: {export_format}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = get_export_queryset(self.queryset.filter(self.get_filters(request.query_params)))
+        response = StreamingHttpResponse(iter_export(queryset, export_format), content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="catalog.{export_format}"'
+        return response
+
     @action(detail=False, methods=['post'], url_path='ids')
     def get_products_by_ids(self, request, *args, **kwargs):
         ids = request.data.get('ids', [])
@@ -346,8 +458,33 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         page = self.paginate_queryset(queryset)
 
         if page is not None:
-            serializer = self.serializer_class(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+            return self.get_paginated_response(get_product_representations(page, request.query_params))
+
+        return Response(get_product_representations(queryset, request.query_params))
+
+    @action(detail=True, methods=['post'], url_path='track')
+    def track(self, request, *args, **kwargs):
+        """
+        Приращения копятся в буфере процесса и сбрасываются в БД пачкой (см. product_counters),
+        поэтому запрос не обращается к БД.
+        """
+        try:
+            product_id = int(kwargs['pk'])
+        except ValueError:
+            raise Http404('No Product matches the given query.')
+
+        event = request.data.get('event', 'view')
+        score = request.data.get('score')
+        if event not in TRACK_EVENTS:
+            return Response({"detail": f"Unknown event: {event}."}, status=status.HTTP_400_BAD_REQUEST)
+        if score is not None:
+            try:
+                score = int(score)
+            except (TypeError, ValueError):
+                score = None
+            if score is None or not MIN_SCORE <= score <= MAX_SCORE:
+                return Response({"detail": f"Score must be an integer from {MIN_SCORE} to {MAX_SCORE}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            record_rating(product_id, score)
+        record_view(product_id)
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,48 @@
+from django.http import Http404
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from api.models import Category, SizeTable
+from api.serializers.size_table_serializers import SizeTableSerializer
+from api.services.category_tree import get_category_tree
+from api.services.response_cache import CachedResponseMixin
+from api.services.size_charts import get_size_charts
+
+
+@extend_schema_view(
+    retrieve=extend_schema(
+        summary="Получить таблицу размеров.",
+        tags=['SizeTables']
+    ),
+    list=extend_schema(
+        summary="Получить список всех таблиц размеров.",
+        tags=['SizeTables'],
+    ),
+    category=extend_schema(
+        summary="Получить таблицу размеров категории (свою или ближайшего предка).",
+        tags=['SizeTables'],
+        responses=SizeTableSerializer,
+    ),
+)
+class SizeTableViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (SizeTable, Category)
+    queryset = SizeTable.objects.order_by('id')
+    serializer_class = SizeTableSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        chart = get_size_charts().get(int(kwargs['pk'])) if str(kwargs['pk']).isdigit() else None
+        if chart is None:
+            raise Http404('No SizeTable matches the given query.')
+        return Response(chart)
+
+    @action(detail=False, methods=['get'], url_path=r'category/(?P<category_id>[^/.]+)')
+    def category(self, request, category_id=None):
+        tree = get_category_tree()
+        resolved_id = tree.resolve_id(category_id) if category_id.isdigit() else tree.resolve_id(slug=category_id)
+        if resolved_id is None:
+            raise Http404('No Category matches the given query.')
+        chart = get_size_charts().get_for_category(resolved_id)
+        if chart is None:
+            raise Http404('No SizeTable for this category or its ancestors.')
+        return Response(chart)
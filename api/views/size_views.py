@@ -1,7 +1,9 @@
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import viewsets
-from api.models import Size
+from api.models import Size, ProductSize
 from api.serializers.size_serializers import SizeSerializer
+from api.services.reference_data import ReferenceDataListMixin
+from api.services.response_cache import CachedResponseMixin
 
 
 @extend_schema_view(
@@ -19,7 +21,9 @@ from api.serializers.size_serializers import SizeSerializer
         ],
     ),
 )
-class SizeViewSet(viewsets.ReadOnlyModelViewSet):
+class SizeViewSet(CachedResponseMixin, ReferenceDataListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Size, ProductSize)
+    reference_model = Size
     queryset = Size.objects.all()
     serializer_class = SizeSerializer
 
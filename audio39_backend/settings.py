@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'api',
     'drf_spectacular',
@@ -26,12 +27,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.QueryProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'audio39_backend.urls'
@@ -69,6 +72,56 @@ DATABASES = {
     }
 }
 
+# Cache
+# Ответы API и вычисленные данные хранятся в кеше по умолчанию (свой у каждого процесса).
+# Версии каталога и журнал индекса фильтров должны быть общими для всех воркеров, иначе
+# инвалидация в одном процессе не видна остальным: на одном хосте подойдёт FileBasedCache,
+# на нескольких — общий кеш (Redis, Memcached) в CACHE_VERSIONS_ALIAS.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'audio39',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'files': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+CACHE_VERSIONS_ALIAS = 'files'
+
+# Параллельные чтения async-вьюх: каждая ветка asyncio.gather выполняется в своём потоке и открывает
+# своё соединение с БД (4–5 на запрос списка). При CONN_MAX_AGE = 0 соединение создаётся и закрывается
+# на каждую ветку, поэтому включать только с постоянными соединениями или пулом (pgbouncer, OPTIONS pool).
+# ASYNC_PARALLEL_READS_LIMIT ограничивает число одновременных таких соединений на процесс.
+ASYNC_PARALLEL_READS = False
+ASYNC_PARALLEL_READS_LIMIT = 8
+
+REFERENCE_DATA_TTL = 300
+
+IMAGE_INGEST_WORKERS = 8
+IMAGE_INGEST_TIMEOUT = 30
+IMAGE_VARIANT_WIDTHS = (160, 320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ('avif', 'webp', 'jpeg')
+IMAGE_VARIANT_WORKERS = None
+IMAGE_VARIANTS_ON_SAVE = True
+
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 1024
+
+FILTER_INDEX_ENABLED = True
+FILTER_INDEX_MAX_IDS = 5000
+
+PRODUCT_COUNTERS_FLUSH_INTERVAL = 60
+PRODUCT_COUNTERS_SPOOL = None
+
+QUERY_PROFILER_ENABLED = False
+QUERY_PROFILER_SAMPLE_RATE = 0.05
+QUERY_PROFILER_CACHE_ALIAS = 'files'
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,6 +161,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.ProductPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_PERMISSION_CLASSES': [